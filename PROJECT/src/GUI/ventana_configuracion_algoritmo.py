@@ -10,6 +10,8 @@ config_algoritmo = {
     "espacio": "discreto",
     "prob_cruce": 0.9,
     "prob_mut": 1/77,
+    "arranque_caliente": False,        # parte de menús previos de perfiles parecidos
+    "busqueda_local": False,           # refina el frente final con cambios de un alimento
     "discreto": {
         "cruce": "twopoint",     
         "mutacion": "custom",    
@@ -70,6 +72,18 @@ class ConfigPanel(ttk.Frame):
             row=fila, column=1, sticky="ew", padx=5, pady=5
         )
 
+        fila += 1
+        self.vars["arranque_caliente"] = tk.BooleanVar(value=config_algoritmo["arranque_caliente"])
+        ttk.Checkbutton(
+            self, text="Arranque con menús previos", variable=self.vars["arranque_caliente"]
+        ).grid(row=fila, column=0, columnspan=2, sticky="w", padx=5, pady=5)
+
+        fila += 1
+        self.vars["busqueda_local"] = tk.BooleanVar(value=config_algoritmo["busqueda_local"])
+        ttk.Checkbutton(
+            self, text="Búsqueda local sobre el frente final", variable=self.vars["busqueda_local"]
+        ).grid(row=fila, column=0, columnspan=2, sticky="w", padx=5, pady=5)
+
         # Frames específicos por espacio
         fila += 1
         self.frame_discreto = self._labelframe(self, "DISCRETO", fila)
@@ -272,6 +286,8 @@ class ConfigPanel(ttk.Frame):
             "espacio": esp,
             "prob_cruce": prob_cruce,
             "prob_mut": prob_mut,
+            "arranque_caliente": bool(self.vars["arranque_caliente"].get()),
+            "busqueda_local": bool(self.vars["busqueda_local"].get()),
             "discreto": {
                 "cruce": self.vars["discreto_cruce"].get(),
                 "mutacion": self.vars["discreto_mut"].get(),
@@ -303,6 +319,8 @@ class ConfigPanel(ttk.Frame):
             config_algoritmo["espacio"] = cfg["espacio"]
             config_algoritmo["prob_cruce"] = cfg["prob_cruce"]
             config_algoritmo["prob_mut"] = cfg["prob_mut"]
+            config_algoritmo["arranque_caliente"] = cfg["arranque_caliente"]
+            config_algoritmo["busqueda_local"] = cfg["busqueda_local"]
             config_algoritmo["discreto"] = cfg["discreto"]
             config_algoritmo["vectores"] = cfg["vectores"]
             config_algoritmo["matrices"] = cfg["matrices"]
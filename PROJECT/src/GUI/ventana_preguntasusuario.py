@@ -261,6 +261,8 @@ class VentanaCalorias:
                 prob_mutacion=cfg["prob_mut"],
                 seed=seed,
                 verbose=True,
+                arranque_caliente=cfg["arranque_caliente"],
+                busqueda_local=cfg["busqueda_local"],
             )
 
         else:
@@ -277,6 +279,8 @@ class VentanaCalorias:
                     prob_mutacion=cfg["prob_mut"],
                     seed=seed,
                     verbose=True,
+                    arranque_caliente=cfg["arranque_caliente"],
+                    busqueda_local=cfg["busqueda_local"],
                 )
 
             elif espacio == "matrices":
@@ -290,6 +294,8 @@ class VentanaCalorias:
                     prob_mutacion=cfg["prob_mut"],
                     seed=seed,
                     verbose=True,
+                    arranque_caliente=cfg["arranque_caliente"],
+                    busqueda_local=cfg["busqueda_local"],
                 )
 
             else:  # grafos
@@ -304,6 +310,8 @@ class VentanaCalorias:
                     prob_mutacion=cfg["prob_mut"],
                     seed=seed,
                     verbose=True,
+                    arranque_caliente=cfg["arranque_caliente"],
+                    busqueda_local=cfg["busqueda_local"],
                 )
 
         if resultado is None or getattr(resultado, "F", None) is None or getattr(resultado, "X", None) is None:
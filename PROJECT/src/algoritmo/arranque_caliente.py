@@ -0,0 +1,168 @@
+# arranque_caliente.py — Archivo de soluciones previas por perfil de sujeto
+# Guarda el frente no dominado factible de cada ejecución junto al perfil del sujeto
+# (calorías, edad, gustos, disgustos, alergias). En la siguiente ejecución de un perfil
+# parecido, la población inicial parte de esas soluciones (reparadas con corregir_solucion)
+# y el resto se rellena al azar; así basta con muchas menos generaciones.
+# Los menús son índices de fila del catálogo: cada entrada guarda la huella (sha1) de comida.csv
+# con la que se obtuvo y solo se reutiliza si coincide con la actual (editar el CSV desplaza filas).
+
+import os
+import json
+import numpy as np
+
+from pymoo.util.nds.non_dominated_sorting import NonDominatedSorting
+
+from src.utilidades.carga_datos_csv import RUTA_COMIDA, hash_csv
+
+RUTA_ARCHIVO = os.path.join("data", "procesado", "arranque_caliente", "archivo_soluciones.json")
+
+# límites del archivo
+MAX_PERFILES = 500
+MAX_SOLUCIONES_POR_PERFIL = 50
+
+# fracción máxima de la población inicial que sale del archivo (el resto, al azar)
+FRACCION_SEMBRADA = 0.5
+
+# perfiles más lejanos que esto no se usan
+DISTANCIA_MAXIMA = 0.5
+
+# generaciones por defecto cuando la población inicial se ha sembrado
+GENERACIONES_ARRANQUE_CALIENTE = 30
+
+
+def perfil_sujeto(objetivo_calorias, edad, gustos, no_gustos, alergias):
+    """Perfil del sujeto tal y como se guarda en el archivo."""
+    return {
+        "calorias": float(objetivo_calorias),
+        "edad": int(edad),
+        "gustos": sorted(set(gustos or [])),
+        "disgustos": sorted(set(no_gustos or [])),
+        "alergias": sorted(set(alergias or [])),
+    }
+
+
+def distancia_jaccard(a, b):
+    """1 - |a ∩ b| / |a ∪ b| (0 si ambos están vacíos)."""
+    a, b = set(a), set(b)
+    union = a | b
+    return 1.0 - len(a & b) / len(union) if union else 0.0
+
+
+def distancia_perfiles(p, q):
+    """
+    Distancia entre perfiles:
+    diferencia relativa de calorías + edad (en décadas) + Jaccard de cada conjunto de preferencias.
+    Las alergias pesan el doble (cambian qué menús son aceptables).
+    """
+    d_cal = abs(p["calorias"] - q["calorias"]) / max(p["calorias"], 1.0)
+    d_edad = abs(p["edad"] - q["edad"]) / 10.0
+    d_pref = (
+        distancia_jaccard(p["gustos"], q["gustos"])
+        + distancia_jaccard(p["disgustos"], q["disgustos"])
+        + 2.0 * distancia_jaccard(p["alergias"], q["alergias"])
+    )
+    return d_cal + d_edad + d_pref
+
+
+def huella_catalogo(ruta_csv=RUTA_COMIDA):
+    """Huella del catálogo al que apuntan los índices de los menús (sha1 de comida.csv)."""
+    return hash_csv(ruta_csv)
+
+
+def leer_archivo(ruta=RUTA_ARCHIVO):
+    """Lista de entradas {"perfil", "catalogo", "soluciones", "fitness"} (vacía si no hay archivo)."""
+    if not os.path.exists(ruta):
+        return []
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def guardar_archivo(entradas, ruta=RUTA_ARCHIVO):
+    """Escribe el archivo completo (a un temporal y luego se renombra)."""
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    tmp = ruta + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entradas, f, ensure_ascii=False)
+    os.replace(tmp, ruta)
+
+
+def soluciones_previas(perfil, n_max, ruta=RUTA_ARCHIVO, distancia_maxima=DISTANCIA_MAXIMA, catalogo=None):
+    """
+    Hasta n_max soluciones del archivo, de los perfiles más cercanos a los más lejanos
+    (y dentro de cada perfil, en el orden en que se guardaron). Sin duplicados.
+    Solo se usan las entradas guardadas con el catálogo actual (huella catalogo; por defecto
+    la de comida.csv): con otro catálogo los índices apuntarían a otros alimentos.
+    Devuelve un array (k, n_var) o None si no hay ninguna.
+    """
+    catalogo = catalogo or huella_catalogo()
+    entradas = [e for e in leer_archivo(ruta) if e.get("catalogo") == catalogo]
+    cercanas = sorted(
+        ((distancia_perfiles(perfil, e["perfil"]), i) for i, e in enumerate(entradas)),
+    )
+    soluciones, vistas = [], set()
+    for d, i in cercanas:
+        if d > distancia_maxima or len(soluciones) >= n_max:
+            break
+        for s in entradas[i]["soluciones"]:
+            t = tuple(s)
+            if t in vistas:
+                continue
+            vistas.add(t)
+            soluciones.append(s)
+            if len(soluciones) >= n_max:
+                break
+    return np.asarray(soluciones, dtype=int) if soluciones else None
+
+
+def frente_factible(resultado):
+    """(X, F) del frente no dominado factible de la población final, o None."""
+    pop = resultado.pop
+    X, F, G = pop.get("X"), pop.get("F"), pop.get("G")
+    if X is None or F is None or len(F) == 0:
+        return None
+    factibles = np.ones(len(F), dtype=bool) if G is None or G.size == 0 else (G <= 0.0).all(axis=1)
+    if not factibles.any():
+        return None
+    idx = np.flatnonzero(factibles)[NonDominatedSorting().do(F[factibles], only_non_dominated_front=True)]
+    return X[idx], F[idx]
+
+
+def archivar_resultado(perfil, resultado, ruta=RUTA_ARCHIVO, catalogo=None):
+    """
+    Guarda el frente factible del resultado para el perfil (sustituye al que hubiera
+    para el mismo perfil) con la huella del catálogo (por defecto la de comida.csv).
+    Los perfiles más antiguos salen cuando se supera MAX_PERFILES.
+    """
+    frente = frente_factible(resultado)
+    if frente is None:
+        return False
+    X, F = frente
+    orden = np.argsort(F[:, 0], kind="stable")[:MAX_SOLUCIONES_POR_PERFIL]   # primero las de mejor calorías
+
+    entradas = [e for e in leer_archivo(ruta) if e["perfil"] != perfil]
+    entradas.append({
+        "perfil": perfil,
+        "catalogo": catalogo or huella_catalogo(),
+        "soluciones": np.asarray(X[orden], dtype=int).tolist(),
+        "fitness": np.asarray(F[orden], dtype=float).tolist(),
+    })
+    guardar_archivo(entradas[-MAX_PERFILES:], ruta)
+    return True
+
+
+def sembrar_inicializacion(sampling, perfil, n_poblacion, n_generaciones=None, ruta=RUTA_ARCHIVO,
+                           catalogo=None):
+    """
+    Pasa a la inicialización las soluciones previas más cercanas al perfil
+    (solo las del catálogo actual, ver soluciones_previas).
+    Devuelve las generaciones a usar: las indicadas o, si no se indican,
+    GENERACIONES_ARRANQUE_CALIENTE si se ha sembrado algo (None si no).
+    """
+    previas = soluciones_previas(perfil, int(n_poblacion * FRACCION_SEMBRADA), ruta, catalogo=catalogo)
+    sampling.soluciones_iniciales = previas
+    if n_generaciones is None and previas is not None:
+        return GENERACIONES_ARRANQUE_CALIENTE
+    return n_generaciones
@@ -0,0 +1,160 @@
+# busqueda_local.py — Búsqueda local (memética) sobre el frente final de NSGA-III
+# Vecindario: cambiar un único gen por otro alimento de validos_por_posicion.
+# Primera mejora por posición: se recorren las posiciones en orden aleatorio y, en cada una,
+# se evalúan a la vez todos los sustitutos de todas las soluciones (evaluación incremental:
+# solo se recalcula el día tocado, ver PlanningComida.actualizar_estado).
+# Un vecino mejora si reduce la violación de restricciones o, con la misma violación, domina en F.
+# Se aplica a los no dominados factibles o, si no hay factibles, a los menos infactibles.
+# res.X/F solo cambian si el frente refinado tiene factibles (si no, siguen en None como en pymoo).
+
+import time
+import numpy as np
+
+from pymoo.core.population import Population
+from pymoo.util.nds.non_dominated_sorting import NonDominatedSorting
+
+from src.utilidades.constantes import NUM_ALIMENTOS_DIARIO
+
+MAX_PASADAS = 3              # recorridos completos de las 77 posiciones
+MAX_VECINOS = 64             # sustitutos probados por posición y solución (muestra si hay más)
+MAX_SOLUCIONES = 20          # infactibles que se refinan cuando no hay ninguna factible
+
+
+def violacion(G):
+    """CV por individuo: suma de la parte positiva de G."""
+    return np.maximum(G, 0.0).sum(axis=1)
+
+
+def seleccionar_refinables(F, G, n_max=MAX_SOLUCIONES):
+    """Índices a refinar: frente no dominado de los factibles o, si no hay, los n_max de menor CV."""
+    cv = violacion(G)
+    factibles = cv <= 0.0
+    if not factibles.any():
+        return np.argsort(cv, kind="stable")[:n_max]
+    return np.flatnonzero(factibles)[NonDominatedSorting().do(F[factibles], only_non_dominated_front=True)]
+
+
+def mejores_vecinos(F, cv, F_vec, cv_vec, escala):
+    """
+    Para cada solución (fila de F) elige el mejor de sus vecinos (F_vec (N, K, n_obj), cv_vec (N, K)).
+    Mejora: menos CV, o igual CV y dominancia en F. Entre los que mejoran, el de menor CV
+    y después menor suma de F normalizada. Devuelve (hay_mejora (N,), mejor (N,)).
+    """
+    domina = (F_vec <= F[:, None]).all(axis=2) & (F_vec < F[:, None]).any(axis=2)
+    mejora = (cv_vec < cv[:, None]) | ((cv_vec == cv[:, None]) & domina)
+    puntuacion = (F_vec / escala).sum(axis=2)
+    # orden lexicográfico (CV, puntuación) entre los que mejoran
+    cv_m = np.where(mejora, cv_vec, np.inf)
+    minimo = cv_m.min(axis=1, keepdims=True)
+    puntuacion = np.where(mejora & (cv_m == minimo), puntuacion, np.inf)
+    return mejora.any(axis=1), puntuacion.argmin(axis=1)
+
+
+def busqueda_local(problema, X, max_pasadas=MAX_PASADAS, max_vecinos=MAX_VECINOS, rng=None):
+    """
+    Mejora por primera mejora cada fila de X con cambios de un gen.
+    Devuelve (X, F, G) refinados y un resumen {pasadas, movimientos, evaluaciones, tiempo}.
+    """
+    rng = rng or np.random.default_rng()
+    t0 = time.time()
+    validos = problema.validos_por_posicion
+    estado = problema.crear_estado(X)
+    F, G = problema.evaluar_estado(estado)
+    cv = violacion(G)
+    escala = np.maximum(np.ptp(F, axis=0), 1.0)
+
+    n_sol, n_var = estado.X.shape
+    movimientos = evaluaciones = pasadas = 0
+    activas = np.ones(n_sol, dtype=bool)   # soluciones que aún han mejorado en la pasada anterior
+    for pasadas in range(1, max_pasadas + 1):
+        mejoradas = np.zeros(n_sol, dtype=bool)
+        for pos in rng.permutation(n_var):
+            filas = np.flatnonzero(activas)
+            if filas.size == 0:
+                break
+            cand = np.asarray(validos[pos])
+            if cand.size > max_vecinos:
+                cand = rng.choice(cand, size=max_vecinos, replace=False)
+            k = cand.size
+
+            # vecinos: cada solución activa con el gen pos cambiado por cada candidato
+            vecinos = estado.copiar(np.repeat(filas, k))
+            X_vec = vecinos.X.copy()
+            X_vec[:, pos] = np.tile(cand, filas.size)
+            tocados = np.zeros(X_vec.shape, dtype=bool)
+            tocados[:, pos] = True
+            problema.actualizar_estado(vecinos, X_vec, tocados)
+            F_vec, G_vec = problema.evaluar_estado(vecinos)
+            evaluaciones += len(X_vec)
+
+            hay, mejor = mejores_vecinos(
+                F[filas], cv[filas],
+                F_vec.reshape(filas.size, k, -1), violacion(G_vec).reshape(filas.size, k),
+                escala,
+            )
+            if not hay.any():
+                continue
+
+            # aplicar el movimiento (solo el día de pos cambia en el estado)
+            sel = filas[hay]
+            origen = np.flatnonzero(hay) * k + mejor[hay]
+            dia = pos // NUM_ALIMENTOS_DIARIO
+            estado.X[sel] = vecinos.X[origen]
+            estado.totales[:, sel, dia] = vecinos.totales[:, origen, dia]
+            estado.pref[sel, dia] = vecinos.pref[origen, dia]
+            estado.alerg[sel, dia] = vecinos.alerg[origen, dia]
+            F[sel], G[sel], cv[sel] = F_vec[origen], G_vec[origen], violacion(G_vec[origen])
+            mejoradas[sel] = True
+            movimientos += sel.size
+        activas = mejoradas
+        if not activas.any():
+            break
+
+    resumen = {
+        "pasadas": pasadas,
+        "movimientos": int(movimientos),
+        "evaluaciones": int(evaluaciones),
+        "tiempo": time.time() - t0,
+    }
+    return estado.X, F, G, resumen
+
+
+def refinar_resultado(problema, res, seed=None, verbose=True, **kwargs):
+    """
+    Aplica busqueda_local a la población final de res: los refinados sustituyen a sus originales
+    en res.pop y, si alguno es factible, res.X/F/G/CV/opt pasan a ser el frente refinado
+    (no dominados factibles). Si no hay factibles, res.X/F/G/CV/opt quedan como los dejó pymoo
+    (None), igual que sin búsqueda local. El resumen queda en res.busqueda_local. Devuelve res.
+    """
+    if res is None or res.pop is None or len(res.pop) == 0:
+        return res
+    X, F, G = res.pop.get("X", "F", "G")
+    idx = seleccionar_refinables(F, G)
+    X_ref, F_ref, G_ref, resumen = busqueda_local(
+        problema, X[idx].astype(np.int64), rng=np.random.default_rng(seed), **kwargs
+    )
+
+    # los refinados sustituyen a sus originales en la población final
+    X, F, G = X.copy(), F.copy(), G.copy()
+    X[idx], F[idx], G[idx] = X_ref, F_ref, G_ref
+    res.pop = Population.new("X", X, "F", F, "G", G, "CV", violacion(G)[:, None])
+
+    # frente refinado factible sin duplicados (solo si hay factibles)
+    factibles = violacion(G_ref) <= 0.0
+    X_ref, F_ref, G_ref = X_ref[factibles], F_ref[factibles], G_ref[factibles]
+    _, unicos = np.unique(X_ref, axis=0, return_index=True)
+    unicos = np.sort(unicos)
+    X_ref, F_ref, G_ref = X_ref[unicos], F_ref[unicos], G_ref[unicos]
+    if len(X_ref) > 0:
+        frente = NonDominatedSorting().do(F_ref, only_non_dominated_front=True)
+        X_ref, F_ref, G_ref = X_ref[frente], F_ref[frente], G_ref[frente]
+        cv = np.zeros((len(X_ref), 1))
+        res.opt = Population.new("X", X_ref, "F", F_ref, "G", G_ref, "CV", cv)
+        res.X, res.F, res.G, res.CV = X_ref, F_ref, G_ref, cv
+    resumen["n_soluciones"] = int(len(X_ref))   # tamaño del frente factible refinado (0 si no hay)
+    res.busqueda_local = resumen
+    if verbose:
+        print(f"Búsqueda local: {resumen['movimientos']} movimientos en {resumen['pasadas']} pasadas, "
+              f"{resumen['evaluaciones']} vecinos evaluados en {resumen['tiempo']:.2f} s; "
+              f"frente factible de {resumen['n_soluciones']}")
+    return res
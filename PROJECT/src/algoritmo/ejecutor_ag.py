@@ -1,21 +1,160 @@
 # ejecutor_ag.py — Ejecutor NSGA-III
 # Configuración:
-# - 100 generaciones
+# - 100 generaciones (menos con arranque en caliente, ver arranque_caliente)
 # - población 100
 # - direcciones de referencia "incremental" con 12 particiones
 # - cruce a dos puntos y mutación/inicialización personalizada
+# - historial "ligero" (estadísticas por generación) o "completo" (copias de pymoo)
+# - terminación fija por generaciones o por convergencia del frente (TerminacionConvergencia)
 
 import numpy as np
 from pymoo.algorithms.moo.nsga3 import NSGA3
+from pymoo.core.callback import Callback
+from pymoo.core.termination import Termination
+from pymoo.indicators.hv import HV
+from pymoo.util.nds.non_dominated_sorting import NonDominatedSorting
 from pymoo.optimize import minimize
 from pymoo.util.ref_dirs import get_reference_directions
 from pymoo.operators.crossover.pntx import TwoPointCrossover
 
 from src.algoritmo.inicializacion_mutacion import InicializacionCustom, MutacionCustom
+from src.algoritmo.problema import ProblemaConCache, CAPACIDAD_CACHE
 
 POBLACION_FIJA = 100
 GENERACIONES_FIJAS = 100
 
+# terminación por convergencia
+VENTANA_CONVERGENCIA = 10
+GENERACIONES_MINIMAS = 20
+TOLERANCIA_HV = 0.05            # mejora del hipervolumen en la ventana (fracción de la caja de referencia)
+TOLERANCIA_FACTIBLES = 0.01     # subida de la fracción de factibles en la ventana
+TOLERANCIA_CV = 1e-3            # bajada relativa de la mediana de CV en la ventana
+
+class HistorialLigero(Callback):
+    """
+    Historial por generación sin copiar el algoritmo. Guarda en arrays preasignados:
+    - medianas_F: mediana de cada objetivo
+    - cv: [mínimo, mediana, media] de la violación de restricciones
+    - n_factibles: individuos con todas las restricciones cumplidas
+    """
+    def __init__(self, n_generaciones=GENERACIONES_FIJAS, n_objetivos=3):
+        super().__init__()
+        self.medianas_F = np.full((n_generaciones, n_objetivos), np.nan)
+        self.cv = np.full((n_generaciones, 3), np.nan)
+        self.n_factibles = np.zeros(n_generaciones, dtype=int)
+        self.n_gen = 0
+
+    def notify(self, algorithm):
+        i = self.n_gen
+        if i >= len(self.n_factibles):
+            # más generaciones de las previstas: se duplica el tamaño
+            self.medianas_F = np.vstack([self.medianas_F, np.full_like(self.medianas_F, np.nan)])
+            self.cv = np.vstack([self.cv, np.full_like(self.cv, np.nan)])
+            self.n_factibles = np.concatenate([self.n_factibles, np.zeros_like(self.n_factibles)])
+
+        F, G = algorithm.pop.get("F", "G")
+        self.medianas_F[i] = np.median(F, axis=0)
+        if G is not None and G.size > 0:
+            cv_vec = np.maximum(G, 0.0).sum(axis=1)
+            self.cv[i] = (cv_vec.min(), np.median(cv_vec), cv_vec.mean())
+            self.n_factibles[i] = int((G <= 0.0).all(axis=1).sum())
+        else:
+            self.cv[i] = 0.0
+            self.n_factibles[i] = len(F)
+        self.n_gen += 1
+
+    def resumen(self):
+        """Dict con los arrays recortados a las generaciones ejecutadas."""
+        n = self.n_gen
+        return {
+            "medianas_F": self.medianas_F[:n].copy(),
+            "cv": self.cv[:n].copy(),
+            "n_factibles": self.n_factibles[:n].copy(),
+        }
+
+
+def normalizacion_poblacion(F):
+    """(mínimo, escala) por objetivo de una población; la escala nunca es 0."""
+    lo = F.min(axis=0)
+    escala = F.max(axis=0) - lo
+    escala[escala == 0] = 1.0
+    return lo, escala
+
+
+def mejora_hipervolumen(previo, actual, lo, escala):
+    """
+    Mejora del hipervolumen de 'actual' frente a 'previo' (frentes factibles no dominados),
+    ambos normalizados con la misma (lo, escala) fija y punto de referencia 1.1,
+    como fracción del volumen de la caja de referencia (1.1^n_obj). inf si falta alguno.
+    """
+    if previo is None or actual is None:
+        return np.inf
+    ref = np.full(actual.shape[1], 1.1)
+    hv = HV(ref_point=ref)
+    return float((hv((actual - lo) / escala) - hv((previo - lo) / escala)) / np.prod(ref))
+
+
+class TerminacionConvergencia(Termination):
+    """
+    Para cuando el frente deja de mejorar. En cada generación se guardan la fracción de factibles,
+    la mediana de la violación de restricciones (CV) y el frente factible no dominado.
+    Se para si, respecto a hace `ventana` generaciones, hay frente factible y
+    - la fracción de factibles ha subido menos de tol_factibles,
+    - la mediana de CV ha bajado menos de tol_cv (relativo),
+    - el hipervolumen ha mejorado menos de tol_hv (mejora_hipervolumen). La normalización se fija
+      con el rango de la población en la generación del primer factible (no se reescala en cada ventana).
+    Como mucho, n_max_gen generaciones.
+    """
+    def __init__(self, n_max_gen=GENERACIONES_FIJAS, ventana=VENTANA_CONVERGENCIA,
+                 n_min_gen=GENERACIONES_MINIMAS, tol_hv=TOLERANCIA_HV,
+                 tol_factibles=TOLERANCIA_FACTIBLES, tol_cv=TOLERANCIA_CV):
+        super().__init__()
+        self.n_max_gen = int(n_max_gen)
+        self.ventana = int(ventana)
+        self.n_min_gen = max(int(n_min_gen), self.ventana + 1)
+        self.tol_hv = tol_hv
+        self.tol_factibles = tol_factibles
+        self.tol_cv = tol_cv
+        self.factibles = []
+        self.cv_medianas = []
+        self.frentes = []          # solo los de la ventana
+        self.normalizacion = None  # (lo, escala) de la población cuando aparece el primer factible
+        self.convergencia = False
+
+    def _update(self, algorithm):
+        F, G = algorithm.pop.get("F", "G")
+        cv = np.maximum(G, 0.0).sum(axis=1) if G is not None and G.size > 0 else np.zeros(len(F))
+        factibles = cv <= 0.0
+        frente = None
+        if factibles.any():
+            frente = F[factibles][NonDominatedSorting().do(F[factibles], only_non_dominated_front=True)]
+
+        self.factibles.append(float(factibles.mean()))
+        self.cv_medianas.append(float(np.median(cv)))
+        self.frentes = (self.frentes + [frente])[-(self.ventana + 1):]
+        if self.normalizacion is None and frente is not None:
+            self.normalizacion = normalizacion_poblacion(F)
+
+        n_gen = len(self.factibles)
+        if n_gen >= self.n_max_gen:
+            return 1.0
+        if n_gen >= self.n_min_gen and self.convergido():
+            self.convergencia = True
+            return 1.0
+        return n_gen / self.n_max_gen
+
+    def convergido(self):
+        """Si no ha habido mejora suficiente en la ventana."""
+        v = self.ventana
+        cv_antes, cv_ahora = self.cv_medianas[-v - 1], self.cv_medianas[-1]
+        return (
+            self.frentes[-1] is not None
+            and self.factibles[-1] - self.factibles[-v - 1] < self.tol_factibles
+            and cv_antes - cv_ahora <= self.tol_cv * max(1.0, cv_antes)
+            and mejora_hipervolumen(self.frentes[0], self.frentes[-1], *self.normalizacion) < self.tol_hv
+        )
+
+
 def ref_dirs_100_incremental_12(n_objetivos=3):
     """Genera direcciones de referencia 'incremental' con 12 y los ajusta a EXACTAMENTE 100."""
     dirs = get_reference_directions("incremental", n_objetivos, n_partitions=12)
@@ -36,10 +175,10 @@ def operadores_indices(problem, prob_cruce=0.9, prob_mutacion=1/77, rng=None):
         "mutation": MutacionCustom(problem, prob_mutacion=prob_mutacion, rng=rng),
     }
 
-def ejecutar_nsga3(problem, operadores, seed, verbose=True):
-    """Ejecuta NSGA-III."""
+def crear_nsga3(operadores):
+    """NSGA-III con población fija, direcciones de referencia fijas y los operadores dados."""
     ref_dirs = ref_dirs_100_incremental_12(n_objetivos=3)
-    alg = NSGA3(
+    return NSGA3(
         pop_size=POBLACION_FIJA,
         ref_dirs=ref_dirs,
         sampling=operadores["sampling"] if isinstance(operadores, dict) else operadores.sampling,
@@ -47,11 +186,54 @@ def ejecutar_nsga3(problem, operadores, seed, verbose=True):
         mutation=operadores["mutation"] if isinstance(operadores, dict) else operadores.mutation,
         eliminate_duplicates=True,
     )
-    return minimize(
+
+def crear_terminacion(terminacion, n_generaciones):
+    """Criterio de parada para pymoo: "n_gen" (fijo) o "convergencia" (TerminacionConvergencia)."""
+    if terminacion == "n_gen":
+        return ("n_gen", int(n_generaciones))
+    if terminacion == "convergencia":
+        return TerminacionConvergencia(n_max_gen=n_generaciones)
+    raise ValueError(f"Terminación no reconocida: {terminacion}")
+
+def envolver_cache(problem, cache_evaluaciones):
+    """problem envuelto en ProblemaConCache si cache_evaluaciones (True o capacidad); si no, tal cual."""
+    if not cache_evaluaciones:
+        return problem
+    capacidad = CAPACIDAD_CACHE if cache_evaluaciones is True else int(cache_evaluaciones)
+    return ProblemaConCache(problem, capacidad)
+
+def ejecutar_nsga3(problem, operadores, seed, verbose=True, historial="ligero", n_generaciones=GENERACIONES_FIJAS,
+                   terminacion="n_gen", cache_evaluaciones=False):
+    """
+    Ejecuta NSGA-III durante n_generaciones (por defecto GENERACIONES_FIJAS).
+    terminacion="convergencia" puede parar antes (TerminacionConvergencia con n_generaciones como máximo).
+    res.historial siempre trae las estadísticas por generación (HistorialLigero.resumen)
+    y res.generacion_parada las generaciones ejecutadas.
+    historial="completo" además guarda res.history de pymoo (una copia del algoritmo por generación).
+    cache_evaluaciones (True o capacidad) evalúa a través de ProblemaConCache; res.cache trae sus estadísticas.
+    """
+    if historial not in ("ligero", "completo"):
+        raise ValueError(f"Historial no reconocido: {historial}")
+
+    n_generaciones = int(n_generaciones)
+    criterio = crear_terminacion(terminacion, n_generaciones)
+    problem = envolver_cache(problem, cache_evaluaciones)
+
+    alg = crear_nsga3(operadores)
+    callback = HistorialLigero(n_generaciones, problem.n_obj)
+    res = minimize(
         problem=problem,
         algorithm=alg,
-        termination=("n_gen", GENERACIONES_FIJAS),
-        save_history=True,
+        termination=criterio,
+        save_history=(historial == "completo"),
+        callback=callback,
         verbose=verbose,
         seed=seed,
-    )
\ No newline at end of file
+    )
+    res.historial = callback.resumen()
+    res.generacion_parada = callback.n_gen
+    res.cache = problem.resumen() if isinstance(problem, ProblemaConCache) else None
+    if verbose and res.cache is not None:
+        print(f"Caché de evaluaciones: {res.cache['aciertos']}/{res.cache['consultas']} aciertos "
+              f"({100 * res.cache['tasa_aciertos']:.1f}%)")
+    return res
\ No newline at end of file
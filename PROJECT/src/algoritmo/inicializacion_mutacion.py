@@ -1,45 +1,93 @@
 # inicializacion_mutacion.py — Inicialización y mutación por posición
-# - InicializacionCustom: genera individuos eligiendo índices válidos por gen.
-# - MutacionCustom: recorre genes y cambia a otro índice válido con cierta probabilidad.
+# - InicializacionCustom: genera individuos eligiendo índices válidos por gen (por lotes por tipo).
+# - MutacionCustom: con cierta probabilidad por gen cambia a otro índice válido (máscara para toda la población).
 
 import numpy as np
 from pymoo.operators.sampling.rnd import IntegerRandomSampling
 from pymoo.core.mutation import Mutation
 
+from src.utilidades.planificacion import agrupar_posiciones, corregir_solucion
+
 
 class InicializacionCustom(IntegerRandomSampling):
-    """Crea individuos eligiendo índices válidos por gen."""
-    def __init__(self, problem, rng=None):
+    """
+    Crea individuos eligiendo índices válidos por gen.
+    - vectorizado: agrupa posiciones por tipo y sortea todos los genes de un tipo en una llamada.
+    - semilla: si se indica, la población inicial depende solo de ella y no del rng compartido.
+    - soluciones_iniciales: (k, n_var) que sustituyen a las k primeras filas sorteadas
+      (arranque en caliente), reparadas con corregir_solucion.
+    """
+    def __init__(self, problem, rng=None, vectorizado=True, semilla=None, soluciones_iniciales=None):
         super().__init__()
         self.problem = problem
         self.rng = rng or np.random.default_rng()
+        self.vectorizado = bool(vectorizado)
+        self.semilla = semilla
+        self.soluciones_iniciales = soluciones_iniciales
 
     def _do(self, problem, n_samples, **kwargs):
+        poblacion = self.sortear(problem, n_samples)
+        if self.soluciones_iniciales is not None:
+            validos = self.problem.validos_por_posicion
+            previas = self.soluciones_iniciales[:n_samples]
+            for i, s in enumerate(previas):
+                poblacion[i] = corregir_solucion(s, validos)
+        return poblacion
+
+    def sortear(self, problem, n_samples):
+        """Población aleatoria: un índice válido por gen."""
         n_var = problem.n_var
         poblacion = np.empty((n_samples, n_var), dtype=int)
         validos = self.problem.validos_por_posicion
+        rng = self.rng if self.semilla is None else np.random.default_rng(self.semilla)
 
-        for i in range(n_samples):
-            for pos in range(n_var):
-                poblacion[i, pos] = int(self.rng.choice(validos[pos]))
+        if not self.vectorizado:
+            for i in range(n_samples):
+                for pos in range(n_var):
+                    poblacion[i, pos] = int(rng.choice(validos[pos]))
+            return poblacion
+
+        # un sorteo por tipo: (n_samples, n_posiciones_del_tipo) índices dentro de sus válidos
+        tipos = getattr(self.problem, "tipos_por_posicion", None)
+        for cand, posiciones in agrupar_posiciones(validos, tipos):
+            r = rng.integers(0, cand.size, size=(n_samples, posiciones.size))
+            poblacion[:, posiciones] = cand[r]
         return poblacion
 
 
 class MutacionCustom(Mutation):
-    """Con prob_mutacion por gen, sustituye por otro índice válido de esa posición."""
-    def __init__(self, problem, prob_mutacion=1/77, rng=None):
+    """
+    Con prob_mutacion por gen, sustituye por otro índice válido de esa posición.
+    - vectorizado: una máscara Bernoulli (N, n_var) y sustitutos sorteados por tipo en bloque.
+    """
+    def __init__(self, problem, prob_mutacion=1/77, rng=None, vectorizado=True):
         super().__init__()
         self.problem = problem
         self.prob_mutacion = float(prob_mutacion)
         self.rng = rng or np.random.default_rng()
+        self.vectorizado = bool(vectorizado)
+        self._grupos = None
 
     def _do(self, problem, X, **kwargs):
         X_mut = X.copy()
         validos = self.problem.validos_por_posicion
         n_var = problem.n_var
 
-        for i in range(len(X_mut)):
-            for pos in range(n_var):
-                if self.rng.random() < self.prob_mutacion:
-                    X_mut[i, pos] = int(self.rng.choice(validos[pos]))
+        if not self.vectorizado:
+            for i in range(len(X_mut)):
+                for pos in range(n_var):
+                    if self.rng.random() < self.prob_mutacion:
+                        X_mut[i, pos] = int(self.rng.choice(validos[pos]))
+            return X_mut
+
+        if self._grupos is None:
+            self._grupos = agrupar_posiciones(validos, getattr(self.problem, "tipos_por_posicion", None))
+
+        # solo se tocan las celdas seleccionadas por la máscara
+        mascara = self.rng.random(X_mut.shape) < self.prob_mutacion
+        for cand, posiciones in self._grupos:
+            filas, cols = np.nonzero(mascara[:, posiciones])
+            if filas.size == 0:
+                continue
+            X_mut[filas, posiciones[cols]] = cand[self.rng.integers(0, cand.size, size=filas.size)]
         return X_mut
\ No newline at end of file
@@ -0,0 +1,362 @@
+# islas.py — Modelo de islas para NSGA-III
+# Varias subpoblaciones NSGA-III (una por proceso) con los mismos operadores de preparar_operadores_*.
+# Cada INTERVALO_MIGRACION generaciones cada isla envía sus mejores no dominados a sus vecinas
+# según la topología ("anillo" | "completa"); los que llegan compiten en la supervivencia de NSGA-III.
+# Al final todo se junta en un único Result de pymoo (pop de todas las islas, X/F del frente factible).
+# Las islas se reparten en como mucho n_procesos grupos (GrupoIslas), uno por proceso;
+# con 1 proceso todas se ejecutan en serie dentro del proceso actual.
+# terminacion y cache_evaluaciones se aplican a cada isla (cada una con su criterio y su caché);
+# una isla que converge deja de evolucionar y de recibir migrantes, y el conjunto para cuando paran todas.
+
+import time
+import traceback
+import multiprocessing as mp
+import numpy as np
+
+from pymoo.core.population import Population
+from pymoo.core.result import Result
+from pymoo.util.nds.non_dominated_sorting import NonDominatedSorting
+
+from src.algoritmo.ejecutor_ag import (
+    crear_nsga3, crear_terminacion, envolver_cache, HistorialLigero, GENERACIONES_FIJAS,
+)
+from src.algoritmo.problema import ProblemaConCache
+from src.utilidades.paralelo import resolver_n_procesos
+
+N_ISLAS = 4
+INTERVALO_MIGRACION = 10
+N_MIGRANTES = 5
+
+
+def destinos_anillo(i, n):
+    """La isla i envía a la siguiente."""
+    return [(i + 1) % n] if n > 1 else []
+
+
+def destinos_completa(i, n):
+    """La isla i envía a todas las demás."""
+    return [j for j in range(n) if j != i]
+
+
+TOPOLOGIAS = {
+    "anillo": destinos_anillo,
+    "completa": destinos_completa,
+}
+
+
+def indices_emigrantes(F, G, n, rng):
+    """
+    Hasta n individuos a enviar: del frente no dominado de los factibles
+    (al azar si hay más de n) o, si no hay factibles, los n de menor violación.
+    """
+    if G is None or G.size == 0:
+        factibles = np.ones(len(F), dtype=bool)
+        cv = np.zeros(len(F))
+    else:
+        cv = np.maximum(G, 0.0).sum(axis=1)
+        factibles = cv <= 0.0
+    if not factibles.any():
+        return np.argsort(cv, kind="stable")[:n]
+    frente = np.flatnonzero(factibles)[NonDominatedSorting().do(F[factibles], only_non_dominated_front=True)]
+    if frente.size > n:
+        frente = np.sort(rng.choice(frente, size=n, replace=False))
+    return frente
+
+
+class Isla:
+    """
+    Una subpoblación NSGA-III. Se construye con fabrica(seed=..., **parametros) → (problema, operadores)
+    y avanza generación a generación con la API setup/next de pymoo.
+    terminacion y cache_evaluaciones: como en ejecutar_nsga3.
+    """
+    def __init__(self, fabrica, parametros, seed, n_generaciones, soluciones_iniciales=None,
+                 terminacion="n_gen", cache_evaluaciones=False):
+        problema, operadores = fabrica(seed=seed, **parametros)
+        if soluciones_iniciales is not None:
+            operadores["sampling"].soluciones_iniciales = soluciones_iniciales
+        self.problema = envolver_cache(problema, cache_evaluaciones)
+        self.rng = np.random.default_rng(seed)
+        self.historial = HistorialLigero(n_generaciones, self.problema.n_obj)
+        self.alg = crear_nsga3(operadores)
+        self.alg.setup(
+            self.problema,
+            termination=crear_terminacion(terminacion, n_generaciones),
+            seed=seed,
+            callback=self.historial,
+            verbose=False,
+        )
+
+    def evolucionar(self, n_gen):
+        """
+        Avanza hasta n_gen generaciones (menos si la isla ha terminado).
+        Devuelve (factibles de la población, si la isla sigue activa).
+        """
+        for _ in range(n_gen):
+            if not self.alg.has_next():
+                break
+            self.alg.next()
+        factibles = int(self.historial.n_factibles[self.historial.n_gen - 1]) if self.historial.n_gen else 0
+        return factibles, bool(self.alg.has_next())
+
+    def emigrantes(self, n):
+        """X de los individuos que salen hacia otras islas (copias: siguen aquí)."""
+        X, F, G = self.alg.pop.get("X", "F", "G")
+        return X[indices_emigrantes(F, G, n, self.rng)].copy()
+
+    def inmigrar(self, X):
+        """Evalúa los que llegan y los hace competir con la población en la supervivencia."""
+        if X is None or len(X) == 0:
+            return 0
+        llegados = self.alg.eliminate_duplicates.do(Population.new(X=X), self.alg.pop)
+        if len(llegados) == 0:
+            return 0
+        self.alg.evaluator.eval(self.problema, llegados, algorithm=self.alg)
+        self.alg.pop = self.alg.survival.do(
+            self.problema,
+            Population.merge(self.alg.pop, llegados),
+            n_survive=self.alg.pop_size,
+            algorithm=self.alg,
+            random_state=self.alg.random_state,
+        )
+        return len(llegados)
+
+    def final(self):
+        """(X, F, G) de la población final, el historial por generación y las estadísticas de la caché."""
+        X, F, G = self.alg.pop.get("X", "F", "G")
+        cache = self.problema.resumen() if isinstance(self.problema, ProblemaConCache) else None
+        return X, F, G, self.historial.resumen(), cache
+
+
+class GrupoIslas:
+    """
+    Varias islas en el mismo proceso. Cada orden (metodo, args_por_isla) se aplica a sus islas en orden.
+    enviar/recibir permiten tratar igual un grupo local y uno en otro proceso (GrupoRemoto).
+    """
+    def __init__(self, fabrica, parametros, semillas, n_generaciones, soluciones_por_isla, **opciones):
+        self.islas = [
+            Isla(fabrica, parametros, seed, n_generaciones, soluciones, **opciones)
+            for seed, soluciones in zip(semillas, soluciones_por_isla)
+        ]
+        self._respuesta = None
+
+    def ejecutar(self, metodo, args_por_isla):
+        return [getattr(isla, metodo)(*args) for isla, args in zip(self.islas, args_por_isla)]
+
+    def enviar(self, metodo, args_por_isla):
+        self._respuesta = self.ejecutar(metodo, args_por_isla)
+
+    def recibir(self):
+        return self._respuesta
+
+
+def bucle_grupo(conexion, fabrica, parametros, semillas, n_generaciones, soluciones_por_isla, opciones):
+    """Proceso de un grupo remoto: atiende órdenes (metodo, args_por_isla) hasta recibir None."""
+    try:
+        grupo = GrupoIslas(fabrica, parametros, semillas, n_generaciones, soluciones_por_isla, **opciones)
+        conexion.send(("ok", None))
+    except Exception:
+        conexion.send(("error", traceback.format_exc()))
+        return
+    while True:
+        orden = conexion.recv()
+        if orden is None:
+            break
+        try:
+            conexion.send(("ok", grupo.ejecutar(*orden)))
+        except Exception:
+            conexion.send(("error", traceback.format_exc()))
+    conexion.close()
+
+
+class GrupoRemoto:
+    """GrupoIslas en un proceso propio; mismas llamadas mediante enviar/recibir."""
+    def __init__(self, fabrica, parametros, semillas, n_generaciones, soluciones_por_isla, **opciones):
+        self.conexion, hijo = mp.Pipe()
+        self.proceso = mp.Process(
+            target=bucle_grupo,
+            args=(hijo, fabrica, parametros, semillas, n_generaciones, soluciones_por_isla, opciones),
+            daemon=True,
+        )
+        self.proceso.start()
+        hijo.close()
+        self.recibir()   # espera a que las islas estén construidas
+
+    def enviar(self, metodo, args_por_isla):
+        self.conexion.send((metodo, args_por_isla))
+
+    def recibir(self):
+        estado, valor = self.conexion.recv()
+        if estado == "error":
+            raise RuntimeError(f"Error en una isla:\n{valor}")
+        return valor
+
+    def cerrar(self):
+        try:
+            self.conexion.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.proceso.join()
+
+
+def repartir_islas(n_islas, n_grupos):
+    """Índices de isla de cada grupo (reparto alterno: la isla i va al grupo i % n_grupos)."""
+    return [list(range(g, n_islas, n_grupos)) for g in range(n_grupos)]
+
+
+def repartir_soluciones(soluciones_iniciales, n_islas):
+    """
+    Soluciones iniciales de cada isla: la isla i recibe las filas i, i + n_islas, ...
+    (None si no le toca ninguna), para que las islas no partan de los mismos individuos.
+    """
+    if soluciones_iniciales is None:
+        return [None] * n_islas
+    soluciones_iniciales = np.asarray(soluciones_iniciales)
+    return [soluciones_iniciales[i::n_islas] if i < len(soluciones_iniciales) else None for i in range(n_islas)]
+
+
+def llamar(grupos, reparto, metodo, args_por_isla):
+    """
+    Lanza metodo en todas las islas y después recoge las respuestas (en paralelo si los grupos son remotos).
+    Las respuestas salen en el orden de las islas.
+    """
+    for grupo, indices in zip(grupos, reparto):
+        grupo.enviar(metodo, [args_por_isla[i] for i in indices])
+    respuestas = [None] * len(args_por_isla)
+    for grupo, indices in zip(grupos, reparto):
+        for i, r in zip(indices, grupo.recibir()):
+            respuestas[i] = r
+    return respuestas
+
+
+def rellenar_hasta(serie, n):
+    """Repite la última fila de serie hasta tener n filas."""
+    if len(serie) >= n or len(serie) == 0:
+        return serie[:n]
+    return np.concatenate([serie, np.repeat(serie[-1:], n - len(serie), axis=0)])
+
+
+def combinar_historiales(historiales):
+    """
+    Historial único por generación: mediana de las medianas de F de las islas,
+    cv = [mínimo, mediana de medianas, media de medias] y factibles sumados.
+    Una isla que ha parado antes que las demás cuenta con su última generación.
+    """
+    n = max(len(h["n_factibles"]) for h in historiales)
+    medianas = np.stack([rellenar_hasta(h["medianas_F"], n) for h in historiales])
+    cv = np.stack([rellenar_hasta(h["cv"], n) for h in historiales])
+    return {
+        "medianas_F": np.median(medianas, axis=0),
+        "cv": np.column_stack([cv[:, :, 0].min(axis=0), np.median(cv[:, :, 1], axis=0), cv[:, :, 2].mean(axis=0)]),
+        "n_factibles": np.sum([rellenar_hasta(h["n_factibles"], n) for h in historiales], axis=0),
+    }
+
+
+def combinar_caches(caches):
+    """Estadísticas de caché sumadas sobre las islas (None si no se ha usado)."""
+    caches = [c for c in caches if c is not None]
+    if not caches:
+        return None
+    total = {k: sum(c[k] for c in caches) for k in ("consultas", "evaluados", "aciertos", "tamano")}
+    total["tasa_aciertos"] = total["aciertos"] / total["consultas"] if total["consultas"] else 0.0
+    return total
+
+
+def combinar_resultados(finales, t0):
+    """Result de pymoo con la población de todas las islas y el frente factible no dominado en X/F/G."""
+    X = np.vstack([f[0] for f in finales])
+    F = np.vstack([f[1] for f in finales])
+    G = np.vstack([f[2] for f in finales])
+    cv = np.maximum(G, 0.0).sum(axis=1) if G.size > 0 else np.zeros(len(F))
+
+    res = Result()
+    res.pop = Population.new("X", X, "F", F, "G", G, "CV", cv[:, None])
+    factibles = cv <= 0.0
+    if factibles.any():
+        idx = np.flatnonzero(factibles)[NonDominatedSorting().do(F[factibles], only_non_dominated_front=True)]
+        res.opt = res.pop[idx]
+        res.X, res.F, res.G, res.CV = X[idx], F[idx], G[idx], cv[idx, None]
+    res.start_time = t0
+    res.end_time = time.time()
+    res.exec_time = res.end_time - t0
+    res.historial = combinar_historiales([f[3] for f in finales])
+    res.historial_islas = [f[3] for f in finales]
+    res.generacion_parada = len(res.historial["n_factibles"])
+    res.cache = combinar_caches([f[4] for f in finales])
+    return res
+
+
+def ejecutar_islas(
+    fabrica,
+    parametros,
+    seed,
+    *,
+    n_islas=N_ISLAS,
+    n_generaciones=GENERACIONES_FIJAS,
+    intervalo_migracion=INTERVALO_MIGRACION,
+    n_migrantes=N_MIGRANTES,
+    topologia="anillo",
+    n_procesos=None,
+    soluciones_iniciales=None,
+    terminacion="n_gen",
+    cache_evaluaciones=False,
+    verbose=True,
+):
+    """
+    Ejecuta NSGA-III con n_islas subpoblaciones y migración periódica.
+    fabrica(seed=..., **parametros) debe devolver (problema, operadores) y poder usarse en otro
+    proceso (función de módulo, p. ej. preparar_vectores). La isla i usa la semilla seed + i.
+    soluciones_iniciales (arranque en caliente) se reparten entre las islas (repartir_soluciones).
+    n_procesos: None → todos los núcleos; 1 → islas en serie en este proceso. Nunca se lanzan más
+    de n_procesos procesos: cada uno ejecuta un grupo de islas (repartir_islas).
+    terminacion / cache_evaluaciones: como en ejecutar_nsga3, en cada isla; el conjunto para cuando
+    todas las islas han parado y res.cache suma las estadísticas de las cachés.
+    Devuelve un Result de pymoo con res.historial (combinado) y res.historial_islas.
+    """
+    if topologia not in TOPOLOGIAS:
+        raise ValueError(f"Topología no reconocida: {topologia}")
+    destinos = TOPOLOGIAS[topologia]
+    n_generaciones = int(n_generaciones)
+    t0 = time.time()
+
+    opciones = {"terminacion": terminacion, "cache_evaluaciones": cache_evaluaciones}
+    crear_terminacion(terminacion, n_generaciones)   # valida antes de lanzar procesos
+
+    n_grupos = min(resolver_n_procesos(n_procesos), n_islas)
+    clase = GrupoRemoto if n_grupos > 1 else GrupoIslas
+    reparto = repartir_islas(n_islas, n_grupos)
+    soluciones = repartir_soluciones(soluciones_iniciales, n_islas)
+    grupos = []
+    try:
+        for indices in reparto:
+            semillas = [seed + i for i in indices]
+            grupos.append(clase(fabrica, parametros, semillas, n_generaciones,
+                                [soluciones[i] for i in indices], **opciones))
+
+        gen = 0
+        while gen < n_generaciones:
+            paso = min(intervalo_migracion, n_generaciones - gen)
+            factibles, activas = zip(*llamar(grupos, reparto, "evolucionar", [(paso,)] * n_islas))
+            gen += paso
+            if verbose:
+                print(f"[islas] gen {gen}/{n_generaciones} | factibles por isla: {list(factibles)}")
+            if not any(activas):
+                break
+            if gen >= n_generaciones or n_islas < 2:
+                continue
+
+            # migración: copias de los no dominados de cada isla a sus destinos (que sigan activos)
+            salientes = llamar(grupos, reparto, "emigrantes", [(n_migrantes,)] * n_islas)
+            entrantes = [[] for _ in range(n_islas)]
+            for i, X in enumerate(salientes):
+                for j in destinos(i, n_islas):
+                    if activas[j]:
+                        entrantes[j].append(X)
+            llamar(grupos, reparto, "inmigrar", [(np.vstack(e) if e else None,) for e in entrantes])
+
+        finales = llamar(grupos, reparto, "final", [()] * n_islas)
+    finally:
+        for grupo in grupos:
+            if isinstance(grupo, GrupoRemoto):
+                grupo.cerrar()
+
+    return combinar_resultados(finales, t0)
@@ -7,6 +7,11 @@
 #   G1: Alergias (penalización si aparece algún grupo con alergia).
 #   G2: Calorías fuera del rango [90%, 110%] del objetivo diario.
 #   G3: Macronutrientes fuera de sus rangos permitidos.
+# Evaluación incremental: EstadoEvaluacion guarda los totales por día y solo se recalculan los días tocados.
+# ProblemaConCache: envoltorio opcional que no reevalúa cromosomas ya vistos (LRU).
+
+from collections import OrderedDict
+from dataclasses import dataclass
 
 import numpy as np
 from pymoo.core.problem import Problem
@@ -18,7 +23,8 @@ from src.utilidades.constantes import (
     PENALIZACION_PREFERENCIA, PENALIZACION_ALERGIA
 )
 from src.utilidades.nutricion import calculo_macronutrientes
-from src.utilidades.planificacion import filtrar_comida
+from src.utilidades.carga_datos_csv import codificar_grupos, columna_comida
+from src.utilidades.planificacion import indices_tipo
 
 
 # -----------------------------
@@ -41,17 +47,15 @@ def restriccion_calorias(calorias_diarias, objetivo_calorico):
                     0.0)
 
 
-def objetivo_macronutrientes(proteinas_diarias, carbohidratos_diarias, grasas_diarias):
-    """F2: suma de desviaciones absolutas de P/C/G respecto a sus objetivos (%)."""
-    p, c, g = calculo_macronutrientes(proteinas_diarias, carbohidratos_diarias, grasas_diarias)
+def desviacion_macronutrientes(p, c, g):
+    """F2 a partir de porcentajes P/C/G ya calculados."""
     return (np.abs(p - OBJETIVO_PROTEINAS) +
             np.abs(c - OBJETIVO_CARBOHIDRATOS) +
             np.abs(g - OBJETIVO_GRASAS))
 
 
-def restriccion_macronutrientes(proteinas_diarias, carbohidratos_diarias, grasas_diarias):
-    """G3: penalización si P/C/G salen de sus rangos permitidos."""
-    p, c, g = calculo_macronutrientes(proteinas_diarias, carbohidratos_diarias, grasas_diarias)
+def penalizacion_macronutrientes(p, c, g):
+    """G3 a partir de porcentajes P/C/G ya calculados."""
     pen = np.zeros_like(p, dtype=float)
     pen += np.where((p < LIMITE_PROTEINAS[0]) | (p > LIMITE_PROTEINAS[1]),
                     np.abs(p - OBJETIVO_PROTEINAS), 0.0)
@@ -62,6 +66,18 @@ def restriccion_macronutrientes(proteinas_diarias, carbohidratos_diarias, grasas
     return pen
 
 
+def objetivo_macronutrientes(proteinas_diarias, carbohidratos_diarias, grasas_diarias):
+    """F2: suma de desviaciones absolutas de P/C/G respecto a sus objetivos (%)."""
+    p, c, g = calculo_macronutrientes(proteinas_diarias, carbohidratos_diarias, grasas_diarias)
+    return desviacion_macronutrientes(p, c, g)
+
+
+def restriccion_macronutrientes(proteinas_diarias, carbohidratos_diarias, grasas_diarias):
+    """G3: penalización si P/C/G salen de sus rangos permitidos."""
+    p, c, g = calculo_macronutrientes(proteinas_diarias, carbohidratos_diarias, grasas_diarias)
+    return penalizacion_macronutrientes(p, c, g)
+
+
 def objetivo_preferencia_grupo(grupos_alimentos, grupos_gusta, grupos_no_gusta):
     """F3: resta por gustos y suma por no-gustos según los grupos de cada alimento."""
     ga = np.asarray(grupos_alimentos)
@@ -95,10 +111,15 @@ class PlanningComida(Problem):
     """
     Problema de planificación nutricional usando índices de alimentos.
     Variables: NUM_GENES índices enteros del catálogo.
+    Motores de evaluación (mismos F/G bit a bit):
+      - "semanal": toda la semana de una vez, sin bucle por días.
+      - "diario": bucle original día a día.
     """
 
+    MOTORES = ("semanal", "diario")
+
     def __init__(self, comida_bd, objetivo_calorias, edad,
-                 grupos_alergia, grupos_gusta, grupos_no_gusta):
+                 grupos_alergia, grupos_gusta, grupos_no_gusta, motor="semanal"):
 
         super().__init__(n_var=NUM_GENES, n_obj=3, n_constr=3,
                          xl=0, xu=len(comida_bd) - 1, elementwise=False)
@@ -110,12 +131,16 @@ class PlanningComida(Problem):
         self.grupos_gusta = grupos_gusta
         self.grupos_no_gusta = grupos_no_gusta
 
+        if motor not in self.MOTORES:
+            raise ValueError(f"Motor de evaluación no reconocido: {motor}")
+        self.motor = motor
+
         # Listas de índices por tipo de comida
-        self.almuerzo_cena   = np.array(filtrar_comida(comida_bd, "almuerzo_cena",   self.edad), dtype=int)
-        self.bebidas         = np.array(filtrar_comida(comida_bd, "bebidas",         self.edad), dtype=int)
-        self.desayuno        = np.array(filtrar_comida(comida_bd, "desayuno",        self.edad), dtype=int)
-        self.bebida_desayuno = np.array(filtrar_comida(comida_bd, "bebida_desayuno", self.edad), dtype=int)
-        self.snacks          = np.array(filtrar_comida(comida_bd, "snacks",          self.edad), dtype=int)
+        self.almuerzo_cena   = indices_tipo(comida_bd, "almuerzo_cena",   self.edad)
+        self.bebidas         = indices_tipo(comida_bd, "bebidas",         self.edad)
+        self.desayuno        = indices_tipo(comida_bd, "desayuno",        self.edad)
+        self.bebida_desayuno = indices_tipo(comida_bd, "bebida_desayuno", self.edad)
+        self.snacks          = indices_tipo(comida_bd, "snacks",          self.edad)
 
         # Campos que se pueden establecer desde otros módulos
         self.X_normalizado = None
@@ -124,11 +149,22 @@ class PlanningComida(Problem):
         self.medias_por_tipo = None
 
         # Valores precalculados por alimento
-        self._cal = np.array([a["calorias"]      for a in self.comida_bd], dtype=float)
-        self._pro = np.array([a["proteinas"]     for a in self.comida_bd], dtype=float)
-        self._car = np.array([a["carbohidratos"] for a in self.comida_bd], dtype=float)
-        self._gra = np.array([a["grasas"]        for a in self.comida_bd], dtype=float)
-        self._grp = np.array([a["grupo"]         for a in self.comida_bd], dtype=object)
+        self._cal = columna_comida(self.comida_bd, "calorias")
+        self._pro = columna_comida(self.comida_bd, "proteinas")
+        self._car = columna_comida(self.comida_bd, "carbohidratos")
+        self._gra = columna_comida(self.comida_bd, "grasas")
+        self._grp = columna_comida(self.comida_bd, "grupo", dtype=object)
+
+        # Grupos internados a enteros y pesos del sujeto por alimento:
+        #   preferencia: -1 gusta, +1 no gusta (0 si ambos o ninguno)
+        #   alergia: 1 si el grupo del alimento está en sus alergias
+        codigos, self._grp_id = codificar_grupos(self.comida_bd)
+        pref_grupo = np.isin(codigos, grupos_no_gusta).astype(np.int8) - np.isin(codigos, grupos_gusta).astype(np.int8)
+        self._pref = pref_grupo[self._grp_id]
+        self._alergia = np.isin(codigos, grupos_alergia).astype(np.int8)[self._grp_id]
+
+        # Tabla de nutrientes (4, n_alimentos): [calorias, proteinas, carbohidratos, grasas]
+        self._nutrientes = np.stack([self._cal, self._pro, self._car, self._gra])
 
     def _evaluate(self, X, out, *args, **kwargs):
         """
@@ -142,6 +178,10 @@ class PlanningComida(Problem):
           G3 = macronutrientes fuera de rango
         """
         X = X.astype(int, copy=False)
+        if self.motor == "semanal":
+            out["F"], out["G"] = self._evaluar_semanal(X)
+            return
+
         n_ind, _ = X.shape
 
         f_cal = np.zeros(n_ind)
@@ -178,4 +218,183 @@ class PlanningComida(Problem):
             g_mac += restriccion_macronutrientes(pros, carbs, gras)
 
         out["F"] = np.column_stack([f_cal, f_mac, f_pref])
-        out["G"] = np.column_stack([g_ale, g_cal, g_mac])
\ No newline at end of file
+        out["G"] = np.column_stack([g_ale, g_cal, g_mac])
+
+    def _evaluar_semanal(self, X):
+        """
+        Evalúa la semana completa sin bucle por días.
+        X se ve como (N, NUM_DIAS, NUM_ALIMENTOS_DIARIO) y se indexa la tabla de
+        nutrientes una sola vez. Devuelve (F, G) con las mismas columnas que el bucle diario.
+        """
+        n_ind = X.shape[0]
+        idx = X.reshape(n_ind, NUM_DIAS, NUM_ALIMENTOS_DIARIO)
+        return self._objetivos_por_dia(*self._totales_por_dia(idx))
+
+    def _totales_por_dia(self, idx):
+        """
+        idx (..., NUM_ALIMENTOS_DIARIO): un día por fila.
+        Devuelve (totales, pref, alerg): totales (4, ...) de calorías/proteínas/carbohidratos/grasas,
+        y recuentos de preferencia y alergia por día.
+        """
+        forma = idx.shape[:-1]
+        # Totales diarios: la suma se hace por filas de 11 alimentos, igual que en el bucle diario
+        totales = self._nutrientes[:, idx].reshape(-1, NUM_ALIMENTOS_DIARIO).sum(axis=1)
+        # Preferencias y alergias por día: indexación de los pesos del sujeto y suma
+        pref = self._pref[idx].sum(axis=-1)
+        alerg = self._alergia[idx].sum(axis=-1)
+        return totales.reshape((4,) + forma), pref, alerg
+
+    def _objetivos_por_dia(self, totales, pref, alerg):
+        """(F, G) a partir de los totales (4, N, NUM_DIAS) y recuentos (N, NUM_DIAS) por día."""
+        cals, pros, carbs, gras = totales
+
+        # Porcentajes P/C/G una sola vez para F2 y G3
+        p, c, g = calculo_macronutrientes(pros, carbs, gras)
+
+        # Columnas por día (N, NUM_DIAS, 6): F1, F2, F3, G1, G2, G3
+        por_dia = np.stack([
+            objetivo_calorias(cals, self.objetivo_calorias),
+            desviacion_macronutrientes(p, c, g),
+            pref * PENALIZACION_PREFERENCIA,
+            alerg * (PENALIZACION_ALERGIA ** 2),
+            restriccion_calorias(cals, self.objetivo_calorias),
+            penalizacion_macronutrientes(p, c, g),
+        ], axis=2).astype(float, copy=False)
+
+        # Suma secuencial de los días (mismo orden que el bucle diario)
+        total = np.add.accumulate(por_dia, axis=1)[:, -1]
+        return total[:, :3], total[:, 3:]
+
+    # --- Evaluación incremental ------------------------------------------------
+
+    def crear_estado(self, X):
+        """EstadoEvaluacion de X (totales por día calculados desde cero)."""
+        X = np.array(X, dtype=np.int64)
+        idx = X.reshape(len(X), NUM_DIAS, NUM_ALIMENTOS_DIARIO)
+        totales, pref, alerg = self._totales_por_dia(idx)
+        return EstadoEvaluacion(X=X, totales=totales, pref=pref, alerg=alerg)
+
+    def actualizar_estado(self, estado, X_nuevo, cambiados=None):
+        """
+        Lleva el estado a X_nuevo recalculando solo los días con algún gen cambiado.
+        cambiados: máscara (N, NUM_GENES) de genes tocados (p. ej. el gen que cambia la búsqueda local);
+        si no se da, se compara con estado.X. Devuelve el mismo estado, actualizado.
+        """
+        X_nuevo = np.asarray(X_nuevo, dtype=np.int64)
+        if cambiados is None:
+            cambiados = X_nuevo != estado.X
+        n_ind = len(X_nuevo)
+        dias = np.asarray(cambiados, dtype=bool).reshape(n_ind, NUM_DIAS, NUM_ALIMENTOS_DIARIO).any(axis=2)
+        filas, ds = np.nonzero(dias)
+        if filas.size:
+            idx = X_nuevo.reshape(n_ind, NUM_DIAS, NUM_ALIMENTOS_DIARIO)[filas, ds]
+            totales, pref, alerg = self._totales_por_dia(idx)
+            estado.totales[:, filas, ds] = totales
+            estado.pref[filas, ds] = pref
+            estado.alerg[filas, ds] = alerg
+        estado.X[...] = X_nuevo
+        return estado
+
+    def evaluar_estado(self, estado):
+        """(F, G) del estado; los mismos bit a bit que evaluar X desde cero."""
+        return self._objetivos_por_dia(estado.totales, estado.pref, estado.alerg)
+
+
+@dataclass
+class EstadoEvaluacion:
+    """
+    Lo necesario para reevaluar sin recorrer los 77 genes:
+    - X: (N, NUM_GENES) cromosomas
+    - totales: (4, N, NUM_DIAS) calorías, proteínas, carbohidratos y grasas por día
+    - pref, alerg: (N, NUM_DIAS) recuentos de preferencia y alergia por día
+    """
+    X: np.ndarray
+    totales: np.ndarray
+    pref: np.ndarray
+    alerg: np.ndarray
+
+    def copiar(self, filas=None):
+        """Copia del estado (opcionalmente solo de algunas filas)."""
+        sel = slice(None) if filas is None else filas
+        return EstadoEvaluacion(
+            X=self.X[sel].copy(),
+            totales=self.totales[:, sel].copy(),
+            pref=self.pref[sel].copy(),
+            alerg=self.alerg[sel].copy(),
+        )
+
+
+# -----------------------------
+# CACHÉ DE EVALUACIONES
+# -----------------------------
+
+CAPACIDAD_CACHE = 50_000
+
+
+class ProblemaConCache(Problem):
+    """
+    Envuelve un problema de índices y memoriza (F, G) por cromosoma (LRU acotada entre generaciones).
+    - clave: bytes del cromosoma como int64 (el dict la hashea una vez).
+    - solo se evalúan los cromosomas no vistos, y cada uno una vez aunque se repita en el lote.
+    - F/G de cada fila no dependen del resto del lote: los valores cacheados son los mismos bit a bit.
+    El resto de atributos (validos_por_posicion, X_normalizado...) se leen del problema envuelto.
+    """
+    def __init__(self, problema, capacidad=CAPACIDAD_CACHE):
+        super().__init__(n_var=problema.n_var, n_obj=problema.n_obj, n_ieq_constr=problema.n_ieq_constr,
+                         xl=problema.xl, xu=problema.xu, elementwise=False)
+        self.problema = problema
+        self.capacidad = int(capacidad)
+        self.cache = OrderedDict()
+        self.consultas = 0
+        self.evaluados = 0
+
+    def __getattr__(self, nombre):
+        # solo se llama si el atributo no está en el envoltorio
+        if nombre == "problema":
+            raise AttributeError(nombre)
+        return getattr(self.problema, nombre)
+
+    def _evaluate(self, X, out, *args, **kwargs):
+        X = np.ascontiguousarray(X, dtype=np.int64)
+        n_obj = self.n_obj
+        valores = np.empty((len(X), n_obj + self.n_ieq_constr))
+
+        pendientes = {}     # clave -> filas del lote con ese cromosoma
+        for i, fila in enumerate(X):
+            clave = fila.tobytes()
+            v = self.cache.get(clave)
+            if v is not None:
+                self.cache.move_to_end(clave)
+                valores[i] = v
+            else:
+                pendientes.setdefault(clave, []).append(i)
+
+        if pendientes:
+            primeras = [filas[0] for filas in pendientes.values()]
+            sub = {}
+            self.problema._evaluate(X[primeras], sub)
+            FG = np.hstack([sub["F"], sub["G"]])
+            for (clave, filas), v in zip(pendientes.items(), FG):
+                valores[filas] = v
+                self.cache[clave] = v
+            while len(self.cache) > self.capacidad:
+                self.cache.popitem(last=False)
+
+        self.consultas += len(X)
+        self.evaluados += len(pendientes)
+        out["F"] = valores[:, :n_obj]
+        out["G"] = valores[:, n_obj:]
+
+    def tasa_aciertos(self):
+        """Fracción de cromosomas consultados que no hubo que evaluar."""
+        return 1.0 - self.evaluados / self.consultas if self.consultas else 0.0
+
+    def resumen(self):
+        """Estadísticas de la caché."""
+        return {
+            "consultas": self.consultas,
+            "evaluados": self.evaluados,
+            "aciertos": self.consultas - self.evaluados,
+            "tasa_aciertos": self.tasa_aciertos(),
+            "tamano": len(self.cache),
+        }
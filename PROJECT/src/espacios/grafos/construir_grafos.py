@@ -1,16 +1,23 @@
 # construir_grafos.py — Genera grafos de similitud por tipo de gen
 # Crea 3 (matrices) × 3 (filtros) × 5 (tipos) = 45 grafos en data/procesado/grafos/.
+# Las combinaciones se reparten en un pool de procesos (matrices mapeadas en memoria, solo lectura)
+# y un manifiesto con la huella de las entradas evita reconstruir los grafos que no cambian.
 
 import os
+import json
 import time
-import math
+import pickle
+import hashlib
 import numpy as np
 import networkx as nx
 
 from PROJECT.src.utilidades.carga_datos_csv import leer_comidas
 from src.utilidades.constantes import TipoComida
-from src.utilidades.planificacion import filtrar_comida
-from src.espacios.grafos.filtrado_aristas import filtrar_knn, filtrar_knn_doble, filtrar_umbral
+from src.utilidades.planificacion import indices_tipo
+from src.utilidades.paralelo import pool_procesos, mapear_ordenado
+from src.espacios.grafos.filtrado_aristas import (
+    submatriz_similitud, aristas_knn, aristas_knn_doble, aristas_umbral
+)
 
 DIR_MATRICES = os.path.join("data", "procesado", "matrices")
 DIR_GRAFOS   = os.path.join("data", "procesado", "grafos")
@@ -35,23 +42,47 @@ TIPOS = [
 
 EDAD_REFERENCIA = 18
 
+# huellas de las entradas de cada grafo (cambiar la versión fuerza a reconstruir todos)
+MANIFIESTO = os.path.join(DIR_GRAFOS, "manifiesto_grafos.json")
+VERSION_GRAFOS = 1
+
 # utilidades
 
 def asegurar_dir(path):
     os.makedirs(path, exist_ok=True)
 
 def cargar_matriz_similitud(nombre: str):
-    """Carga una matriz de similitud."""
+    """Abre una matriz de similitud mapeada en memoria (solo se leen las submatrices de cada tipo)."""
     ruta = os.path.join(DIR_MATRICES, MATRICES[nombre])
-    return np.load(ruta).astype(np.float32, copy=False)
+    return np.load(ruta, mmap_mode="r")
 
 def indices_validos_por_tipo(comida_bd, tipo_token):
     """Índices válidos para un tipo concreto."""
-    return np.asarray(filtrar_comida(comida_bd, tipo_token, EDAD_REFERENCIA), dtype=int)
+    return indices_tipo(comida_bd, tipo_token, EDAD_REFERENCIA)
 
-def construir_grafo(M: np.ndarray, indices: np.ndarray, nombres: list[str] | None, nombre_tipo: str):
+def aristas_filtradas(S: np.ndarray, indices: np.ndarray, nombre: str):
+    """Aristas (a, b) en posiciones de 'indices' para knn, knn_doble o umbral."""
+    if nombre == "knn":
+        return aristas_knn(S, k=K_KNN)
+    if nombre == "knn_doble":
+        return aristas_knn_doble(S, indices, k=K_KNN_DOBLE)
+    if nombre == "umbral":
+        return aristas_umbral(S, umbral=UMBRAL)
+    raise ValueError("Filtro no reconocido")
+
+
+def construir_grafo(M: np.ndarray, indices: np.ndarray, nombres: list[str] | None, nombre_tipo: str, filtro: str):
     """
-    Grafo no dirigido sobre el subconjunto 'indices'. Peso = similitud M[u, v].
+    Grafo no dirigido y ya filtrado sobre el subconjunto 'indices'. Peso = similitud M[u, v].
+    Las aristas salen de la submatriz (sin crear el grafo completo).
+    """
+    S = submatriz_similitud(M, indices) if indices.size else None
+    return grafo_desde_submatriz(S, indices, nombres, nombre_tipo, filtro)
+
+
+def grafo_desde_submatriz(S: np.ndarray, indices: np.ndarray, nombres: list[str] | None, nombre_tipo: str, filtro: str):
+    """
+    Grafo filtrado a partir de la submatriz del tipo (ver submatriz_similitud).
     Nodos con atributos: idx (global), idx_local, tipo y nombre (si se pasa).
     """
     G = nx.Graph()
@@ -66,28 +97,44 @@ def construir_grafo(M: np.ndarray, indices: np.ndarray, nombres: list[str] | Non
             attrs["nombre"] = nombres[int(i_global)]
         G.add_node(int(i_global), **attrs)
 
-    # aristas (u < v)
-    for a in range(n):
-        u = int(indices[a])
-        fila = M[u, indices]
-        for b in range(a + 1, n):
-            v = int(indices[b])
-            w = float(fila[b])
-            if math.isfinite(w):
-                G.add_edge(u, v, weight=w)
-
+    # aristas del filtro
+    A, B = aristas_filtradas(S, indices, filtro)
+    G.add_edges_from(
+        (int(indices[a]), int(indices[b]), {"weight": float(w)})
+        for a, b, w in zip(A, B, S[A, B])
+    )
     return G
 
 
-def aplicar_filtro(G: nx.Graph, nombre: str) -> nx.Graph:
-    """Aplica knn, knn_doble o umbral."""
-    if nombre == "knn":
-        return filtrar_knn(G, k=K_KNN, weight="weight")
-    if nombre == "knn_doble":
-        return filtrar_knn_doble(G, k=K_KNN_DOBLE, weight="weight")
-    if nombre == "umbral":
-        return filtrar_umbral(G, umbral=UMBRAL, weight="weight")
-    raise ValueError("Filtro no reconocido")
+def huella_entradas(S, indices, nombres, nombre_tipo: str, filtro: str):
+    """sha1 de todo lo que determina un grafo: parámetros, ids, nombres y submatriz."""
+    h = hashlib.sha1()
+    parametros = {"version": VERSION_GRAFOS, "tipo": nombre_tipo, "filtro": filtro,
+                  "k_knn": K_KNN, "k_knn_doble": K_KNN_DOBLE, "umbral": UMBRAL}
+    h.update(json.dumps(parametros, sort_keys=True).encode())
+    h.update(np.asarray(indices, dtype=np.int64).tobytes())
+    if nombres is not None:
+        h.update("\x00".join(str(nombres[int(i)]) for i in indices).encode())
+    if S is not None:
+        h.update(np.ascontiguousarray(S).tobytes())
+    return h.hexdigest()
+
+
+def leer_manifiesto(ruta=MANIFIESTO):
+    """Huella por fichero de grafo ({} si no hay manifiesto)."""
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def guardar_manifiesto(manifiesto: dict, ruta=MANIFIESTO):
+    """Escribe el manifiesto en un temporal y lo renombra."""
+    asegurar_dir(os.path.dirname(ruta))
+    tmp = f"{ruta}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, indent=2, sort_keys=True)
+    os.replace(tmp, ruta)
 
 
 def nombre_salida(matriz: str, filtro: str, tipo: str) -> str:
@@ -95,54 +142,102 @@ def nombre_salida(matriz: str, filtro: str, tipo: str) -> str:
 
 
 def guardar_grafo(G: nx.Graph, ruta: str):
-    """Guarda el grafo en formato gpickle."""
-    nx.write_gpickle(G, ruta)
+    """Guarda el grafo en formato gpickle (NX 3.x ya no trae write_gpickle: pickle puro)."""
+    f = getattr(nx, "write_gpickle", None)
+    if callable(f):
+        f(G, ruta)
+        return
+    with open(ruta, "wb") as h:
+        pickle.dump(G, h, protocol=pickle.HIGHEST_PROTOCOL)
 
 
-def construir_y_guardar(M: np.ndarray, matriz: str, filtro: str, tipo_nombre: str, tipo_token, nombres, comida_bd):
-    """Construye y guarda el grafo para una combinación (matriz, filtro, tipo)."""
+def construir_y_guardar(M: np.ndarray, matriz: str, filtro: str, tipo_nombre: str, tipo_token, nombres, comida_bd,
+                        huella_previa=None):
+    """
+    Construye y guarda el grafo para una combinación (matriz, filtro, tipo).
+    Si la huella de las entradas coincide con huella_previa y el fichero existe, no hace nada.
+    Devuelve (nombre del fichero, huella, mensaje).
+    """
     idx = indices_validos_por_tipo(comida_bd, tipo_token)
-    G = construir_grafo(M, idx, nombres, tipo_nombre)
-    Gf = aplicar_filtro(G, filtro)
+    S = submatriz_similitud(M, idx) if idx.size else None
+    huella = huella_entradas(S, idx, nombres, tipo_nombre, filtro)
 
+    nombre = nombre_salida(matriz, filtro, tipo_nombre)
+    ruta = os.path.join(DIR_GRAFOS, nombre)
+    if huella == huella_previa and os.path.exists(ruta):
+        return nombre, huella, f"   = {tipo_nombre:15s}  sin cambios  → {ruta}"
+
+    Gf = grafo_desde_submatriz(S, idx, nombres, tipo_nombre, filtro)
     asegurar_dir(DIR_GRAFOS)
-    ruta = os.path.join(DIR_GRAFOS, nombre_salida(matriz, filtro, tipo_nombre))
     guardar_grafo(Gf, ruta)
-    print(f"   ✔ {tipo_nombre:15s}  nodos={Gf.number_of_nodes():4d}  aristas={Gf.number_of_edges():5d}  → {ruta}")
+    return nombre, huella, f"   ✔ {tipo_nombre:15s}  nodos={Gf.number_of_nodes():4d}  aristas={Gf.number_of_edges():5d}  → {ruta}"
 
 
-# ejecutar y crear grafos
+# estado por proceso: catálogo y matrices mapeadas (se abren una vez por worker)
+
+_COMIDA_BD = None
+_NOMBRES = None
+_MATRICES = {}
+
 
-def main():
+def iniciar_worker(comida_bd):
+    """Deja el catálogo en el proceso; las matrices se abren al primer uso."""
+    global _COMIDA_BD, _NOMBRES
+    _COMIDA_BD = comida_bd
+    _NOMBRES = [a["nombre"] for a in comida_bd]
+    _MATRICES.clear()
 
+
+def construir_tarea(tarea):
+    """Tarea del pool: (matriz, filtro, tipo_nombre, tipo_token, huella_previa)."""
+    nombre_matriz, filtro, tipo_nombre, tipo_token, huella_previa = tarea
+    if nombre_matriz not in _MATRICES:
+        _MATRICES[nombre_matriz] = cargar_matriz_similitud(nombre_matriz)
+    return construir_y_guardar(
+        M=_MATRICES[nombre_matriz],
+        matriz=nombre_matriz,
+        filtro=filtro,
+        tipo_nombre=tipo_nombre,
+        tipo_token=tipo_token,
+        nombres=_NOMBRES,
+        comida_bd=_COMIDA_BD,
+        huella_previa=huella_previa,
+    )
+
+
+# ejecutar y crear grafos
+
+def main(n_procesos=None, forzar=False):
+    """
+    Construye los 45 grafos en paralelo (n_procesos=None: todos los núcleos).
+    Con forzar=True se ignora el manifiesto y se reconstruye todo.
+    """
     print("Construcción de grafos")
     print(f"Salida:   {DIR_GRAFOS}\n")
 
     comida_bd = leer_comidas()
-    nombres = [a["nombre"] for a in comida_bd]
-
-    matrices = {k: cargar_matriz_similitud(k) for k in MATRICES.keys()}
+    manifiesto = {} if forzar else leer_manifiesto()
 
     filtros = ["knn", "knn_doble", "umbral"]
-    total = len(matrices) * len(filtros) * len(TIPOS)
-    i = 0
-
-    for nombre_matriz, M in matrices.items():
-        print(f"\n[MATRIZ] {nombre_matriz}")
-        for filtro in filtros:
-            print(f"  - filtro={filtro}")
-            for (tipo_nombre, tipo_token) in TIPOS:
-                i += 1
-                print(f"    ({i:02d}/{total}) {nombre_matriz} · {filtro} · {tipo_nombre}")
-                construir_y_guardar(
-                    M=M,
-                    matriz=nombre_matriz,
-                    filtro=filtro,
-                    tipo_nombre=tipo_nombre,
-                    tipo_token=tipo_token,
-                    nombres=nombres,
-                    comida_bd=comida_bd,
-                )
+    tareas = [
+        (nombre_matriz, filtro, tipo_nombre, tipo_token,
+         manifiesto.get(nombre_salida(nombre_matriz, filtro, tipo_nombre)))
+        for nombre_matriz in MATRICES
+        for filtro in filtros
+        for (tipo_nombre, tipo_token) in TIPOS
+    ]
+
+    t0 = time.time()
+    with pool_procesos(n_procesos, iniciar_worker, (comida_bd,)) as pool:
+        resultados = mapear_ordenado(construir_tarea, tareas, pool)
+
+    for i, ((nombre_matriz, filtro, tipo_nombre, _, _), (nombre, huella, mensaje)) in enumerate(zip(tareas, resultados), 1):
+        print(f"    ({i:02d}/{len(tareas)}) {nombre_matriz} · {filtro} · {tipo_nombre}")
+        print(mensaje)
+        manifiesto[nombre] = huella
+
+    guardar_manifiesto(manifiesto)
+    print(f"\nManifiesto: {MANIFIESTO}  ({time.time() - t0:.1f} s)")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
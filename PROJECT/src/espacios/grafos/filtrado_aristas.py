@@ -1,6 +1,9 @@
 # filtrado_aristas.py — Filtros de aristas para grafos de similitud
+# Versión networkx (sobre el grafo completo) y versión con arrays (sobre la submatriz de similitud).
+# Las dos dan las mismas aristas en el mismo orden de inserción.
 
 import heapq
+import numpy as np
 import networkx as nx
 
 
@@ -61,4 +64,81 @@ def filtrar_umbral(grafo: nx.Graph, umbral: float = 0.8, weight: str = "weight")
         if weight in d and d[weight] >= umbral:
             G.add_edge(u, v, weight=d[weight])
 
-    return G
\ No newline at end of file
+    return G
+
+
+# versión con arrays: posiciones locales sobre la submatriz del tipo
+
+def submatriz_similitud(M, indices):
+    """
+    Pesos del grafo completo sobre 'indices' sin crearlo: S[a, b] = M[u, v] con u antes que v
+    en 'indices' (la arista se crea una vez). Diagonal y valores no finitos a -inf (sin arista).
+    """
+    S = np.asarray(M[np.ix_(indices, indices)], dtype=np.float32)
+    S = np.where(np.triu(np.ones(S.shape, dtype=bool), 1), S, S.T)
+    S[~np.isfinite(S)] = -np.inf
+    np.fill_diagonal(S, -np.inf)
+    return S
+
+
+def topk_por_fila(S, k):
+    """
+    Para cada fila, sus k mayores en orden (peso desc., empates por posición), como heapq.nlargest.
+    Devuelve (filas, columnas) en ese orden, fila a fila.
+    """
+    n = S.shape[0]
+    k = min(int(k), n - 1)
+    if k <= 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+
+    # k-ésimo mayor por fila; en los empates se quedan los primeros
+    kth = -np.partition(-S, k - 1, axis=1)[:, k - 1]
+    mayores = S > kth[:, None]
+    empates = (S == kth[:, None]) & np.isfinite(S)
+    faltan = k - mayores.sum(axis=1)
+    sel = mayores | (empates & (np.cumsum(empates, axis=1) <= faltan[:, None]))
+
+    filas, cols = np.nonzero(sel)
+    orden = np.lexsort((cols, -S[filas, cols], filas))
+    return filas[orden], cols[orden]
+
+
+def aristas_knn(S, k: int = 7):
+    """Aristas (a, b) del KNN simple en orden de inserción, sin repetir."""
+    filas, cols = topk_por_fila(S, k)
+    n = S.shape[0]
+    claves = np.minimum(filas, cols) * n + np.maximum(filas, cols)
+    _, primera = np.unique(claves, return_index=True)
+    primera.sort()
+    return filas[primera], cols[primera]
+
+
+def aristas_knn_doble(S, ids, k: int = 10):
+    """
+    Aristas (a, b) del KNN doble en orden de inserción.
+    La reciprocidad es vectorizada; el recorrido de cada top-k sigue el orden del set de
+    filtrar_knn_doble para conservar el orden de las aristas.
+    """
+    n = S.shape[0]
+    filas, cols = topk_por_fila(S, k)
+    sel = np.zeros((n, n), dtype=bool)
+    sel[filas, cols] = True
+    mutuo = sel & sel.T
+
+    ids = np.asarray(ids, dtype=int)
+    pos_por_id = {int(v): i for i, v in enumerate(ids)}
+    inicio = np.searchsorted(filas, np.arange(n + 1))
+    A, B = [], []
+    for a in range(n):
+        knn_a = {int(v) for v in ids[cols[inicio[a]:inicio[a + 1]]]}
+        for v in knn_a:
+            b = pos_por_id[v]
+            if mutuo[a, b] and ids[a] < v:
+                A.append(a)
+                B.append(b)
+    return np.asarray(A, dtype=int), np.asarray(B, dtype=int)
+
+
+def aristas_umbral(S, umbral: float = 0.8):
+    """Aristas (a, b), a < b, con peso >= umbral, en el orden de grafo.edges del grafo completo."""
+    return np.nonzero(np.triu(S >= umbral, 1))
@@ -1,29 +1,23 @@
 # cruce.py - Cruces guiados por grafo
 
 import numpy as np
-import networkx as nx
 from pymoo.core.crossover import Crossover
 
 from src.utilidades.planificacion import tipos_por_posicion, seleccionar_ruleta
 from src.espacios.grafos.operadores.precalculos import (
-    GraphLocalCtx, GrafosCtx, asegurar_dist_desde_weight
+    GraphLocalCtx, GrafosCtx, caminos_minimos, camino_minimo_local
 )
 
 def clave(tipo):
     return str(tipo).strip().lower()
 
-def peso(G, u, v):
-    return float(G[u][v].get("weight", 0.0)) if G.has_edge(u, v) else 0.0
-
-
 class CruceGrafoBase(Crossover):
     """
     Recorre posición a posición y decide el hijo usando el grafo del tipo.
-    Si hay 'ctx_grafos', usa estructuras rápidas; si no, usa networkx.
+    Las consultas van sobre la adyacencia CSR del contexto (ctx_grafos), no sobre networkx.
     """
-    def __init__(self, grafos=None, ctx_grafos=None, prob=1.0, rng=None):
+    def __init__(self, ctx_grafos=None, prob=1.0, rng=None):
         super().__init__(2, 2)
-        self.grafos = grafos or {}      # dict: tipo -> grafo nx
         self.ctx = ctx_grafos           # GrafosCtx o None
         self.prob = float(prob)
         self.rng = rng or np.random.default_rng()
@@ -33,10 +27,7 @@ class CruceGrafoBase(Crossover):
         """
         Si hay contexto precalculado para ese rol, se usa
         """
-        k = self.tipos[pos]
-        ctx_local = self.ctx.por_tipo[k]
-        G = ctx_local.G
-        return G, ctx_local
+        return self.ctx.por_tipo[self.tipos[pos]]
 
 
     def _do(self, problem, X, **kwargs):
@@ -70,13 +61,13 @@ class CruceGrafoBase(Crossover):
                     continue
 
                 # se usa el contexto precalculado
-                G, ctx_local = self.recursos(pos)
-                if G is None or a not in G or b not in G:
+                ctx_local = self.recursos(pos)
+                if ctx_local is None or ctx_local.local(a) is None or ctx_local.local(b) is None:
                     h1[pos], h2[pos] = a, b
                     continue
                 
                 # regla de cruce
-                na, nb = self.cruzar_gen(G, ctx_local, a, b, pos)
+                na, nb = self.cruzar_gen(ctx_local, a, b, pos)
                 h1[pos], h2[pos] = int(na), int(nb)
 
             hijos[m, 0] = h1
@@ -85,7 +76,7 @@ class CruceGrafoBase(Crossover):
         # devuelve (2, n_parejas, n_genes)
         return np.swapaxes(hijos, 0, 1)
 
-    def cruzar_gen(self, G, ctx_local, a, b, pos):
+    def cruzar_gen(self, ctx_local, a, b, pos):
         """Devuelve dos nodos hijos a partir de dos padres."""
         raise NotImplementedError
 
@@ -95,37 +86,35 @@ class CruceCaminoCorto(CruceGrafoBase):
     Usa el camino más corto entre a y b. Si hay nodos intermedios,
     elige dos del interior. Si no, deja los padres.
     """
-    def cruzar_gen(self, G, ctx_local, a, b, pos):
-        asegurar_dist_desde_weight(G)  # crea 'dist' = 1 - weight
-        try:
-            path = nx.shortest_path(G, source=a, target=b, weight="dist")
-        except nx.NetworkXNoPath:
+    def cruzar_gen(self, ctx_local, a, b, pos):
+        # camino mínimo (distancia 'dist' = 1 - weight) desde la tabla de predecesores
+        a_l, b_l = ctx_local.local(a), ctx_local.local(b)
+        if a_l is None or b_l is None:
+            return a, b
+        path = camino_minimo_local(caminos_minimos(ctx_local), a_l, b_l)
+        if path is None:
             return a, b
-        except Exception:
-            # sin peso como último recurso
-            try:
-                path = nx.shortest_path(G, source=a, target=b)
-            except Exception:
-                return a, b
 
         # se devuelven los padres si no hay nodos intermedios
         if len(path) < 3:
             return a, b
 
-        interior = np.asarray(path[1:-1], dtype=int)
+        interior_l = np.asarray(path[1:-1], dtype=int)
+        interior = ctx_local.l2g[interior_l]
         if interior.size == 1:
             v = int(interior[0])
             return v, v
 
         # se pondera por grado para preferir nodos “conectores”
-        grados = np.array([G.degree(int(v), weight="weight") for v in interior], dtype=float)
+        grados = ctx_local.deg_weight[interior_l]
         hijo1 = seleccionar_ruleta(self.rng, grados, indices_validos=interior)
 
         # para el segundo hijo, quitamos el primero
-        resto = interior[interior != int(hijo1)] if interior.size > 1 else interior
+        mascara = interior != int(hijo1)
+        resto = interior[mascara] if interior.size > 1 else interior
         if resto.size == 0:
             return int(hijo1), int(hijo1)
-        grados2 = np.array([G.degree(int(v), weight="weight") for v in resto], dtype=float)
+        grados2 = grados[mascara]
         hijo2 = seleccionar_ruleta(self.rng, grados2, indices_validos=resto)
         return int(hijo1), int(hijo2)
 
@@ -135,69 +124,69 @@ class CruceCaminosSesgados(CruceGrafoBase):
     Pequeñas caminatas desde cada padre hacia el otro.
     Se pondera por peso de arista y se da un bonus si el vecino toca al destino.
     """
-    def __init__(self, grafos=None, ctx_grafos=None, prob=1.0, rng=None,
+    def __init__(self, ctx_grafos=None, prob=1.0, rng=None,
                  pasos=3, repeticiones=2, prob_conservar=0.10, beta=1.0):
-        super().__init__(grafos=grafos, ctx_grafos=ctx_grafos, prob=prob, rng=rng)
+        super().__init__(ctx_grafos=ctx_grafos, prob=prob, rng=rng)
         self.pasos = int(pasos)
         self.repeticiones = int(repeticiones)
         self.prob_conservar = float(prob_conservar)
         self.beta = float(beta)
 
-    def caminata(self, G, origen, destino, visitas):
+    def caminata(self, csr, origen, destino, visitas):
         """
         Hace una caminata corta desde un padre intentando acercarse al otro.
+        Trabaja en posiciones locales del grafo (filas del CSR).
         """
         actual = int(origen)
         anterior = None
+        vecinos_destino = csr.vecinos(int(destino))
 
         for _ in range(self.pasos):
 
             # vecinos del nodo actual
-            vecinos = list(G.neighbors(actual))
-            if not vecinos:
+            vecinos = csr.vecinos(actual)
+            if vecinos.size == 0:
                 break
 
-            # cálculo del peso para cada vecino
-            pesos = []
-            for v in vecinos:
-                w = peso(G, actual, v)
-                # bonus si el vecino está conectado al destino
-                bonus = (1.0 + self.beta) if G.has_edge(int(v), int(destino)) else 1.0
-                # pequeño castigo a volver atrás inmediata
-                if anterior is not None and int(v) == int(anterior):
-                    bonus *= 0.7
-                pesos.append(w * bonus)
+            # bonus si el vecino está conectado al destino
+            bonus = np.where(np.isin(vecinos, vecinos_destino), 1.0 + self.beta, 1.0)
+            # pequeño castigo a volver atrás inmediata
+            if anterior is not None:
+                bonus[vecinos == anterior] *= 0.7
+            pesos = csr.pesos_vecinos(actual).astype(float) * bonus
 
             # si la suma es cero no se elige nada
             s = float(np.sum(pesos))
             if s <= 0.0 or not np.isfinite(s):
                 break
-            
+
             # convierte pesos a probabilidades
-            idx = int(self.rng.choice(len(vecinos), p=np.asarray(pesos) / s))
+            idx = int(self.rng.choice(vecinos.size, p=pesos / s))
             elegido = int(vecinos[idx])
 
             # se guarda el nodo visitado y se avanza un paso en la caminata
             visitas.append(elegido)
             anterior, actual = actual, elegido
 
-    def cruzar_gen(self, G, ctx_local, a, b, pos):
+    def cruzar_gen(self, ctx_local, a, b, pos):
 
         # con cierta probabilidad no cruza
         if self.rng.random() < self.prob_conservar:
             return a, b
         
         # se acumula las visitas de varias caminatas en ambas direcciones
+        a_l, b_l = ctx_local.local(a), ctx_local.local(b)
         visitas = []
         for _ in range(self.repeticiones):
-            self.caminata(G, a, b, visitas)
-            self.caminata(G, b, a, visitas)
+            self.caminata(ctx_local.csr, a_l, b_l, visitas)
+            self.caminata(ctx_local.csr, b_l, a_l, visitas)
 
         if not visitas:
             return a, b
 
-        # frecuencia de aparición en caminatas
-        vals, cnts = np.unique(np.asarray(visitas, dtype=int), return_counts=True)
+        # frecuencia de aparición en caminatas (las posiciones siguen el orden de los ids de la BD)
+        vals_l, cnts = np.unique(np.asarray(visitas, dtype=int), return_counts=True)
+        vals = ctx_local.l2g[vals_l].astype(int)
 
         # probabilidad proporcional a la frecuencia
         p = cnts / cnts.sum()
@@ -1,7 +1,6 @@
 # mutacion.py - Mutaciones guiadas por grafo
 
 import numpy as np
-import networkx as nx
 from pymoo.core.mutation import Mutation
 
 from src.utilidades.planificacion import (
@@ -10,26 +9,21 @@ from src.utilidades.planificacion import (
     seleccionar_ruleta,
 )
 
-from src.espacios.grafos.operadores.precalculos import GraphLocalCtx, GrafosCtx
+from src.espacios.grafos.operadores.precalculos import GraphLocalCtx, GrafosCtx, vecinos_dos_saltos
 
 
 def clave(tipo):
     return str(tipo).strip().lower()
 
-def peso(G, u, v):
-    return float(G[u][v].get("weight", 0.0)) if G.has_edge(u, v) else 0.0
-
-
 class MutacionGrafoBase(Mutation):
     """
     Recorre cada gen y aplica la mutación con probabilidad 'prob'.
-    Si hay 'ctx_grafos' lo usa.
+    Las consultas van sobre la adyacencia CSR de 'ctx_grafos', no sobre networkx.
     """
-    def __init__(self, problem, grafos, prob=0.1, rng=None,
+    def __init__(self, problem, prob=0.1, rng=None,
                  validos_por_posicion=None, ctx_grafos=None, edad=18):
         super().__init__()
         self.problem = problem
-        self.grafos = grafos or {}
         self.prob = float(prob)
         self.rng = rng or np.random.default_rng()
         self.ctx = ctx_grafos
@@ -42,17 +36,11 @@ class MutacionGrafoBase(Mutation):
             comida_bd = getattr(problem, "comida_bd", [])
             self.validos = construir_validos_por_posicion(comida_bd, edad)
 
-        # cache de grafo por posición
-        self.grafo_pos = [ self.recurso(pos)[0] for pos in range(len(self.tipos)) ]
-
     def recurso(self, pos):
         """
         Si hay contexto precalculado para ese rol, se usa.
         """
-        k = self.tipos[pos]
-        ctx_local = self.ctx.por_tipo[k]
-        G = ctx_local.G
-        return G, ctx_local
+        return self.ctx.por_tipo[self.tipos[pos]]
 
     def _do(self, problem, X, **kwargs):
         n, m = X.shape
@@ -67,16 +55,16 @@ class MutacionGrafoBase(Mutation):
                 actual = int(x[pos])
 
                 # usa contexto para velocidad
-                G, ctx_local = self.recurso(pos)
+                ctx_local = self.recurso(pos)
 
                 # si hay problemas muta aleatoriamente entre válidos
-                if G is None or actual not in G or G.number_of_nodes() <= 1:
+                if ctx_local is None or ctx_local.local(actual) is None or ctx_local.n <= 1:
                     cand = self.validos[pos]
                     if cand.size > 0:
                         x[pos] = int(self.rng.choice(cand))
                     continue
 
-                nuevo = self.mutar(G, ctx_local, actual, pos)
+                nuevo = self.mutar(ctx_local, actual, pos)
 
                 if nuevo is None:
                     cand = self.validos[pos]
@@ -88,21 +76,24 @@ class MutacionGrafoBase(Mutation):
 
         return X
 
-    def mutar(self, G, ctx_local, actual, pos):
+    def mutar(self, ctx_local, actual, pos):
         raise NotImplementedError
 
 
 class MutacionRadioGrafo(MutacionGrafoBase):
     """
     Elige entre vecinos directos y vecinos con radio 2.
+    Los candidatos a radio 2 (score máx-mín) se precalculan por grafo y se filtran
+    por los válidos una vez; cada mutación es una ruleta sobre un trozo de array.
     """
-    def __init__(self, problem, grafos, prob=0.1, rng=None, validos_por_posicion=None,
+    def __init__(self, problem, prob=0.1, rng=None, validos_por_posicion=None,
                  ctx_grafos=None, edad=18, radio=2, epsilon=0.05):
-        super().__init__(problem, grafos, prob, rng, validos_por_posicion, ctx_grafos, edad)
+        super().__init__(problem, prob, rng, validos_por_posicion, ctx_grafos, edad)
         self.radio = max(1, int(radio))
         self.epsilon = float(epsilon)
+        self.candidatos_radio2 = {}     # (tipo, id(válidos)) -> (indptr, ids BD, pesos)
 
-    def mutar(self, G, ctx_local, actual, pos):
+    def mutar(self, ctx_local, actual, pos):
         # salto aleatorio
         if self.epsilon > 0 and self.rng.random() < self.epsilon:
             cand = self.validos[pos]
@@ -110,129 +101,170 @@ class MutacionRadioGrafo(MutacionGrafoBase):
                 return int(self.rng.choice(cand))
             return None
 
+        pos_actual = ctx_local.local(actual)
+
         # vecinos directos
         if self.radio == 1:
-            vecinos = list(G.neighbors(actual))
-            if not vecinos:
+            csr = ctx_local.csr
+            vecinos = csr.vecinos(pos_actual)
+            if vecinos.size == 0:
                 return None
-            
+
             # filtra por válidos de ese tipo
-            permitidos = set(map(int, self.validos[pos])) if self.validos[pos].size else None
-            cand = [int(v) for v in vecinos if (permitidos is None or int(v) in permitidos)]
-            if not cand:
+            mascara = self.mascara_validos(ctx_local, vecinos, pos)
+            if not mascara.any():
                 return None
-            
-            # poonderación por peso de aristas
-            pesos = [peso(G, actual, v) for v in cand]
 
-            # ruleta sobre candidatos
-            elegido = seleccionar_ruleta(self.rng, pesos, indices_validos=np.asarray(cand, dtype=int))
+            # ruleta sobre candidatos ponderada por peso de aristas
+            cand = ctx_local.l2g[vecinos[mascara]].astype(int)
+            pesos = csr.pesos_vecinos(pos_actual)[mascara].astype(float)
+            elegido = seleccionar_ruleta(self.rng, pesos, indices_validos=cand)
             return int(elegido) if elegido is not None else None
 
-        # radio 2: vecinos directos + vecinos de vecinos
-        vecinos1 = list(G.neighbors(actual))
-        if not vecinos1:
+        # radio 2: vecinos directos + vecinos de vecinos, ya filtrados por válidos
+        indptr, cand, pesos = self.tabla_radio2(ctx_local, pos)
+        a, b = indptr[pos_actual], indptr[pos_actual + 1]
+        if a == b:
             return None
 
-        scores = {}
-
-        # directos
-        for v in vecinos1:
-            w = peso(G, actual, v)
-            if w > 0.0:
-                iv = int(v)
-                scores[iv] = max(scores.get(iv, 0.0), float(w))
-
-        # a 2 saltos
-        vistos = {int(actual)} | {int(x) for x in vecinos1}
-        for h in vecinos1:
-            w_uh = peso(G, actual, h)
-            if w_uh <= 0.0:
-                continue
-            for v in G.neighbors(h):
-                iv = int(v)
-                if iv in vistos:
-                    continue
-                w_hv = peso(G, h, v)
-                if w_hv <= 0.0:
-                    continue
-                score = float(min(w_uh, w_hv))
-                if score > scores.get(iv, 0.0):
-                    scores[iv] = score
+        elegido = seleccionar_ruleta(self.rng, pesos[a:b], indices_validos=cand[a:b])
+        return int(elegido) if elegido is not None else None
 
-        if not scores:
-            return None
+    def tabla_radio2(self, ctx_local, pos):
+        """Candidatos a radio 2 del grafo de la posición, filtrados por sus válidos (una vez)."""
+        k = (self.tipos[pos], id(self.validos[pos]))
+        tabla = self.candidatos_radio2.get(k)
+        if tabla is None:
+            indptr, indices, scores = vecinos_dos_saltos(ctx_local)
+            mascara = self.mascara_validos(ctx_local, indices, pos)
+            acumulado = np.concatenate([[0], np.cumsum(mascara)])
+            tabla = (
+                acumulado[indptr],
+                ctx_local.l2g[indices[mascara]].astype(int),
+                scores[mascara].astype(float),
+            )
+            self.candidatos_radio2[k] = tabla
+        return tabla
+
+    def mascara_validos(self, ctx_local, cand_l, pos):
+        """Máscara de los candidatos (posiciones locales) que son válidos en la posición."""
+        if self.validos[pos].size == 0:
+            return np.ones(cand_l.size, dtype=bool)
+        return np.isin(ctx_local.l2g[cand_l], self.validos[pos])
+
+
+def ruleta_acumulada(rng, acumulado, puntos, deltas):
+    """
+    Ruleta sobre pesos dados por su suma acumulada, salvo en 'puntos' (índices ordenados)
+    donde el peso cambia en 'deltas'. Búsqueda binaria: O(k + log n).
+    Devuelve el índice elegido o None si el peso total no es positivo.
+    """
+    desplaz = np.cumsum(deltas)
+    total = float(acumulado[-1] + (desplaz[-1] if desplaz.size else 0.0))
+    if not (total > 0.0 and np.isfinite(total)):
+        return None
+    r = rng.random() * total
 
-        permitidos = set(map(int, self.validos[pos])) if self.validos[pos].size else None
-        cand = np.array([c for c in scores.keys() if (permitidos is None or c in permitidos)], dtype=int)
-        if cand.size == 0:
-            return None
+    # tramo entre puntos corregidos donde cae r
+    hasta_punto = acumulado[puntos] + desplaz
+    j = int(np.searchsorted(hasta_punto, r, side="right"))
+    lo = int(puntos[j - 1]) + 1 if j > 0 else 0
+    hi = int(puntos[j]) if j < puntos.size else acumulado.size - 1
+    base = float(desplaz[j - 1]) if j > 0 else 0.0
 
-        pesos = [scores[c] for c in cand]
-        elegido = seleccionar_ruleta(self.rng, pesos, indices_validos=cand)
-        return int(elegido) if elegido is not None else None
+    i = lo + int(np.searchsorted(acumulado[lo:hi], r - base, side="right"))
+    return min(i, hi)
 
 
 class MutacionComunidadesGrafo(MutacionGrafoBase):
     """
     Elige dentro de la misma comunidad con prob. Si no, elige en otra.
+    Los candidatos de cada comunidad (dentro y fuera) se filtran por válidos una vez
+    y guardan el grado ponderado acumulado; las aristas del nodo se aplican como
+    correcciones al sortear (ruleta_acumulada).
     """
-    def __init__(self, problem, grafos, prob=0.1, rng=None, validos_por_posicion=None,
+    def __init__(self, problem, prob=0.1, rng=None, validos_por_posicion=None,
                  ctx_grafos=None, edad=18, p_local=0.75):
-        super().__init__(problem, grafos, prob, rng, validos_por_posicion, ctx_grafos, edad)
+        super().__init__(problem, prob, rng, validos_por_posicion, ctx_grafos, edad)
         self.p_local = float(p_local)
-
-    def mutar(self, G, ctx_local, actual, pos):
+        self.pools = {}     # (tipo, id(válidos), comunidad, dentro) -> (posiciones, ids BD, acumulado)
+
+    def pool(self, ctx_local, pos, cid, dentro):
+        """Candidatos (posiciones ordenadas) de un lado de la comunidad, filtrados por válidos."""
+        k = (self.tipos[pos], id(self.validos[pos]), cid, dentro)
+        t = self.pools.get(k)
+        if t is None:
+            if 0 <= cid < len(ctx_local.communities):
+                miembros = ctx_local.communities[cid]
+            else:
+                # si el nodo no tiene comunidad, se usan el resto de nodos
+                miembros = np.empty(0, dtype=int)
+            if dentro:
+                cand_l = np.sort(miembros)
+            else:
+                cand_l = np.setdiff1d(np.arange(ctx_local.n), miembros)
+
+            # aplicar válidos del tipo
+            if self.validos[pos].size:
+                cand_l = cand_l[np.isin(ctx_local.l2g[cand_l], self.validos[pos])]
+
+            # peso por defecto: fuerza del nodo
+            t = (cand_l, ctx_local.l2g[cand_l].astype(int), np.cumsum(ctx_local.deg_weight[cand_l]))
+            self.pools[k] = t
+        return t
+
+    def mutar(self, ctx_local, actual, pos):
 
         # pasa el id de la BD a posición de array
-        pos_actual = ctx_local.g2l.get(int(actual), None)
+        pos_actual = ctx_local.local(actual)
         if pos_actual is None:
             return None
 
-        # coomunidad del nodo y sus miembros
+        # coomunidad del nodo y tamaño de cada lado (sin el propio nodo)
         cid = int(ctx_local.comm_id[pos_actual])
-
-        if cid >= 0 and cid < len(ctx_local.communities):
-            # nodos en la comunidad del noodo
-            dentro = ctx_local.communities[cid]
-            dentro = dentro[dentro != pos_actual]
-
-            # nodos en otras coomunidades
-            fuera_list = [ctx_local.communities[c] for c in range(len(ctx_local.communities)) if c != cid]
-            fuera = np.concatenate(fuera_list) if fuera_list else np.empty(0, dtype=int)
+        if 0 <= cid < len(ctx_local.communities):
+            n_dentro = ctx_local.communities[cid].size - 1
         else:
-            # si el nodo no tiene comunidad, se usan el resto de nodos
-            todo = np.arange(ctx_local.l2g.size, dtype=int)
-            fuera = todo[todo != pos_actual]
-            dentro = np.empty(0, dtype=int)
-
-        # convierte posiciones de array a ids BD
-        def pos_a_id(arr):
-            return ctx_local.l2g[arr] if arr.size else np.empty(0, dtype=int)
+            n_dentro = 0
+        n_fuera = ctx_local.n - 1 - n_dentro
 
         # proobabilidad de elegir dentro de comunidad
         elegir_dentro = (self.rng.random() < self.p_local)
-        cand = pos_a_id(dentro if elegir_dentro else fuera)
-        if cand.size == 0:
-            cand = pos_a_id(fuera if elegir_dentro else dentro)
-            if cand.size == 0:
+        if (n_dentro if elegir_dentro else n_fuera) == 0:
+            elegir_dentro = not elegir_dentro
+            if (n_dentro if elegir_dentro else n_fuera) == 0:
                 return None
 
-        # aplicar válidos del tipo
-        permitidos = set(map(int, self.validos[pos])) if self.validos[pos].size else None
-        if permitidos is not None:
-            cand = cand[np.fromiter((int(v) in permitidos for v in cand), dtype=bool)]
-            if cand.size == 0:
-                return None
+        cand_l, cand, acumulado = self.pool(ctx_local, pos, cid, elegir_dentro)
+        if cand_l.size == 0:
+            return None
 
-        # pesos para la ruleta. Usa la arista. Si no, fuerza del nodo
-        pesos = []
-        for v in cand:
-            w = peso(G, actual, int(v))
-            if w <= 0.0:
-                pos_v = ctx_local.g2l.get(int(v), None)
-                w = float(ctx_local.deg_weight[pos_v]) if pos_v is not None else 0.0
-            pesos.append(float(w))
-
-        elegido = seleccionar_ruleta(self.rng, pesos, indices_validos=cand)
-        return int(elegido) if elegido is not None else None
\ No newline at end of file
+        # el propio nodo no se puede elegir: peso 0
+        puntos, deltas = [], []
+        j = int(np.searchsorted(cand_l, pos_actual))
+        if j < cand_l.size and cand_l[j] == pos_actual:
+            if cand_l.size == 1:
+                return None
+            puntos.append(np.array([j]))
+            deltas.append(np.array([-float(ctx_local.deg_weight[pos_actual])]))
+
+        # los vecinos con arista usan su peso en lugar de la fuerza del nodo
+        csr = ctx_local.csr
+        vecinos = csr.vecinos(pos_actual)
+        pesos = csr.pesos_vecinos(pos_actual).astype(float)
+        idx = np.searchsorted(cand_l, vecinos)
+        en_pool = (idx < cand_l.size) & (pesos > 0.0) & (vecinos != pos_actual)
+        en_pool[en_pool] = cand_l[idx[en_pool]] == vecinos[en_pool]
+        puntos.append(idx[en_pool])
+        deltas.append(pesos[en_pool] - ctx_local.deg_weight[vecinos[en_pool]])
+
+        puntos = np.concatenate(puntos)
+        deltas = np.concatenate(deltas)
+        orden = np.argsort(puntos, kind="stable")
+        i = ruleta_acumulada(self.rng, acumulado, puntos[orden], deltas[orden])
+
+        # sin pesos útiles: uniforme entre los candidatos
+        if i is None:
+            resto = cand[cand_l != pos_actual]
+            return int(self.rng.choice(resto))
+        return int(cand[i])
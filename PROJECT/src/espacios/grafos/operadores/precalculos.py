@@ -1,13 +1,23 @@
 # precalculos.py - Precálculos básicos para trabajar con grafos.
 # Calcula distancias, mapeos global a local, vecinos y comunidades.
+# El contexto, los caminos mínimos entre todos los pares (predecesores) y los vecinos a 2 saltos
+# se guardan en .npz junto al .gpickle (versión + hash del grafo) y se reutilizan entre procesos.
+# El contexto solo guarda arrays: networkx hace falta para calcularlos (comunidades), no para ejecutar.
 
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 
+import os
 import re
+import hashlib
 import unicodedata
 import numpy as np
 import networkx as nx
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+# versión del formato de los .npz de caché (cambiarla invalida los ficheros antiguos)
+VERSION_CACHE = 1
 
 
 TIPOS = ["desayuno", "bebida_desayuno", "snacks", "almuerzo_cena", "bebidas"]
@@ -23,20 +33,57 @@ def tipo_a_clave(tipo: str):
 
 
 
+@dataclass
+class GrafoCSR:
+    """
+    Adyacencia compacta en posiciones locales.
+    Fila l: indices[indptr[l]:indptr[l+1]] en el orden de G.neighbors, con pesos y distancias alineados.
+    """
+    indptr: np.ndarray       # int32 (N + 1)
+    indices: np.ndarray      # int32
+    pesos: np.ndarray        # float32, atributo 'weight'
+    distancias: np.ndarray   # float64, atributo 'dist' (define los caminos mínimos, sin redondeo)
+
+    def vecinos(self, l: int):
+        return self.indices[self.indptr[l]:self.indptr[l + 1]]
+
+    def pesos_vecinos(self, l: int):
+        return self.pesos[self.indptr[l]:self.indptr[l + 1]]
+
+    def fila_pesos(self, l: int, n: int):
+        """Pesos de l a todos los nodos (0 si no hay arista)."""
+        fila = np.zeros(n, dtype=float)
+        fila[self.vecinos(l)] = self.pesos_vecinos(l)
+        return fila
+
+
 @dataclass
 class GraphLocalCtx:
     """
-    Datos precalculados por grafo.
+    Datos precalculados por grafo, solo arrays (csr, g2l, l2g...): no guarda el grafo de networkx.
     """
-    G: nx.Graph
     nodes_g: np.ndarray
-    g2l: Dict[int, int]
-    l2g: np.ndarray
-    nbr_idx: List[np.ndarray]
-    nbr_w:   List[np.ndarray]
+    g2l: np.ndarray            # id BD -> posición (-1 si no está en el grafo)
+    l2g: np.ndarray            # posición -> id BD
+    csr: GrafoCSR
     deg_weight: np.ndarray
     comm_id:   np.ndarray
     communities: List[np.ndarray]
+    ruta: Optional[str] = None                   # .gpickle de origen (para las cachés)
+    predecesores: Optional[np.ndarray] = None   # (N, N) int32, se carga al usarse
+    dos_saltos: Optional[tuple] = None          # (indptr, indices, scores), se carga al usarse
+
+    @property
+    def n(self):
+        return int(self.l2g.size)
+
+    def local(self, id_bd: int):
+        """Posición local de un id de la BD (None si no está en el grafo)."""
+        id_bd = int(id_bd)
+        if id_bd < 0 or id_bd >= self.g2l.size:
+            return None
+        l = int(self.g2l[id_bd])
+        return l if l >= 0 else None
 
 
 @dataclass
@@ -57,12 +104,12 @@ def asegurar_dist_desde_weight(G: nx.Graph):
         d["dist"] = max(0.0, 1.0 - w)
 
 
-def construir_contexto_local(G: nx.Graph):
+def arrays_contexto(G: nx.Graph):
     """
-    Prepara todo lo necesario para operar rápido sobre el grafo.
+    Calcula los arrays del contexto de un grafo (lo costoso: CSR, grado ponderado y comunidades).
     - Crea distancia a partir de pesos si no existe.
     - Asigna a cada id de la BD una posición para usar arrays.
-    - Guarda, por posición, la lista de vecinos y sus pesos.
+    - Guarda la adyacencia en CSR (vecinos, pesos y distancias por posición).
     - Calcula el grado ponderado y las comunidades.
     """
     asegurar_dist_desde_weight(G)
@@ -74,35 +121,19 @@ def construir_contexto_local(G: nx.Graph):
 
     # conversión entre el índice de la BD y la posición en el array
     pos_por_id = {int(id_bd): i for i, id_bd in enumerate(ids_bd)}  # BD -> posición
-    id_por_pos = ids_bd.copy()                                      # posición -> BD
-
-    # para cada posición, se guardan vecinos y sus pesos
-    vecinos_por_pos = [None] * max(N, 1)
-    pesos_por_pos   = [None] * max(N, 1)
 
+    # adyacencia CSR: por posición, vecinos (orden de G.neighbors) con pesos y distancias
+    indptr = np.zeros(N + 1, dtype=np.int32)
+    indices, pesos, distancias = [], [], []
     for pos in range(N):
-        id_bd = int(id_por_pos[pos])
-        vecinos_id = list(G.neighbors(id_bd))
-
-        if vecinos_id:
-            # se pasan ids de vecinos a posiciones
-            vecinos_pos = np.fromiter((pos_por_id.get(int(v), -1) for v in vecinos_id), dtype=int)
-            vecinos_pos = vecinos_pos[vecinos_pos >= 0]
-
-            if vecinos_pos.size:
-                # pesos alineados con esas posiciones
-                pesos = np.fromiter(
-                    (float(G[id_bd][int(id_por_pos[j])].get("weight", 0.0)) for j in vecinos_pos),
-                    dtype=float
-                )
-                order = np.argsort(vecinos_pos, kind="mergesort")
-                vecinos_por_pos[pos] = vecinos_pos[order]
-                pesos_por_pos[pos]   = pesos[order]
+        for v, d in G.adj[int(ids_bd[pos])].items():
+            j = pos_por_id.get(int(v))
+            if j is None:
                 continue
-
-        # si no tiene vecinos, se deja array vacio
-        vecinos_por_pos[pos] = np.empty(0, dtype=int)
-        pesos_por_pos[pos]   = np.empty(0, dtype=float)
+            indices.append(j)
+            pesos.append(float(d.get("weight", 0.0)))
+            distancias.append(float(d.get("dist", 0.0)))
+        indptr[pos + 1] = len(indices)
 
     # grado ponderado
     grado_ponderado = np.zeros(N, dtype=float)
@@ -129,23 +160,83 @@ def construir_contexto_local(G: nx.Graph):
         comp_pos = comp_pos[comp_pos >= 0]
         comp_pos.sort()
         comunidades_en_pos.append(comp_pos)
-        for j in comp_pos:
-            comunidad_por_pos[int(j)] = cid
+        comunidad_por_pos[comp_pos] = cid
+
+    # comunidades seguidas (mismo formato CSR que la adyacencia)
+    tam = [c.size for c in comunidades_en_pos]
+    return {
+        "ids_bd": ids_bd,
+        "indptr": indptr,
+        "indices": np.asarray(indices, dtype=np.int32),
+        "pesos": np.asarray(pesos, dtype=np.float32),
+        "distancias": np.asarray(distancias, dtype=float),
+        "deg_weight": grado_ponderado,
+        "comm_id": comunidad_por_pos,
+        "comm_indptr": np.concatenate([[0], np.cumsum(tam, dtype=np.int64)]),
+        "comm_nodos": np.concatenate(comunidades_en_pos) if comunidades_en_pos else np.empty(0, dtype=int),
+    }
+
+
+def contexto_desde_arrays(arrays: dict, ruta: Optional[str] = None):
+    """Monta el GraphLocalCtx a partir de los arrays de arrays_contexto (calculados o de caché)."""
+    ids_bd = np.asarray(arrays["ids_bd"], dtype=int)
+    N = ids_bd.size
+
+    # conversión entre el índice de la BD y la posición en el array
+    g2l = np.full(int(ids_bd.max()) + 1 if N else 0, -1, dtype=np.int32)
+    g2l[ids_bd] = np.arange(N, dtype=np.int32)
+
+    comm_indptr, comm_nodos = arrays["comm_indptr"], np.asarray(arrays["comm_nodos"], dtype=int)
+    comunidades_en_pos = [comm_nodos[comm_indptr[c]:comm_indptr[c + 1]] for c in range(comm_indptr.size - 1)]
 
     # devuelve contexto
     return GraphLocalCtx(
-        G=G,
         nodes_g=ids_bd,            # ids de la BD
-        g2l=pos_por_id,            # BD -> posición
-        l2g=id_por_pos,            # posición -> BD
-        nbr_idx=vecinos_por_pos,   # vecinos en posiciones
-        nbr_w=pesos_por_pos,
-        deg_weight=grado_ponderado,
-        comm_id=comunidad_por_pos,     # comunidad por posición
-        communities=comunidades_en_pos # listas de posiciones por comunidad
+        g2l=g2l,                   # BD -> posición
+        l2g=ids_bd.copy(),         # posición -> BD
+        csr=GrafoCSR(              # adyacencia en posiciones
+            indptr=arrays["indptr"],
+            indices=arrays["indices"],
+            pesos=arrays["pesos"],
+            distancias=arrays["distancias"],
+        ),
+        deg_weight=arrays["deg_weight"],
+        comm_id=np.asarray(arrays["comm_id"], dtype=int),   # comunidad por posición
+        communities=comunidades_en_pos,                     # listas de posiciones por comunidad
+        ruta=ruta,
     )
 
 
+def construir_contexto_local(G: nx.Graph, usar_cache: bool = True):
+    """
+    Prepara todo lo necesario para operar rápido sobre el grafo.
+    Si el grafo viene de un .gpickle, los arrays se guardan en un .contexto.npz a su lado
+    (versión + hash del fichero) y las siguientes ejecuciones y procesos solo los leen.
+    """
+    ruta = G.graph.get("ruta")
+    ruta_npz = ruta_cache(ruta, "contexto")
+    arrays = leer_cache(ruta_npz, ruta) if usar_cache else None
+    if arrays is None:
+        arrays = arrays_contexto(G)
+        if ruta_npz is not None:
+            guardar_cache(ruta_npz, ruta, **arrays)
+    return contexto_desde_arrays(arrays, ruta)
+
+
+def contexto_desde_fichero(ruta: str, leer_grafo: Callable[[str], nx.Graph], usar_cache: bool = True):
+    """
+    Contexto del grafo guardado en ruta. Si el .contexto.npz está al día no se lee el .gpickle;
+    si no, se lee con leer_grafo, se calculan y guardan los arrays y el grafo se descarta.
+    """
+    ruta_npz = ruta_cache(ruta, "contexto")
+    arrays = leer_cache(ruta_npz, ruta) if usar_cache else None
+    if arrays is None:
+        G = leer_grafo(ruta)
+        G.graph["ruta"] = ruta
+        arrays = arrays_contexto(G)
+        guardar_cache(ruta_npz, ruta, **arrays)
+    return contexto_desde_arrays(arrays, ruta)
+
 
 def construir_contexto_grafos(grafos: Dict[str, nx.Graph]):
     """
@@ -163,17 +254,8 @@ def obtener_distancias_a_destino_local(ctx: GraphLocalCtx, dst_local: int):
     """
     Devuelve las distancias desde todos los nodos al destino..
     """
-    N = ctx.l2g.size
-    out = np.full(N, np.inf, dtype=np.float32)
-    dst_g = int(ctx.l2g[int(dst_local)])
-
-    lengths = nx.single_source_dijkstra_path_length(ctx.G, source=dst_g, weight="dist")
-    for g, d in lengths.items():
-        l = ctx.g2l.get(int(g))
-        if l is not None:
-            out[int(l)] = float(d)
-
-    return out
+    d = dijkstra(matriz_distancias(ctx), directed=False, indices=int(dst_local))
+    return d.astype(np.float32)
 
 
 def sesgo_exponencial_a_destino_local(ctx: GraphLocalCtx, dst_local: int, beta: float):
@@ -194,20 +276,209 @@ def filtrar_por_permitidos(ctx: GraphLocalCtx, candidatos_pos: np.ndarray, ids_p
 
     # Convertir cada posición a su id de la BD y quedarnos con los que están permitidos
     ids_bd = ctx.l2g[candidatos_pos]
-    mascara = np.fromiter((int(x) in ids_permitidos for x in ids_bd), dtype=bool, count=ids_bd.size)
+    mascara = np.isin(ids_bd, np.fromiter(ids_permitidos, dtype=int))
     return candidatos_pos[mascara]
 
 
+_HASHES = {}
+
+def hash_fichero(ruta: str):
+    """sha1 del contenido del fichero (memorizado mientras no cambien tamaño ni fecha)."""
+    st = os.stat(ruta)
+    k = (os.path.abspath(ruta), st.st_size, st.st_mtime_ns)
+    if k not in _HASHES:
+        h = hashlib.sha1()
+        with open(ruta, "rb") as f:
+            for bloque in iter(lambda: f.read(1 << 20), b""):
+                h.update(bloque)
+        _HASHES[k] = h.hexdigest()
+    return _HASHES[k]
+
+
+def ruta_cache(ruta_grafo: Optional[str], sufijo: str):
+    """Ruta del .npz de caché junto al .gpickle del grafo (None si el grafo no viene de fichero)."""
+    if not ruta_grafo:
+        return None
+    return os.path.splitext(ruta_grafo)[0] + f".{sufijo}.npz"
+
+
+def leer_cache(ruta_npz: str, ruta_grafo: str):
+    """Arrays del .npz si su versión y el hash del grafo coinciden; si no, None."""
+    if ruta_npz is None or not os.path.exists(ruta_npz):
+        return None
+    try:
+        with np.load(ruta_npz) as d:
+            if int(d["version"]) != VERSION_CACHE or str(d["hash"]) != hash_fichero(ruta_grafo):
+                return None
+            return {k: d[k] for k in d.files if k not in ("version", "hash")}
+    except Exception:
+        return None
+
+
+def guardar_cache(ruta_npz: str, ruta_grafo: str, **arrays):
+    """Escribe el .npz en un temporal y lo renombra (otros procesos nunca leen uno a medias)."""
+    tmp = f"{ruta_npz}.{os.getpid()}.tmp.npz"
+    np.savez(tmp, version=VERSION_CACHE, hash=hash_fichero(ruta_grafo), **arrays)
+    os.replace(tmp, ruta_npz)
+
+
+def matriz_distancias(ctx: GraphLocalCtx):
+    """Adyacencia CSR de scipy con la distancia de cada arista. Mantiene las de distancia 0."""
+    csr = ctx.csr
+    # las distancias 0 quedan como ceros explícitos (aristas para csgraph)
+    return csr_matrix((csr.distancias, csr.indices, csr.indptr), shape=(ctx.n, ctx.n))
+
+
+def caminos_minimos(ctx: GraphLocalCtx):
+    """
+    Tabla de predecesores de los caminos mínimos (distancia 'dist') entre todos los pares.
+    Se busca en memoria, luego en el .npz junto al grafo y si no, se calcula (Dijkstra) y se guarda.
+    """
+    if ctx.predecesores is not None:
+        return ctx.predecesores
+
+    ruta_grafo = ctx.ruta
+    ruta_npz = ruta_cache(ruta_grafo, "caminos")
+    cache = leer_cache(ruta_npz, ruta_grafo)
+    if cache is not None:
+        ctx.predecesores = cache["predecesores"]
+        return ctx.predecesores
+
+    _, pred = dijkstra(matriz_distancias(ctx), directed=False, return_predecessors=True)
+    ctx.predecesores = pred.astype(np.int32, copy=False)
+    if ruta_npz is not None:
+        guardar_cache(ruta_npz, ruta_grafo, predecesores=ctx.predecesores)
+    return ctx.predecesores
+
+
+def _dos_saltos_bloque(csr: GrafoCSR, n: int, r0: int, r1: int):
+    """
+    Candidatos a 1 y 2 saltos de las filas [r0, r1) con su score máx-mín.
+    Devuelve (filas, candidatos, scores) ordenados por fila y, dentro, por primera aparición
+    recorriendo vecinos directos y después los vecinos de cada uno.
+    """
+    indptr = csr.indptr.astype(np.int64)
+    largo = np.diff(indptr)
+    e0, e1 = indptr[r0], indptr[r1]
+
+    # aristas de las filas del bloque: (u, h, w_uh) y su orden dentro de la fila
+    u1 = np.repeat(np.arange(r0, r1, dtype=np.int64), largo[r0:r1])
+    h1 = csr.indices[e0:e1].astype(np.int64)
+    w1 = csr.pesos[e0:e1]
+    orden1 = np.arange(e0, e1) - indptr[u1]
+
+    # directos con peso > 0 (también son los nodos intermedios)
+    d = w1 > 0.0
+    u1, h1, w1, orden1 = u1[d], h1[d], w1[d], orden1[d]
+
+    # a 2 saltos: la fila de cada intermedio, seguidas; score = min(w_uh, w_hv)
+    l2 = largo[h1]
+    aristas = np.repeat(indptr[h1] - np.cumsum(l2) + l2, l2) + np.arange(l2.sum())
+    u2 = np.repeat(u1, l2)
+    v2 = csr.indices[aristas].astype(np.int64)
+    w2 = csr.pesos[aristas]
+    s2 = np.minimum(np.repeat(w1, l2), w2)
+    orden2 = np.arange(u2.size) - np.searchsorted(u2, u2) + int(largo.max(initial=0)) + 1
+
+    # fuera el propio nodo y sus vecinos directos (con cualquier peso)
+    filas = np.arange(r0, r1, dtype=np.int64)
+    vistos = np.concatenate([np.repeat(filas, largo[r0:r1]) * n + csr.indices[e0:e1], filas * n + filas])
+    ok = (w2 > 0.0) & ~np.isin(u2 * n + v2, vistos)
+
+    claves = np.concatenate([u1 * n + h1, u2[ok] * n + v2[ok]])
+    scores = np.concatenate([w1, s2[ok]])
+    ordenes = np.concatenate([orden1, orden2[ok]])
+    if claves.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    # por par (u, v): score máximo y primera aparición
+    o = np.lexsort((ordenes, claves))
+    claves, scores, ordenes = claves[o], scores[o], ordenes[o]
+    inicio = np.flatnonzero(np.r_[True, claves[1:] != claves[:-1]])
+    claves, ordenes = claves[inicio], ordenes[inicio]
+    scores = np.maximum.reduceat(scores, inicio)
+
+    u, v = claves // n, claves % n
+    o = np.lexsort((ordenes, u))
+    return u[o], v[o], scores[o]
+
+
+def vecinos_dos_saltos(ctx: GraphLocalCtx, max_expansion: int = 1 << 22):
+    """
+    Para cada nodo, sus candidatos a 1 y 2 saltos (posiciones locales) con score máx-mín:
+    peso de la arista directa o max_h min(w_uh, w_hv). Es el producto máx-mín de la adyacencia
+    consigo misma, por bloques de filas para acotar la memoria en grafos densos (umbral).
+    Se busca en memoria, luego en el .npz junto al grafo y si no, se calcula y se guarda.
+    """
+    if ctx.dos_saltos is not None:
+        return ctx.dos_saltos
+
+    ruta_grafo = ctx.ruta
+    ruta_npz = ruta_cache(ruta_grafo, "dos_saltos")
+    cache = leer_cache(ruta_npz, ruta_grafo)
+    if cache is not None:
+        ctx.dos_saltos = (cache["indptr"], cache["indices"], cache["scores"])
+        return ctx.dos_saltos
+
+    csr, n = ctx.csr, ctx.n
+    indptr = csr.indptr.astype(np.int64)
+
+    # coste de cada fila = aristas que hay que expandir a 2 saltos
+    expansion = np.where(csr.pesos > 0.0, np.diff(indptr)[csr.indices], 0)
+    acumulado = np.concatenate([[0], np.cumsum(expansion)])
+    coste = acumulado[indptr[1:]] - acumulado[indptr[:-1]]
+
+    filas, indices, scores = [], [], []
+    r0 = 0
+    while r0 < n:
+        r1 = r0 + 1
+        total = coste[r0]
+        while r1 < n and total + coste[r1] <= max_expansion:
+            total += coste[r1]
+            r1 += 1
+        u, v, s = _dos_saltos_bloque(csr, n, r0, r1)
+        filas.append(u)
+        indices.append(v)
+        scores.append(s)
+        r0 = r1
+
+    filas = np.concatenate(filas) if filas else np.empty(0, dtype=np.int64)
+    conteo = np.bincount(filas, minlength=n)
+    ctx.dos_saltos = (
+        np.concatenate([[0], np.cumsum(conteo)]).astype(np.int64),
+        np.concatenate(indices).astype(np.int32) if indices else np.empty(0, dtype=np.int32),
+        np.concatenate(scores).astype(np.float32) if scores else np.empty(0, dtype=np.float32),
+    )
+    if ruta_npz is not None:
+        indptr_2, indices_2, scores_2 = ctx.dos_saltos
+        guardar_cache(ruta_npz, ruta_grafo, indptr=indptr_2, indices=indices_2, scores=scores_2)
+    return ctx.dos_saltos
+
+
+def camino_minimo_local(predecesores: np.ndarray, a_l: int, b_l: int) -> Optional[List[int]]:
+    """Camino mínimo de a_l a b_l en posiciones locales (ambos incluidos); None si no hay camino."""
+    fila = predecesores[int(a_l)]
+    camino = [int(b_l)]
+    while camino[-1] != int(a_l):
+        p = int(fila[camino[-1]])
+        if p < 0:
+            return None
+        camino.append(p)
+    camino.reverse()
+    return camino
+
+
 def camino_interior_mas_corto(ctx: GraphLocalCtx, a_g: int, b_g: int) -> Optional[List[int]]:
     """
     Devuelve los nodos INTERIORES del camino más corto entre a_g y b_g.
     Si son adyacentes, devuelve [].
     """
-    try:
-        path = nx.shortest_path(ctx.G, source=int(a_g), target=int(b_g), weight="dist")
-    except Exception:
+    a_l, b_l = ctx.local(a_g), ctx.local(b_g)
+    if a_l is None or b_l is None:
+        return None
+    path = camino_minimo_local(caminos_minimos(ctx), a_l, b_l)
+    if path is None:
         return None
     if len(path) < 3:
         return []
-    interior = path[1:-1]
-    return [int(x) for x in interior]
\ No newline at end of file
+    return [int(x) for x in ctx.l2g[path[1:-1]]]
\ No newline at end of file
@@ -3,7 +3,6 @@
 
 import os
 import numpy as np
-import networkx as nx
 import pickle
 import networkx as nx
 try:
@@ -12,7 +11,10 @@ except Exception:
     nx_gpickle = None
 from pymoo.operators.crossover.pntx import TwoPointCrossover
 from src.algoritmo.problema import PlanningComida
-from src.algoritmo.ejecutor_ag import ejecutar_nsga3
+from src.algoritmo.ejecutor_ag import ejecutar_nsga3, POBLACION_FIJA, GENERACIONES_FIJAS
+from src.algoritmo.islas import ejecutar_islas
+from src.algoritmo.arranque_caliente import perfil_sujeto, sembrar_inicializacion, archivar_resultado
+from src.algoritmo.busqueda_local import refinar_resultado
 from src.utilidades.planificacion import (
     construir_validos_por_posicion,
     tipos_por_posicion,
@@ -27,7 +29,7 @@ from src.espacios.grafos.operadores.mutacion import (
     MutacionComunidadesGrafo,
 )
 
-from src.espacios.grafos.operadores.precalculos import construir_contexto_local, GrafosCtx
+from src.espacios.grafos.operadores.precalculos import construir_contexto_local, contexto_desde_fichero, GrafosCtx
 
 
 TIPOS = ["desayuno", "bebida_desayuno", "snacks", "almuerzo_cena", "bebidas"]
@@ -62,10 +64,31 @@ def cargar_grafos(metrica: str, filtro: str, base_dir: str):
     Gs = {}
     for t in TIPOS:
         ruta = ruta_grafo(base_dir, metrica, filtro, t)
-        Gs[clave(t)] = leer_gpickle(ruta)
+        G = leer_gpickle(ruta)
+        G.graph["ruta"] = ruta   # para las cachés .npz que se guardan junto al grafo
+        Gs[clave(t)] = G
     return Gs
 
 
+_CACHE_GRAFOS = {}
+
+def cargar_contexto(metrica: str, filtro: str, base_dir: str):
+    """
+    Contexto de los 5 grafos cacheado en el proceso (solo arrays, sin networkx).
+    Las ejecuciones siguientes (p. ej. en un mismo worker) no vuelven a leer ni precalcular.
+    Entre procesos y ejecuciones sale de los .contexto.npz junto a cada grafo; el .gpickle
+    solo se lee si falta o ha cambiado el .npz.
+    """
+    k = (metrica, filtro, os.path.abspath(base_dir))
+    if k not in _CACHE_GRAFOS:
+        ctx_por_tipo = {
+            clave(t): contexto_desde_fichero(ruta_grafo(base_dir, metrica, filtro, t), leer_gpickle)
+            for t in TIPOS
+        }
+        _CACHE_GRAFOS[k] = GrafosCtx(por_tipo=ctx_por_tipo)
+    return _CACHE_GRAFOS[k]
+
+
 def construir_contexto_grafos(grafos: dict):
     """
     Crea el contexto rápido con todo precalculado.
@@ -79,7 +102,6 @@ def construir_contexto_grafos(grafos: dict):
 def preparar_operadores_grafos(
     problema,
     *,
-    grafos: dict,
     ctx_grafos: GrafosCtx,
     cruce: str = "camino",          # "caminatas" | "camino" | "twopoint"
     mutacion: str = "radio",        # "radio" | "comunidades" | "custom"
@@ -95,9 +117,9 @@ def preparar_operadores_grafos(
     sampling = InicializacionCustom(problema, rng=rng)
 
     if cruce == "camino":
-        crossover = CruceCaminoCorto(grafos=grafos, ctx_grafos=ctx_grafos, prob=prob_cruce, rng=rng)
+        crossover = CruceCaminoCorto(ctx_grafos=ctx_grafos, prob=prob_cruce, rng=rng)
     elif cruce == "caminatas":
-        crossover = CruceCaminosSesgados(grafos=grafos, ctx_grafos=ctx_grafos, prob=prob_cruce, rng=rng)
+        crossover = CruceCaminosSesgados(ctx_grafos=ctx_grafos, prob=prob_cruce, rng=rng)
     elif cruce == "twopoint":
         crossover = TwoPointCrossover(prob=prob_cruce)
     else:
@@ -105,12 +127,12 @@ def preparar_operadores_grafos(
 
     if mutacion == "radio":
         mutation = MutacionRadioGrafo(
-            problema, grafos=grafos, prob=prob_mutacion, rng=rng,
+            problema, prob=prob_mutacion, rng=rng,
             ctx_grafos=ctx_grafos, radio=2, epsilon=0.05
         )
     elif mutacion == "comunidades":
         mutation = MutacionComunidadesGrafo(
-            problema, grafos=grafos, prob=prob_mutacion, rng=rng,
+            problema, prob=prob_mutacion, rng=rng,
             ctx_grafos=ctx_grafos, p_local=0.75
         )
     elif mutacion == "custom":
@@ -121,7 +143,7 @@ def preparar_operadores_grafos(
     return {"sampling": sampling, "crossover": crossover, "mutation": mutation}
 
 
-def ejecutar_grafos(
+def preparar_grafos(
     comida_bd,
     objetivo_calorias,
     edad,
@@ -137,11 +159,10 @@ def ejecutar_grafos(
     prob_cruce=0.9,
     prob_mutacion=1/77,
     seed=42,
-    verbose=True,
 ):
     """
-    Ejecuta una vez el espacio de grafos.
-    Devuelve el resultado de pymoo.
+    Crea el problema y los operadores del espacio de grafos.
+    Devuelve (problema, operadores); también sirve de fábrica para el modelo de islas.
     """
     # problema
     problema = PlanningComida(
@@ -157,16 +178,14 @@ def ejecutar_grafos(
     problema.validos_por_posicion = construir_validos_por_posicion(comida_bd, edad)
     problema.tipos_por_posicion = tipos_por_posicion()
 
-    # carga grafos (uno por tipo) y contexto
+    # contexto de los grafos (uno por tipo)
     base = os.path.join("data", "procesado", "grafos")
-    grafos = cargar_grafos(metrica, filtro, base)
-    ctx_grafos = construir_contexto_grafos(grafos)
+    ctx_grafos = cargar_contexto(metrica, filtro, base)
 
     # operadores
     rng = np.random.default_rng(seed)
     operadores = preparar_operadores_grafos(
         problema,
-        grafos=grafos,
         ctx_grafos=ctx_grafos,
         cruce=cruce,
         mutacion=mutacion,
@@ -174,11 +193,92 @@ def ejecutar_grafos(
         prob_mutacion=prob_mutacion,
         rng=rng,
     )
+    return problema, operadores
+
+
+def ejecutar_grafos(
+    comida_bd,
+    objetivo_calorias,
+    edad,
+    gustos,
+    no_gustos,
+    alergias,
+    *,
+    metrica="coseno",               # "coseno" | "braycurtis" | "jaccard"
+    filtro="knn",                   # "knn" | "knn_doble" | "umbral"
+    carpeta_grafos=None,            
+    cruce="camino",                 # "camino" | "caminatas"
+    mutacion="radio",               # "radio"  | "comunidades"
+    prob_cruce=0.9,
+    prob_mutacion=1/77,
+    seed=42,
+    verbose=True,
+    arranque_caliente=False,
+    n_generaciones=None,
+    n_islas=1,
+    terminacion="n_gen",        # "n_gen" | "convergencia"
+    cache_evaluaciones=False,
+    busqueda_local=False,
+):
+    """
+    Ejecuta una vez el espacio de grafos.
+    Devuelve el resultado de pymoo.
+    Con arranque_caliente la población inicial parte de las soluciones archivadas de perfiles
+    parecidos y el frente final se archiva. n_generaciones=None usa GENERACIONES_FIJAS
+    (o GENERACIONES_ARRANQUE_CALIENTE si se ha sembrado la población).
+    Con n_islas > 1 se usa el modelo de islas (ver algoritmo.islas).
+    terminacion="convergencia" para antes si el frente deja de mejorar (con islas, cada isla por su cuenta).
+    cache_evaluaciones: no reevalúa menús ya vistos (ver ProblemaConCache); tasa de aciertos en res.cache.
+    busqueda_local: refina el frente final con cambios de un gen (ver algoritmo.busqueda_local).
+    """
+    parametros = dict(
+        comida_bd=comida_bd,
+        objetivo_calorias=objetivo_calorias,
+        edad=edad,
+        gustos=gustos,
+        no_gustos=no_gustos,
+        alergias=alergias,
+        metrica=metrica,
+        filtro=filtro,
+        carpeta_grafos=carpeta_grafos,
+        cruce=cruce,
+        mutacion=mutacion,
+        prob_cruce=prob_cruce,
+        prob_mutacion=prob_mutacion,
+    )
+    problema, operadores = preparar_grafos(**parametros, seed=seed)
+
+    # arranque en caliente desde soluciones previas
+    if arranque_caliente:
+        perfil = perfil_sujeto(objetivo_calorias, edad, gustos, no_gustos, alergias)
+        n_generaciones = sembrar_inicializacion(operadores["sampling"], perfil, POBLACION_FIJA, n_generaciones)
 
     # ejecutar
-    return ejecutar_nsga3(
-        problem=problema,
-        operadores=operadores,
-        seed=seed,
-        verbose=verbose,
-    )
\ No newline at end of file
+    n_generaciones = n_generaciones or GENERACIONES_FIJAS
+    if n_islas > 1:
+        res = ejecutar_islas(
+            preparar_grafos,
+            parametros,
+            seed,
+            n_islas=n_islas,
+            n_generaciones=n_generaciones,
+            soluciones_iniciales=operadores["sampling"].soluciones_iniciales,
+            terminacion=terminacion,
+            cache_evaluaciones=cache_evaluaciones,
+            verbose=verbose,
+        )
+    else:
+        res = ejecutar_nsga3(
+            problem=problema,
+            operadores=operadores,
+            seed=seed,
+            verbose=verbose,
+            n_generaciones=n_generaciones,
+            terminacion=terminacion,
+            cache_evaluaciones=cache_evaluaciones,
+        )
+    if busqueda_local:
+        refinar_resultado(problema, res, seed=seed, verbose=verbose)
+    if arranque_caliente:
+        archivar_resultado(perfil, res)
+    return res
\ No newline at end of file
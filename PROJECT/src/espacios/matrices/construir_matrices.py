@@ -1,18 +1,40 @@
 # construir_matrices.py — Calcula y guarda matrices de similitud
+# Además de la matriz densa guarda su versión top-k por tipo de comida (CSR, ver similitud_topk).
+# Las tres métricas se calculan en paralelo (un proceso por métrica).
+# Modo incremental: si comida.csv solo cambia en algunos alimentos (editados o añadidos al final),
+# se recalculan solo sus filas y columnas sobre los .npy existentes (memmap).
 
 import os
 import numpy as np
 
 from src.utilidades.carga_nutrientes import preparar_datos
+from src.utilidades.paralelo import pool_procesos, mapear_ordenado
 from src.espacios.matrices.metricas_similitud import (
     calcular_similitud_coseno,
     calcular_similitud_braycurtis,
     calcular_similitud_jaccard,
+    similitud_coseno_filas,
+    similitud_braycurtis_filas,
+    similitud_jaccard_filas,
+)
+from src.espacios.matrices.similitud_topk import (
+    K_POR_DEFECTO,
+    construir_topk,
+    guardar_topk,
+    ruta_topk,
 )
 
 # Carpeta de salida
 DIR_SIMILITUD = os.path.join("data", "procesado", "matrices", "similitud")
 
+# entradas de la última construcción (ids y vectores de cada métrica) para el modo incremental
+RUTA_ENTRADAS = os.path.join(DIR_SIMILITUD, "entradas_matrices.npz")
+VERSION_ENTRADAS = 1
+
+# por encima de esta fracción de filas cambiadas se recalcula la matriz entera
+MAX_FRACCION_INCREMENTAL = 0.5
+FILAS_POR_BLOQUE = 256
+
 def guardar_matriz(matriz, nombre):
     """Guarda .npy en data/procesado/matrices/similitud/."""
     os.makedirs(DIR_SIMILITUD, exist_ok=True)
@@ -20,21 +42,148 @@ def guardar_matriz(matriz, nombre):
     np.save(ruta, matriz)
     print(f"Guardado: {ruta}")
 
-def generar_matrices_similitud():
-    """Calcula y guarda coseno, Bray–Curtis y Jaccard."""
-    _, nutrientes_norm, nutrientes_onehot = preparar_datos()
+def guardar_topk_matriz(matriz, nombre, comida_bd, k=K_POR_DEFECTO):
+    """Guarda los k vecinos más similares por tipo de comida (CSR .npz)."""
+    ruta = ruta_topk(nombre, k)
+    guardar_topk(construir_topk(matriz, comida_bd, k), ruta)
+    print(f"Guardado: {ruta}")
+
+# métrica -> (mensaje, función, función por filas, datos de entrada, fichero)
+METRICAS = {
+    "coseno":     ("Matriz coseno.",      calcular_similitud_coseno,     similitud_coseno_filas,
+                   "nutrientes_norm",   "matriz_coseno.npy"),
+    "braycurtis": ("Matriz Bray–Curtis.", calcular_similitud_braycurtis, similitud_braycurtis_filas,
+                   "nutrientes_norm",   "matriz_braycurtis.npy"),
+    "jaccard":    ("Matriz Jaccard.",     calcular_similitud_jaccard,    similitud_jaccard_filas,
+                   "nutrientes_onehot", "matriz_jaccard.npy"),
+}
+
+
+def leer_entradas(ruta=RUTA_ENTRADAS):
+    """Entradas de la construcción anterior (None si no hay o es de otra versión)."""
+    if not os.path.exists(ruta):
+        return None
+    with np.load(ruta) as d:
+        if int(d["version"]) != VERSION_ENTRADAS:
+            return None
+        return {k: d[k] for k in d.files}
+
+
+def guardar_entradas(ids, nutrientes_norm, nutrientes_onehot, ruta=RUTA_ENTRADAS):
+    """Guarda las entradas de esta construcción (temporal + renombrado)."""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    tmp = f"{ruta}.{os.getpid()}.tmp.npz"
+    np.savez(tmp, version=VERSION_ENTRADAS, ids=ids,
+             nutrientes_norm=nutrientes_norm, nutrientes_onehot=nutrientes_onehot)
+    os.replace(tmp, ruta)
+
+
+def filas_a_recalcular(previas, ids, entrada, X, ruta_matriz):
+    """
+    Filas que hay que recalcular en una matriz: las editadas y las añadidas al final.
+    None → recálculo completo: no hay matriz o entradas previas, se han borrado o reordenado
+    alimentos, o cambian demasiadas filas (p. ej. porque cambia el mín./máx. de la normalización).
+    """
+    if previas is None or not os.path.exists(ruta_matriz):
+        return None
+    ids_prev, X_prev = previas["ids"], previas[entrada]
+    n_prev = ids_prev.size
+    if n_prev > ids.size or not np.array_equal(ids_prev, ids[:n_prev]):
+        return None
+    if np.load(ruta_matriz, mmap_mode="r").shape != (n_prev, n_prev):
+        return None
+
+    editadas = np.flatnonzero(np.any(X_prev != X[:n_prev], axis=1))
+    filas = np.concatenate([editadas, np.arange(n_prev, ids.size)])
+    if filas.size > MAX_FRACCION_INCREMENTAL * ids.size:
+        return None
+    return filas
+
+
+def ampliar_matriz(ruta, n):
+    """Copia la matriz guardada en una (n, n) mayor; lo nuevo queda a 0 hasta recalcularlo."""
+    vieja = np.load(ruta, mmap_mode="r")
+    n_prev = vieja.shape[0]
+    tmp = f"{ruta}.{os.getpid()}.tmp"
+    nueva = np.lib.format.open_memmap(tmp, mode="w+", dtype=vieja.dtype, shape=(n, n))
+    for i in range(0, n_prev, FILAS_POR_BLOQUE):
+        fin = min(i + FILAS_POR_BLOQUE, n_prev)
+        nueva[i:fin, :n_prev] = vieja[i:fin]
+    nueva.flush()
+    del nueva, vieja
+    os.replace(tmp, ruta)
+
+
+def actualizar_matriz(ruta, funcion_filas, X, filas):
+    """Recalcula en el .npy (memmap) las filas y columnas indicadas."""
+    n = X.shape[0]
+    if np.load(ruta, mmap_mode="r").shape[0] != n:
+        ampliar_matriz(ruta, n)
+    M = np.load(ruta, mmap_mode="r+")
+    for i in range(0, filas.size, FILAS_POR_BLOQUE):
+        f = filas[i:i + FILAS_POR_BLOQUE]
+        bloque = funcion_filas(X, f)
+        M[f, :] = bloque
+        M[:, f] = bloque.T
+    M.flush()
+    return M
+
+
+_DATOS = None
+
+
+def iniciar_worker(datos):
+    """Deja en el proceso el catálogo y los nutrientes preparados."""
+    global _DATOS
+    _DATOS = datos
+
+
+def generar_matriz(tarea):
+    """
+    Calcula y guarda una métrica (densa y top-k). Tarea del pool: (nombre, filas).
+    filas=None recalcula la matriz entera; si no, solo esas filas/columnas.
+    """
+    nombre, filas = tarea
+    mensaje, funcion, funcion_filas, entrada, archivo = METRICAS[nombre]
+    X = _DATOS[entrada]
+
+    if filas is None:
+        print(mensaje)
+        sim = funcion(X)
+        guardar_matriz(sim, archivo)
+    else:
+        print(f"{mensaje} Incremental: {filas.size} filas.")
+        sim = actualizar_matriz(os.path.join(DIR_SIMILITUD, archivo), funcion_filas, X, filas)
+
+    # el top-k depende también de los tipos de comida: se rehace siempre
+    guardar_topk_matriz(sim, nombre, _DATOS["comida_bd"], _DATOS["k"])
+    return nombre
+
+
+def generar_matrices_similitud(k=K_POR_DEFECTO, n_procesos=None, incremental=True):
+    """
+    Calcula y guarda coseno, Bray–Curtis y Jaccard (densas y top-k), una por proceso.
+    Con incremental=True reutiliza las matrices guardadas si el catálogo lo permite.
+    """
+    comida_bd, _, nutrientes_norm, nutrientes_onehot = preparar_datos(retornar_comida=True)
+    ids = np.array([str(a.get("id", a["nombre"])) for a in comida_bd])
+    datos = {
+        "comida_bd": comida_bd,
+        "nutrientes_norm": nutrientes_norm,
+        "nutrientes_onehot": nutrientes_onehot,
+        "k": k,
+    }
 
-    print("Matriz coseno.")
-    sim_cos = calcular_similitud_coseno(nutrientes_norm)
-    guardar_matriz(sim_cos, "matriz_coseno.npy")
+    previas = leer_entradas() if incremental else None
+    tareas = [
+        (nombre, filas_a_recalcular(previas, ids, entrada, datos[entrada], os.path.join(DIR_SIMILITUD, archivo)))
+        for nombre, (_, _, _, entrada, archivo) in METRICAS.items()
+    ]
 
-    print("Matriz Bray–Curtis.")
-    sim_bc = calcular_similitud_braycurtis(nutrientes_norm)
-    guardar_matriz(sim_bc, "matriz_braycurtis.npy")
+    with pool_procesos(min(n_procesos or len(METRICAS), len(METRICAS)), iniciar_worker, (datos,)) as pool:
+        mapear_ordenado(generar_matriz, tareas, pool)
 
-    print("Matriz Jaccard.")
-    sim_j = calcular_similitud_jaccard(nutrientes_onehot)
-    guardar_matriz(sim_j, "matriz_jaccard.npy")
+    guardar_entradas(ids, nutrientes_norm, nutrientes_onehot)
 
 if __name__ == "__main__":
-    generar_matrices_similitud()
\ No newline at end of file
+    generar_matrices_similitud()
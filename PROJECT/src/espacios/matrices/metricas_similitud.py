@@ -3,7 +3,7 @@
 
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
-from scipy.spatial.distance import pdist, squareform
+from scipy.spatial.distance import pdist, squareform, cdist
 
 
 def calcular_similitud_coseno(nutrientes):
@@ -20,4 +20,21 @@ def calcular_similitud_braycurtis(nutrientes):
 def calcular_similitud_jaccard(nutrientes_binarios):
     """Devuelve la matriz de similitud Jaccard a partir de vectores one-hot."""
     dist = pdist(nutrientes_binarios, metric="jaccard")
-    return 1.0 - squareform(dist)
\ No newline at end of file
+    return 1.0 - squareform(dist)
+
+
+# por filas: similitud de las filas indicadas con todos (actualización incremental)
+
+def similitud_coseno_filas(nutrientes, filas):
+    """Filas 'filas' de la matriz coseno, (len(filas), N)."""
+    return cosine_similarity(nutrientes[filas], nutrientes)
+
+
+def similitud_braycurtis_filas(nutrientes, filas):
+    """Filas 'filas' de la matriz Bray–Curtis, (len(filas), N)."""
+    return 1.0 - cdist(nutrientes[filas], nutrientes, metric="braycurtis")
+
+
+def similitud_jaccard_filas(nutrientes_binarios, filas):
+    """Filas 'filas' de la matriz Jaccard, (len(filas), N)."""
+    return 1.0 - cdist(nutrientes_binarios[filas], nutrientes_binarios, metric="jaccard")
@@ -3,20 +3,32 @@
 import numpy as np
 from pymoo.core.crossover import Crossover
 from src.utilidades.planificacion import seleccionar_ruleta
+from src.espacios.matrices.similitud_topk import mascaras_validos
 
 
-def construir_contexto_cruce_matriz(*, sim_matriz, validos_por_posicion, rng):
+def construir_contexto_cruce_matriz(*, sim_matriz=None, validos_por_posicion, rng,
+                                    sim_topk=None, tipos_por_posicion=None):
     """
     Prepara el contexto que usan los cruces por matriz.
+    Con sim_topk (SimilitudTopK) se usan los vecinos top-k en lugar de las filas densas.
     """
     valid_np = [np.asarray(v, dtype=np.int32) for v in validos_por_posicion]
-    return {"sim_matriz": sim_matriz, "validos_por_posicion": valid_np, "rng": rng}
+    ctx = {"sim_matriz": sim_matriz, "validos_por_posicion": valid_np, "rng": rng, "sim_topk": sim_topk}
+    if sim_topk is not None:
+        ctx["tipos_por_posicion"] = list(tipos_por_posicion)
+        ctx["mascara_validos"] = mascaras_validos(validos_por_posicion, sim_topk.n_alimentos)
+    return ctx
 
 
 class CruceMatrizBase(Crossover):
     """
     Crossover sobre índices usando una matriz de similitud.
+    Los scores se calculan solo sobre los candidatos de cada posición (arrays alineados con cand).
+    Con top-k los candidatos son la unión de los vecinos de ambos padres,
+    salvo que la subclase pida todos (todos_los_candidatos).
     """
+    todos_los_candidatos = False
+
     def __init__(self, contexto: dict, prob: float = 1.0):
         super().__init__(2, 2)
         self.ctx = contexto
@@ -58,26 +70,26 @@ class CruceMatrizBase(Crossover):
                     h1[pos], h2[pos] = idxA, idxB
                     continue
 
-                # filas de similitud
-                simA, simB = sim[idxA], sim[idxB]
+                # similitud de cada padre con los candidatos
+                cand_s, simA, simB = self.filas_similitud(pos, idxA, idxB, cand)
 
                 # hijo 1
-                s1 = self.construir_scores_h1(simA, simB, pos, idxA, idxB, estado)
+                s1 = self.construir_scores_h1(simA, simB, cand_s, pos, idxA, idxB, estado)
                 if np.isscalar(s1):
                     h1[pos] = int(s1)
                 else:
-                    w1 = np.asarray(s1, dtype=float)
-                    w1[idxA] = 0.0  # evita que el hijo copie tal cual al padre
-                    h1[pos] = int(seleccionar_ruleta(self.rng, w1[cand], indices_validos=cand))
+                    w1 = np.array(s1, dtype=float)
+                    w1[cand_s == idxA] = 0.0  # evita que el hijo copie tal cual al padre
+                    h1[pos] = self.elegir(w1, cand_s, cand)
 
                 # hijo 2
-                s2 = self.construir_scores_h2(simA, simB, pos, idxA, idxB, estado)
+                s2 = self.construir_scores_h2(simA, simB, cand_s, pos, idxA, idxB, estado)
                 if np.isscalar(s2):
                     h2[pos] = int(s2)
                 else:
-                    w2 = np.asarray(s2, dtype=float)
-                    w2[idxB] = 0.0
-                    h2[pos] = int(seleccionar_ruleta(self.rng, w2[cand], indices_validos=cand))
+                    w2 = np.array(s2, dtype=float)
+                    w2[cand_s == idxB] = 0.0
+                    h2[pos] = self.elegir(w2, cand_s, cand)
 
             hijos[m, 0], hijos[m, 1] = h1, h2
 
@@ -85,10 +97,42 @@ class CruceMatrizBase(Crossover):
         return np.swapaxes(hijos, 0, 1)
 
 
-    def construir_scores_h1(self, simA, simB, pos, idxA, idxB, estado):
+    def filas_similitud(self, pos, idxA, idxB, cand):
+        """
+        (candidatos, simA, simB) con simA/simB alineados con los candidatos.
+        - denso: todos los válidos de la posición.
+        - top-k: vecinos válidos de A y B (o todos los válidos, con 0 fuera del top-k).
+        """
+        topk = self.ctx.get("sim_topk")
+        if topk is None:
+            sim = self.ctx["sim_matriz"]
+            return cand, sim[idxA][cand], sim[idxB][cand]
+
+        tipo = self.ctx["tipos_por_posicion"][pos]
+        mascara = self.ctx["mascara_validos"][pos]
+        vA, wA = topk.vecinos(tipo, idxA)
+        vB, wB = topk.vecinos(tipo, idxB)
+        okA, okB = mascara[vA], mascara[vB]
+        vA, wA, vB, wB = vA[okA], wA[okA], vB[okB], wB[okB]
+
+        cand_s = cand if self.todos_los_candidatos else np.union1d(vA, vB).astype(np.int32)
+        simA = np.zeros(cand_s.size)
+        simB = np.zeros(cand_s.size)
+        orden = np.argsort(cand_s, kind="stable")
+        simA[orden[np.searchsorted(cand_s, vA, sorter=orden)]] = wA
+        simB[orden[np.searchsorted(cand_s, vB, sorter=orden)]] = wB
+        return cand_s, simA, simB
+
+    def elegir(self, pesos, cand_s, cand):
+        """Ruleta sobre cand_s; si los pesos no sirven, uniforme sobre todos los válidos."""
+        if cand_s is not cand and not (pesos > 0.0).any():
+            return int(self.rng.choice(cand))
+        return int(seleccionar_ruleta(self.rng, pesos, indices_validos=cand_s))
+
+    def construir_scores_h1(self, simA, simB, cand, pos, idxA, idxB, estado):
         raise NotImplementedError
 
-    def construir_scores_h2(self, simA, simB, pos, idxA, idxB, estado):
+    def construir_scores_h2(self, simA, simB, cand, pos, idxA, idxB, estado):
         raise NotImplementedError
 
 
@@ -119,11 +163,11 @@ class CruceMatrizConsensoPonderado(CruceMatrizBase):
             return estado["a1"], estado["a2"]
         return self.muestrear_alpha(self.alpha_h1), self.muestrear_alpha(self.alpha_h2)
 
-    def construir_scores_h1(self, simA, simB, pos, idxA, idxB, estado):
+    def construir_scores_h1(self, simA, simB, cand, pos, idxA, idxB, estado):
         a1, _ = self.alphas(estado, forzar_nuevo=self.por_gen)
         return (1.0 - a1) * np.asarray(simA, dtype=float) + a1 * np.asarray(simB, dtype=float)
 
-    def construir_scores_h2(self, simA, simB, pos, idxA, idxB, estado):
+    def construir_scores_h2(self, simA, simB, cand, pos, idxA, idxB, estado):
         _, a2 = self.alphas(estado, forzar_nuevo=self.por_gen)
         return (1.0 - a2) * np.asarray(simA, dtype=float) + a2 * np.asarray(simB, dtype=float)
 
@@ -132,20 +176,22 @@ class CruceMatrizAntiConsenso(CruceMatrizBase):
     """
     Favorece candidatos alejados de ambos padres.
     2 - (simA + simB)
+    Necesita todos los candidatos: con top-k, fuera de los vecinos la similitud es 0.
     """
+    todos_los_candidatos = True
+
     def __init__(self, contexto: dict, prob: float = 1.0, excluir_padres=True):
         super().__init__(contexto, prob)
         self.excluir_padres = bool(excluir_padres)
 
-    def calcular_scores(self, simA, simB, idxA, idxB):
+    def calcular_scores(self, simA, simB, cand, idxA, idxB):
         s = (1.0 - np.asarray(simA, dtype=float)) + (1.0 - np.asarray(simB, dtype=float))
         if self.excluir_padres:
-            s[idxA] = 0.0
-            s[idxB] = 0.0
+            s[(cand == idxA) | (cand == idxB)] = 0.0
         return s
 
-    def construir_scores_h1(self, simA, simB, pos, idxA, idxB, estado):
-        return self.calcular_scores(simA, simB, idxA, idxB)
+    def construir_scores_h1(self, simA, simB, cand, pos, idxA, idxB, estado):
+        return self.calcular_scores(simA, simB, cand, idxA, idxB)
 
-    def construir_scores_h2(self, simA, simB, pos, idxA, idxB, estado):
-        return self.calcular_scores(simA, simB, idxA, idxB)
\ No newline at end of file
+    def construir_scores_h2(self, simA, simB, cand, pos, idxA, idxB, estado):
+        return self.calcular_scores(simA, simB, cand, idxA, idxB)
\ No newline at end of file
@@ -3,14 +3,21 @@
 import numpy as np
 from pymoo.core.mutation import Mutation
 from src.utilidades.planificacion import elegir_posiciones_a_mutar, seleccionar_ruleta
+from src.espacios.matrices.similitud_topk import mascaras_validos
 
 
-def construir_contexto_mutacion_matriz(*, sim_matriz, validos_por_posicion, rng):
+def construir_contexto_mutacion_matriz(*, sim_matriz=None, validos_por_posicion, rng,
+                                       sim_topk=None, tipos_por_posicion=None):
     """
     Prepara el contexto que usan las mutaciones por matriz.
+    Con sim_topk (SimilitudTopK) se usan los vecinos top-k en lugar de las filas densas.
     """
     valid_np = [np.asarray(v, dtype=np.int32) for v in validos_por_posicion]
-    return {"sim_matriz": sim_matriz, "validos_por_posicion": valid_np, "rng": rng}
+    ctx = {"sim_matriz": sim_matriz, "validos_por_posicion": valid_np, "rng": rng, "sim_topk": sim_topk}
+    if sim_topk is not None:
+        ctx["tipos_por_posicion"] = list(tipos_por_posicion)
+        ctx["mascara_validos"] = mascaras_validos(validos_por_posicion, sim_topk.n_alimentos)
+    return ctx
 
 
 class MutacionMatrizBase(Mutation):
@@ -56,9 +63,14 @@ class MutacionMatrizBase(Mutation):
                     x_nuevo[pos] = int(self.rng.choice(otros))
                     continue
 
+            if self.ctx.get("sim_topk") is not None:
+                x_nuevo[pos] = self.elegir_topk(pos, idx_actual, candidatos)
+                continue
+
             # pesos guiados por similitud
             vec_sim = sim[idx_actual]
-            pesos = np.asarray(self.construir_pesos(vec_sim, pos), dtype=float)
+            # copia: la ruleta devuelve la fila de la matriz y no se debe escribir en ella
+            pesos = np.array(self.construir_pesos(vec_sim, pos), dtype=float)
             pesos[idx_actual] = 0.0
             pesos_perm = pesos[candidatos]
             pesos_perm = (1.0 - self.eps_suavizado) * pesos_perm + self.eps_suavizado
@@ -68,24 +80,59 @@ class MutacionMatrizBase(Mutation):
 
         return x_nuevo
 
-    def construir_pesos(self, vector_similitud, pos):
+    def elegir_topk(self, pos, idx_actual, candidatos):
+        """
+        Misma ruleta que en denso tomando similitud 0 fuera de los vecinos top-k, en O(k):
+        se elige primero el grupo (vecinos | actual | resto) por su masa y luego dentro de él.
+        """
+        tipo = self.ctx["tipos_por_posicion"][pos]
+        vecinos, sims = self.ctx["sim_topk"].vecinos(tipo, idx_actual)
+        ok = self.ctx["mascara_validos"][pos][vecinos]
+        vecinos, sims = vecinos[ok], sims[ok].astype(float)
+
+        # el último peso corresponde a los candidatos fuera del top-k (similitud 0);
+        # el máximo de la fila densa se pasa para que el softmax centre igual que en denso
+        maximos = self.ctx["sim_topk"].maximos
+        maximo = None if maximos is None else float(maximos[idx_actual])
+        pesos = np.asarray(self.construir_pesos(np.append(sims, 0.0), pos, maximo), dtype=float)
+        eps = self.eps_suavizado
+        pesos_vecinos = (1.0 - eps) * pesos[:-1] + eps
+        n_resto = candidatos.size - vecinos.size - 1
+        masas = np.array([pesos_vecinos.sum(), eps, ((1.0 - eps) * pesos[-1] + eps) * max(n_resto, 0)])
+
+        u = self.rng.random() * masas.sum()
+        if u < masas[0]:
+            return int(seleccionar_ruleta(self.rng, pesos_vecinos, indices_validos=vecinos))
+        if u < masas[0] + masas[1] or n_resto <= 0:
+            return idx_actual
+        # resto: uniforme por rechazo (los vecinos son pocos frente a los candidatos)
+        while True:
+            c = int(candidatos[self.rng.integers(candidatos.size)])
+            if c != idx_actual and c not in vecinos:
+                return c
+
+    def construir_pesos(self, vector_similitud, pos, maximo=None):
+        """Pesos por candidato. maximo: máximo de la fila densa cuando vector_similitud es parcial."""
         raise NotImplementedError
 
 
 class MutacionMatrizRuletaSimilitud(MutacionMatrizBase):
     """Probabilidad proporcional a la similitud."""
-    def construir_pesos(self, vector_similitud, pos):
+    def construir_pesos(self, vector_similitud, pos, maximo=None):
         return np.asarray(vector_similitud, dtype=float)
 
 
 class MutacionMatrizSoftmaxBoltzmann(MutacionMatrizBase):
-    """Probabilidad por softmax con temperatura tau."""
+    """
+    Probabilidad por softmax con temperatura tau, centrada en el máximo de la fila densa
+    (en top-k se recibe aparte, porque el vector solo tiene los vecinos).
+    """
     def __init__(self, contexto: dict, prob: float = 1/77, tau: float = 0.8):
         super().__init__(contexto, prob)
         self.tau = float(tau)
 
-    def construir_pesos(self, vector_similitud, pos):
+    def construir_pesos(self, vector_similitud, pos, maximo=None):
         sim = np.clip(np.asarray(vector_similitud, dtype=float), 0.0, 1.0)
-        sim_centrada = sim - np.max(sim)
+        sim_centrada = sim - (np.max(sim) if maximo is None else maximo)
         tau_segura = self.tau if self.tau > 1e-12 else 1e-12
         return np.exp(sim_centrada / tau_segura)
\ No newline at end of file
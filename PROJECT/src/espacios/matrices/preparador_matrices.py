@@ -5,7 +5,10 @@ import os
 import numpy as np
 
 from src.algoritmo.problema import PlanningComida
-from src.algoritmo.ejecutor_ag import ejecutar_nsga3
+from src.algoritmo.ejecutor_ag import ejecutar_nsga3, POBLACION_FIJA, GENERACIONES_FIJAS
+from src.algoritmo.islas import ejecutar_islas
+from src.algoritmo.arranque_caliente import perfil_sujeto, sembrar_inicializacion, archivar_resultado
+from src.algoritmo.busqueda_local import refinar_resultado
 from src.algoritmo.inicializacion_mutacion import InicializacionCustom, MutacionCustom
 
 from src.espacios.matrices.operadores.cruce import (
@@ -19,22 +22,73 @@ from src.espacios.matrices.operadores.mutacion import (
     MutacionMatrizSoftmaxBoltzmann,
 )
 
+from src.espacios.matrices.similitud_topk import K_POR_DEFECTO, leer_topk, ruta_topk
+
 from src.utilidades.planificacion import (
     construir_validos_por_posicion,
     tipos_por_posicion,
 )
 
-def cargar_matriz_similitud(nombre: str):
-    """
-    Devuelve la matriz de similitud guardada en data/procesado/matrices/.
-    """
+# matrices abiertas en este proceso: (nombre, dtype) -> memmap de solo lectura
+_CACHE_MATRICES = {}
+
+def ruta_matriz_similitud(nombre: str, dtype=None):
+    """Ruta del .npy de la matriz; con dtype distinto del original, la de su copia convertida."""
     base = os.path.join("data", "procesado", "matrices")
     archivo = {
         "coseno": "matriz_coseno.npy",
         "braycurtis": "matriz_braycurtis.npy",
         "jaccard": "matriz_jaccard.npy",
     }[nombre]
-    return np.load(os.path.join(base, archivo))
+    if dtype is not None:
+        archivo = archivo.replace(".npy", f"_{np.dtype(dtype).name}.npy")
+    return os.path.join(base, archivo)
+
+
+def convertir_matriz(origen, destino, dtype, filas_por_bloque=256):
+    """
+    Escribe en destino una copia de origen con otro dtype, por bloques de filas.
+    Se escribe en un temporal y se renombra, así otro proceso nunca lee un fichero a medias.
+    """
+    src = np.load(origen, mmap_mode="r")
+    tmp = f"{destino}.{os.getpid()}.tmp"
+    out = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=src.shape)
+    for i in range(0, src.shape[0], filas_por_bloque):
+        out[i:i + filas_por_bloque] = src[i:i + filas_por_bloque]
+    out.flush()
+    del out
+    os.replace(tmp, destino)
+
+
+def cargar_matriz_similitud(nombre: str, dtype=None):
+    """
+    Devuelve la matriz de similitud guardada en data/procesado/matrices/.
+    - Se mapea en memoria (solo lectura) una vez por proceso: los workers comparten páginas.
+    - dtype (p. ej. np.float32) usa una copia convertida junto al original, creada la primera vez.
+    """
+    dtype = None if dtype is None else np.dtype(dtype)
+    clave = (nombre, None if dtype is None else dtype.str)
+    if clave in _CACHE_MATRICES:
+        return _CACHE_MATRICES[clave]
+
+    ruta = ruta_matriz_similitud(nombre)
+    sim = np.load(ruta, mmap_mode="r")
+    if dtype is not None and sim.dtype != dtype:
+        ruta_dt = ruta_matriz_similitud(nombre, dtype)
+        if not os.path.exists(ruta_dt) or os.path.getmtime(ruta_dt) < os.path.getmtime(ruta):
+            convertir_matriz(ruta, ruta_dt, dtype)
+        sim = np.load(ruta_dt, mmap_mode="r")
+
+    _CACHE_MATRICES[clave] = sim
+    return sim
+
+
+def cargar_topk_similitud(nombre: str, k: int = K_POR_DEFECTO):
+    """Vecinos top-k por tipo (SimilitudTopK), leídos una vez por proceso."""
+    clave = (nombre, "topk", int(k))
+    if clave not in _CACHE_MATRICES:
+        _CACHE_MATRICES[clave] = leer_topk(ruta_topk(nombre, k))
+    return _CACHE_MATRICES[clave]
 
 
 
@@ -47,6 +101,9 @@ def preparar_operadores_matrices(
     prob_cruce: float = 0.9,
     prob_mutacion: float = 1/77,
     rng=None,
+    dtype_matriz=None,             # None (dtype guardado) | np.float32
+    formato: str = "denso",        # "denso"|"topk"
+    k_topk: int = K_POR_DEFECTO,
 ):
     """
     Construye sampling + crossover + mutation usando una matriz de similitud.
@@ -55,32 +112,40 @@ def preparar_operadores_matrices(
 
     sampling = InicializacionCustom(problema, rng=rng)
 
-    sim = cargar_matriz_similitud(matriz)
     validos = problema.validos_por_posicion
+    if formato == "denso":
+        fuente = {"sim_matriz": cargar_matriz_similitud(matriz, dtype=dtype_matriz)}
+    elif formato == "topk":
+        fuente = {
+            "sim_topk": cargar_topk_similitud(matriz, k_topk),
+            "tipos_por_posicion": problema.tipos_por_posicion,
+        }
+    else:
+        raise ValueError(f"Formato de matriz no reconocido: {formato}")
 
     if cruce == "twopoint":
         from pymoo.operators.crossover.pntx import TwoPointCrossover
         crossover = TwoPointCrossover(prob=prob_cruce)
     elif cruce == "consenso":
-        ctx_c = construir_contexto_cruce_matriz(sim_matriz=sim, validos_por_posicion=validos, rng=rng)
+        ctx_c = construir_contexto_cruce_matriz(validos_por_posicion=validos, rng=rng, **fuente)
         crossover = CruceMatrizConsensoPonderado(ctx_c, prob=prob_cruce)
     elif cruce == "anticonsenso":
-        ctx_c = construir_contexto_cruce_matriz(sim_matriz=sim, validos_por_posicion=validos, rng=rng)
+        ctx_c = construir_contexto_cruce_matriz(validos_por_posicion=validos, rng=rng, **fuente)
         crossover = CruceMatrizAntiConsenso(ctx_c, prob=prob_cruce)
 
     if mutacion == "custom":
        mutation = MutacionCustom(problema, prob_mutacion=prob_mutacion, rng=rng)
     elif mutacion == "ruleta":
-        ctx_m = construir_contexto_mutacion_matriz(sim_matriz=sim, validos_por_posicion=validos, rng=rng)
+        ctx_m = construir_contexto_mutacion_matriz(validos_por_posicion=validos, rng=rng, **fuente)
         mutation = MutacionMatrizRuletaSimilitud(ctx_m, prob=prob_mutacion)
     elif mutacion == "softmax":
-        ctx_m = construir_contexto_mutacion_matriz(sim_matriz=sim, validos_por_posicion=validos, rng=rng)
+        ctx_m = construir_contexto_mutacion_matriz(validos_por_posicion=validos, rng=rng, **fuente)
         mutation = MutacionMatrizSoftmaxBoltzmann(ctx_m, prob=prob_mutacion, tau=0.8)
 
     return {"sampling": sampling, "crossover": crossover, "mutation": mutation}
 
 
-def ejecutar_matrices(
+def preparar_matrices(
     comida_bd,
     objetivo_calorias,
     edad,
@@ -94,11 +159,13 @@ def ejecutar_matrices(
     prob_cruce=0.9,
     prob_mutacion=1/77,
     seed=42,
-    verbose=True,
+    dtype_matriz=None,
+    formato="denso",             # "denso"|"topk"
+    k_topk=K_POR_DEFECTO,
 ):
     """
-    Ejecuta una vez el espacio matricial.
-    Devuelve el resultado de pymoo.
+    Crea el problema y los operadores del espacio matricial.
+    Devuelve (problema, operadores); también sirve de fábrica para el modelo de islas.
     """
     # problema
     problema = PlanningComida(
@@ -124,12 +191,98 @@ def ejecutar_matrices(
         prob_cruce=prob_cruce,
         prob_mutacion=prob_mutacion,
         rng=rng,
+        dtype_matriz=dtype_matriz,
+        formato=formato,
+        k_topk=k_topk,
+    )
+    return problema, operadores
+
+
+def ejecutar_matrices(
+    comida_bd,
+    objetivo_calorias,
+    edad,
+    gustos,
+    no_gustos,
+    alergias,
+    *,
+    matriz="coseno",             # "coseno"|"braycurtis"|"jaccard"
+    cruce="consenso",            # "consenso"|"anticonsenso"|"twopoint"
+    mutacion="ruleta",           # "ruleta"|"softmax"|"custom"
+    prob_cruce=0.9,
+    prob_mutacion=1/77,
+    seed=42,
+    verbose=True,
+    arranque_caliente=False,
+    n_generaciones=None,
+    n_islas=1,
+    terminacion="n_gen",        # "n_gen" | "convergencia"
+    cache_evaluaciones=False,
+    busqueda_local=False,
+    dtype_matriz=None,
+    formato="denso",             # "denso"|"topk"
+    k_topk=K_POR_DEFECTO,
+):
+    """
+    Ejecuta una vez el espacio matricial.
+    Devuelve el resultado de pymoo.
+    Con arranque_caliente la población inicial parte de las soluciones archivadas de perfiles
+    parecidos y el frente final se archiva. n_generaciones=None usa GENERACIONES_FIJAS
+    (o GENERACIONES_ARRANQUE_CALIENTE si se ha sembrado la población).
+    Con n_islas > 1 se usa el modelo de islas (ver algoritmo.islas).
+    terminacion="convergencia" para antes si el frente deja de mejorar (con islas, cada isla por su cuenta).
+    cache_evaluaciones: no reevalúa menús ya vistos (ver ProblemaConCache); tasa de aciertos en res.cache.
+    busqueda_local: refina el frente final con cambios de un gen (ver algoritmo.busqueda_local).
+    """
+    parametros = dict(
+        comida_bd=comida_bd,
+        objetivo_calorias=objetivo_calorias,
+        edad=edad,
+        gustos=gustos,
+        no_gustos=no_gustos,
+        alergias=alergias,
+        matriz=matriz,
+        cruce=cruce,
+        mutacion=mutacion,
+        prob_cruce=prob_cruce,
+        prob_mutacion=prob_mutacion,
+        dtype_matriz=dtype_matriz,
+        formato=formato,
+        k_topk=k_topk,
     )
+    problema, operadores = preparar_matrices(**parametros, seed=seed)
+
+    # arranque en caliente desde soluciones previas
+    if arranque_caliente:
+        perfil = perfil_sujeto(objetivo_calorias, edad, gustos, no_gustos, alergias)
+        n_generaciones = sembrar_inicializacion(operadores["sampling"], perfil, POBLACION_FIJA, n_generaciones)
 
     # ejecutar
-    return ejecutar_nsga3(
-        problem=problema,
-        operadores=operadores,
-        seed=seed,
-        verbose=verbose,
-    )
\ No newline at end of file
+    n_generaciones = n_generaciones or GENERACIONES_FIJAS
+    if n_islas > 1:
+        res = ejecutar_islas(
+            preparar_matrices,
+            parametros,
+            seed,
+            n_islas=n_islas,
+            n_generaciones=n_generaciones,
+            soluciones_iniciales=operadores["sampling"].soluciones_iniciales,
+            terminacion=terminacion,
+            cache_evaluaciones=cache_evaluaciones,
+            verbose=verbose,
+        )
+    else:
+        res = ejecutar_nsga3(
+            problem=problema,
+            operadores=operadores,
+            seed=seed,
+            verbose=verbose,
+            n_generaciones=n_generaciones,
+            terminacion=terminacion,
+            cache_evaluaciones=cache_evaluaciones,
+        )
+    if busqueda_local:
+        refinar_resultado(problema, res, seed=seed, verbose=verbose)
+    if arranque_caliente:
+        archivar_resultado(perfil, res)
+    return res
\ No newline at end of file
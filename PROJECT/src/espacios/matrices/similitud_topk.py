@@ -0,0 +1,141 @@
+# similitud_topk.py — Formato top-k disperso (CSR) de las matrices de similitud
+# Para cada tipo de comida y cada alimento de ese tipo se guardan sus k candidatos
+# más similares (del mismo tipo, sin él mismo) y su similitud.
+# Lo que no está en el top-k cuenta como similitud 0.
+# También se guarda el máximo de cada fila densa (recortada a [0, 1]), que usa el softmax para centrar.
+# Memoria lineal en el tamaño del catálogo en lugar de cuadrática.
+
+import os
+import numpy as np
+
+from src.utilidades.constantes import TipoComida
+from src.utilidades.planificacion import indices_tipo
+
+K_POR_DEFECTO = 32
+
+# junto a las matrices que lee preparador_matrices
+DIR_TOPK = os.path.join("data", "procesado", "matrices")
+
+# candidatos de adulto: superconjunto de los de cualquier edad (incluye alcohol)
+EDAD_ADULTO = 18
+
+TIPOS = [
+    TipoComida.DESAYUNO,
+    TipoComida.BEBIDA_DESAYUNO,
+    TipoComida.SNACKS,
+    TipoComida.ALMUERZO_CENA,
+    TipoComida.BEBIDAS,
+]
+
+
+def ruta_topk(nombre: str, k: int = K_POR_DEFECTO):
+    """Ruta del .npz top-k de una métrica ("coseno" | "braycurtis" | "jaccard")."""
+    return os.path.join(DIR_TOPK, f"topk_{nombre}_k{int(k)}.npz")
+
+
+class SimilitudTopK:
+    """
+    Vecinos top-k por tipo en CSR. Por tipo: indptr (n_alimentos + 1), indices (int32), pesos (float32).
+    La fila de un alimento que no es del tipo está vacía.
+    maximos: máximo de cada fila densa recortada a [0, 1] (None en ficheros antiguos).
+    """
+    def __init__(self, por_tipo: dict, k: int, maximos=None):
+        self.por_tipo = por_tipo
+        self.k = int(k)
+        self.maximos = maximos
+
+    @property
+    def n_alimentos(self):
+        indptr = next(iter(self.por_tipo.values()))[0]
+        return indptr.size - 1
+
+    def vecinos(self, tipo, idx):
+        """(indices, pesos) de los vecinos de idx dentro del tipo, de mayor a menor similitud."""
+        indptr, indices, pesos = self.por_tipo[tipo]
+        a, b = indptr[idx], indptr[idx + 1]
+        return indices[a:b], pesos[a:b]
+
+
+def mascaras_validos(validos_por_posicion, n_alimentos):
+    """Máscara booleana de válidos por posición (una sola por array de válidos compartido)."""
+    cache = {}
+    mascaras = []
+    for v in validos_por_posicion:
+        if id(v) not in cache:
+            m = np.zeros(n_alimentos, dtype=bool)
+            m[np.asarray(v, dtype=np.int64)] = True
+            cache[id(v)] = m
+        mascaras.append(cache[id(v)])
+    return mascaras
+
+
+def construir_topk_tipo(sim, candidatos, k, filas_por_bloque=1024):
+    """
+    CSR de un tipo: para cada candidato, sus k candidatos más similares.
+    Se procesa por bloques de filas para no crear la submatriz completa.
+    """
+    n = sim.shape[0]
+    cand = np.sort(np.asarray(candidatos, dtype=np.int64))
+    k = int(min(k, max(cand.size - 1, 0)))
+
+    indices = np.empty((cand.size, k), dtype=np.int32)
+    pesos = np.empty((cand.size, k), dtype=np.float32)
+    for i in range(0, cand.size, filas_por_bloque):
+        filas = cand[i:i + filas_por_bloque]
+        S = np.asarray(sim[filas][:, cand], dtype=np.float32)
+        S[np.arange(filas.size), i + np.arange(filas.size)] = -np.inf   # sin él mismo
+        if k == 0:
+            continue
+        top = np.argpartition(-S, k - 1, axis=1)[:, :k]
+        w = np.take_along_axis(S, top, axis=1)
+        orden = np.argsort(-w, axis=1, kind="stable")
+        indices[i:i + filas.size] = cand[np.take_along_axis(top, orden, axis=1)]
+        pesos[i:i + filas.size] = np.take_along_axis(w, orden, axis=1)
+
+    conteo = np.zeros(n, dtype=np.int64)
+    conteo[cand] = k
+    indptr = np.concatenate([[0], np.cumsum(conteo)])
+    return indptr, indices.ravel(), pesos.ravel()
+
+
+def maximos_filas(sim, filas_por_bloque=1024):
+    """Máximo de cada fila de sim recortada a [0, 1], por bloques de filas."""
+    n = sim.shape[0]
+    maximos = np.empty(n, dtype=float)
+    for i in range(0, n, filas_por_bloque):
+        bloque = np.clip(np.asarray(sim[i:i + filas_por_bloque], dtype=float), 0.0, 1.0)
+        maximos[i:i + filas_por_bloque] = bloque.max(axis=1)
+    return maximos
+
+
+def construir_topk(sim, comida_bd, k=K_POR_DEFECTO):
+    """SimilitudTopK de todos los tipos a partir de la matriz densa."""
+    por_tipo = {
+        t: construir_topk_tipo(sim, indices_tipo(comida_bd, t, EDAD_ADULTO), k)
+        for t in TIPOS
+    }
+    return SimilitudTopK(por_tipo, k, maximos_filas(sim))
+
+
+def guardar_topk(topk: SimilitudTopK, ruta):
+    """Guarda el CSR de todos los tipos en un .npz."""
+    arrays = {"k": np.int64(topk.k)}
+    if topk.maximos is not None:
+        arrays["maximos"] = topk.maximos
+    for t, (indptr, indices, pesos) in topk.por_tipo.items():
+        arrays[f"{t}__indptr"] = indptr
+        arrays[f"{t}__indices"] = indices
+        arrays[f"{t}__pesos"] = pesos
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    np.savez(ruta, **arrays)
+
+
+def leer_topk(ruta):
+    """Lee un .npz guardado con guardar_topk."""
+    with np.load(ruta) as d:
+        por_tipo = {
+            t: (d[f"{t}__indptr"], d[f"{t}__indices"], d[f"{t}__pesos"])
+            for t in TIPOS
+        }
+        maximos = d["maximos"] if "maximos" in d.files else None
+        return SimilitudTopK(por_tipo, int(d["k"]), maximos)
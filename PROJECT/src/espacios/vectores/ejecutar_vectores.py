@@ -10,6 +10,7 @@ import matplotlib.pyplot as plt
 from pymoo.util.nds.non_dominated_sorting import NonDominatedSorting
 
 from src.utilidades import constantes
+from src.utilidades.paralelo import pool_procesos, mapear_ordenado
 from PROJECT.src.utilidades.carga_datos_csv import leer_comidas, leer_sujetos_con_preferencias
 from src.espacios.vectores.preparador_vectores import ejecutar_vectores as ejecutar_una_vez
 
@@ -39,7 +40,11 @@ os.makedirs(BASE_GRAF, exist_ok=True)
 # utilidades
 
 def mediana_por_generacion(resultado, obj_idx):
-    """Mediana del objetivo indicado por generación."""
+    """Mediana del objetivo indicado por generación (historial ligero o completo)."""
+    historial = getattr(resultado, "historial", None)
+    if historial is not None:
+        return np.asarray(historial["medianas_F"][:, obj_idx], dtype=float)
+
     medianas = []
     for gen in resultado.history:
         F = gen.pop.get("F")
@@ -47,6 +52,15 @@ def mediana_por_generacion(resultado, obj_idx):
     return np.array(medianas, dtype=float)
 
 
+def rellenar_series(series):
+    """
+    Apila series por generación de distinta longitud (terminación por convergencia):
+    las cortas se alargan repitiendo su último valor.
+    """
+    n = max(len(s) for s in series)
+    return np.stack([np.pad(s, (0, n - len(s)), mode="edge") for s in series], axis=0)
+
+
 def etiqueta_prob(p):
     """Convierte 0.9 → '0_9' para nombres de archivo."""
     s = f"{p:.6f}".rstrip("0").rstrip(".")
@@ -64,12 +78,107 @@ def indices_a_json(vector_indices):
 
 
 
-def ejecutar_configuracion(comida_bd, sujetos, seeds, cruce, mutacion, prob_cruce, prob_mut):
+# ejecución por (sujeto, seed): se puede repartir en un pool de procesos
+
+_COMIDA_BD = None
+
+
+def iniciar_worker(comida_bd=None):
+    """Deja el catálogo cargado en el proceso (una vez por worker)."""
+    global _COMIDA_BD
+    _COMIDA_BD = comida_bd if comida_bd is not None else leer_comidas()
+
+
+def ejecutar_seed(tarea):
+    """
+    Ejecuta un par (sujeto, seed) de una configuración.
+    Devuelve la entrada JSON de la seed y las medianas por generación (o None).
+    """
+    si, sujeto, seed, cfg = tarea
+    cruce, mutacion = cfg["cruce"], cfg["mutacion"]
+    prob_cruce, prob_mut = cfg["prob_cruce"], cfg["prob_mut"]
+
+    print(f"Cruce={cruce} mutacion={mutacion} | sujeto={si+1} seed={seed} "
+          f"| pc={prob_cruce} pm={prob_mut}")
+
+    t0 = time.time()
+    res = ejecutar_una_vez(
+        comida_bd=_COMIDA_BD,
+        objetivo_calorias=sujeto["calorias"],
+        edad=sujeto["edad"],
+        gustos=sujeto["gustos"],
+        no_gustos=sujeto["disgustos"],
+        alergias=sujeto["alergias"],
+        cruce=cruce,
+        mutacion=mutacion,
+        prob_cruce=prob_cruce,
+        prob_mutacion=prob_mut,
+        seed=seed,
+        verbose=cfg["verbose"],
+        terminacion=cfg["terminacion"],
+        busqueda_local=cfg["busqueda_local"],
+    )
+    dt = time.time() - t0
+
+    pop = res.pop
+    F = pop.get("F")
+    G = pop.get("G")
+    X = pop.get("X")
+
+    # CV y factibilidad
+    if G is None or len(G) == 0:
+        mask_feas = np.zeros(len(F), dtype=bool)
+        cv_min = cv_mediana = cv_media = 0.0
+    else:
+        Gpos = np.maximum(G, 0.0)
+        cv_vec = Gpos.sum(axis=1)
+        cv_min = float(cv_vec.min())
+        cv_mediana = float(np.median(cv_vec))
+        cv_media = float(cv_vec.mean())
+        mask_feas = (G <= 0.0).all(axis=1)
+
+    # ND factibles
+    if F is not None and mask_feas.any():
+        nd_local = NonDominatedSorting().do(F[mask_feas], only_non_dominated_front=True)
+        nd_idx = np.flatnonzero(mask_feas)[nd_local]
+    else:
+        nd_idx = []
+
+    # Soluciones por seed
+    soluciones_seed = []
+    for i in nd_idx:
+        soluciones_seed.append({
+            "solucion": indices_a_json(X[i]),
+            "fitness": [float(f) for f in F[i]]
+        })
+
+    entrada = {
+        "seed": int(seed),
+        "tiempo_ejecucion": f"{dt:.2f}",
+        "generacion_parada": int(res.generacion_parada),
+        "num_soluciones": len(nd_idx),
+        "genero_soluciones": bool(len(nd_idx) > 0),
+        "cv_min": cv_min,
+        "cv_mediana": cv_mediana,
+        "cv_media": cv_media,
+        "soluciones": soluciones_seed
+    }
+
+    # Mediana por generación para gráficas
+    medianas = None
+    if F is not None and F.size > 0:
+        medianas = tuple(mediana_por_generacion(res, k) for k in range(3))
+
+    return entrada, medianas
+
+
+def ejecutar_configuracion(comida_bd, sujetos, seeds, cruce, mutacion, prob_cruce, prob_mut, pool=None):
     """
     Ejecuta una configuración completa (5 sujetos × 31 seeds).
+    Con pool (ver utilidades.paralelo) las seeds se reparten entre procesos;
+    el orden de la salida es el mismo que en serie.
     Devuelve el bloque JSON, series para gráficas y etiqueta.
     """
-    nds = NonDominatedSorting()
     etiqueta_curva = f"{cruce} + {mutacion} (pc={prob_cruce}, pm={prob_mut})"
 
     bloque = {
@@ -79,8 +188,15 @@ def ejecutar_configuracion(comida_bd, sujetos, seeds, cruce, mutacion, prob_cruc
 
     series_por_sujeto = {"calorias": {}, "macronutrientes": {}, "preferencias": {}}
 
+    if pool is None:
+        iniciar_worker(comida_bd)
+    cfg = {"cruce": cruce, "mutacion": mutacion,
+           "prob_cruce": prob_cruce, "prob_mut": prob_mut, "verbose": pool is None,
+           "terminacion": constantes.TERMINACION, "busqueda_local": constantes.BUSQUEDA_LOCAL}
+    tareas = [(si, sujeto, seed, cfg) for si, sujeto in enumerate(sujetos) for seed in seeds]
+    salidas = iter(mapear_ordenado(ejecutar_seed, tareas, pool))
+
     for si, sujeto in enumerate(sujetos):
-        print(f"\nSujeto {si+1}")
         sujeto_json = {
             "sujeto_id": int(si + 1),
             "calorias": float(sujeto["calorias"]),
@@ -93,88 +209,26 @@ def ejecutar_configuracion(comida_bd, sujetos, seeds, cruce, mutacion, prob_cruc
 
         med_cal, med_mac, med_pref = [], [], []
 
-        for seed in seeds:
-            print(f"Cruce={cruce} mutacion={mutacion} | sujeto={si+1} seed={seed} "
-                  f"| pc={prob_cruce} pm={prob_mut}")
-
-            t0 = time.time()
-            res = ejecutar_una_vez(
-                comida_bd=comida_bd,
-                objetivo_calorias=sujeto["calorias"],
-                edad=sujeto["edad"],
-                gustos=sujeto["gustos"],
-                no_gustos=sujeto["disgustos"],
-                alergias=sujeto["alergias"],
-                cruce=cruce,
-                mutacion=mutacion,
-                prob_cruce=prob_cruce,
-                prob_mutacion=prob_mut,
-                seed=seed,
-                verbose=True,
-            )
-            dt = time.time() - t0
-
-            pop = res.pop
-            F = pop.get("F")
-            G = pop.get("G")
-            X = pop.get("X")
-
-            # CV y factibilidad
-            if G is None or len(G) == 0:
-                mask_feas = np.zeros(len(F), dtype=bool)
-                cv_min = cv_mediana = cv_media = 0.0
-            else:
-                Gpos = np.maximum(G, 0.0)
-                cv_vec = Gpos.sum(axis=1)
-                cv_min = float(cv_vec.min())
-                cv_mediana = float(np.median(cv_vec))
-                cv_media = float(cv_vec.mean())
-                mask_feas = (G <= 0.0).all(axis=1)
-
-            # ND factibles
-            if F is not None and mask_feas.any():
-                nd_local = nds.do(F[mask_feas], only_non_dominated_front=True)
-                nd_idx = np.flatnonzero(mask_feas)[nd_local]
-            else:
-                nd_idx = []
-
-            # Soluciones por seed
-            soluciones_seed = []
-            for i in nd_idx:
-                soluciones_seed.append({
-                    "solucion": indices_a_json(X[i]),
-                    "fitness": [float(f) for f in F[i]]
-                })
-
-            sujeto_json["soluciones_por_seed"].append({
-                "seed": int(seed),
-                "tiempo_ejecucion": f"{dt:.2f}",
-                "num_soluciones": len(nd_idx),
-                "genero_soluciones": bool(len(nd_idx) > 0),
-                "cv_min": cv_min,
-                "cv_mediana": cv_mediana,
-                "cv_media": cv_media,
-                "soluciones": soluciones_seed
-            })
-
-            # Mediana por generación para gráficas
-            if F is not None and F.size > 0:
-                med_cal.append(mediana_por_generacion(res, 0))
-                med_mac.append(mediana_por_generacion(res, 1))
-                med_pref.append(mediana_por_generacion(res, 2))
+        for _ in seeds:
+            entrada, medianas = next(salidas)
+            sujeto_json["soluciones_por_seed"].append(entrada)
+            if medianas is not None:
+                med_cal.append(medianas[0])
+                med_mac.append(medianas[1])
+                med_pref.append(medianas[2])
 
         # Mediana de medianas
         if med_cal:
-            series_por_sujeto["calorias"][si] = np.median(np.stack(med_cal, axis=0), axis=0)
-            series_por_sujeto["macronutrientes"][si] = np.median(np.stack(med_mac, axis=0), axis=0)
-            series_por_sujeto["preferencias"][si] = np.median(np.stack(med_pref, axis=0), axis=0)
+            series_por_sujeto["calorias"][si] = np.median(rellenar_series(med_cal), axis=0)
+            series_por_sujeto["macronutrientes"][si] = np.median(rellenar_series(med_mac), axis=0)
+            series_por_sujeto["preferencias"][si] = np.median(rellenar_series(med_pref), axis=0)
 
         bloque["resultados"].append(sujeto_json)
 
     return bloque, series_por_sujeto, etiqueta_curva
 
 
-def ejecutar_lote_vectores():
+def ejecutar_lote_vectores(n_procesos=constantes.N_PROCESOS):
     comida_bd = leer_comidas()
     sujetos = leer_sujetos_con_preferencias()
     seeds = constantes.SEEDS
@@ -182,32 +236,34 @@ def ejecutar_lote_vectores():
     acumulado_series = {}
     etiquetas = []
 
-    for cfg in CONFIGS:
-        cruce = cfg["cruce"]
-        mutacion = cfg["mutacion"]
-        prob_cruce = cfg["prob_cruce"]
-        prob_mut = cfg["prob_mut"]
-
-        bloque, series_por_sujeto, etiqueta = ejecutar_configuracion(
-            comida_bd, sujetos, seeds, cruce, mutacion, prob_cruce, prob_mut
-        )
-
-        # guarda JSON
-        archivo_json = nombre_json(cruce, mutacion, prob_cruce, prob_mut)
-        with open(os.path.join(BASE_JSON, archivo_json), "w", encoding="utf-8") as f:
-            json.dump(bloque, f, indent=2, ensure_ascii=False)
-        print(f"JSON  → {os.path.join(BASE_JSON, archivo_json)}")
-
-        # acumula curvas para gráficas
-        for si in range(len(sujetos)):
-            for obj in ("calorias", "macronutrientes", "preferencias"):
-                serie = series_por_sujeto[obj].get(si)
-                if serie is None:
-                    continue
-                acumulado_series[(si, obj, etiqueta)] = serie
+    # un pool para todo el lote: cada worker carga los datos una sola vez
+    with pool_procesos(n_procesos, iniciar_worker, (comida_bd,)) as pool:
+        for cfg in CONFIGS:
+            cruce = cfg["cruce"]
+            mutacion = cfg["mutacion"]
+            prob_cruce = cfg["prob_cruce"]
+            prob_mut = cfg["prob_mut"]
+
+            bloque, series_por_sujeto, etiqueta = ejecutar_configuracion(
+                comida_bd, sujetos, seeds, cruce, mutacion, prob_cruce, prob_mut, pool=pool
+            )
 
-        if etiqueta not in etiquetas:
-            etiquetas.append(etiqueta)
+            # guarda JSON
+            archivo_json = nombre_json(cruce, mutacion, prob_cruce, prob_mut)
+            with open(os.path.join(BASE_JSON, archivo_json), "w", encoding="utf-8") as f:
+                json.dump(bloque, f, indent=2, ensure_ascii=False)
+            print(f"JSON  → {os.path.join(BASE_JSON, archivo_json)}")
+
+            # acumula curvas para gráficas
+            for si in range(len(sujetos)):
+                for obj in ("calorias", "macronutrientes", "preferencias"):
+                    serie = series_por_sujeto[obj].get(si)
+                    if serie is None:
+                        continue
+                    acumulado_series[(si, obj, etiqueta)] = serie
+
+            if etiqueta not in etiquetas:
+                etiquetas.append(etiqueta)
 
     # gráficas (una por sujeto y objetivos)
     objetivos = ["calorias", "macronutrientes", "preferencias"]
@@ -1,9 +1,9 @@
 # cruce.py — Cruces en espacio vectorial (nutrientes)
-# Combina vectores de nutrientes y proyecta cada gen al índice válido más cercano.
+# Combina vectores de nutrientes y proyecta cada gen al índice válido más cercano (en lote).
 
 import numpy as np
 from pymoo.core.crossover import Crossover
-from src.utilidades.planificacion import proyectar_al_mas_cercano, recortar_01
+from src.utilidades.planificacion import ProyectorMasCercano, recortar_01
 
 
 class CruceBase(Crossover):
@@ -18,12 +18,14 @@ class CruceBase(Crossover):
         self.rng = rng or np.random.default_rng()
         self._X = None
         self._validos = None
+        self._proyector = None
 
     def vincular(self, problem):
-        """Toma referencias a X_normalizado y a los índices válidos por posición."""
+        """Toma referencias a X_normalizado, a los índices válidos por posición y al proyector."""
         if self._X is None:
             self._X = np.asarray(problem.X_normalizado, dtype=float)
             self._validos = problem.validos_por_posicion
+            self._proyector = getattr(problem, "proyector", None) or ProyectorMasCercano(self._X, self._validos)
 
     def _do(self, problem, X, **kwargs):
         """Aplica el cruce a un conjunto de parejas y devuelve la descendencia."""
@@ -34,35 +36,34 @@ class CruceBase(Crossover):
         n_matings, _, n_genes = Xw.shape
         hijos = np.empty((n_matings, 2, n_genes), dtype=int)
 
+        # vectores hijos de las parejas que se cruzan; se proyectan todos juntos al final
+        cruzan = np.zeros(n_matings, dtype=bool)
+        W = np.empty((n_matings, 2, n_genes, self._X.shape[1]))
+
         for m in range(n_matings):
             a = Xw[m, 0].astype(int, copy=False)
             b = Xw[m, 1].astype(int, copy=False)
+            hijos[m, 0] = a
+            hijos[m, 1] = b
 
             # si no hay cruce los padres pasan tal cual
             if self.rng.random() > self.prob:
-                hijos[m, 0] = a
-                hijos[m, 1] = b
                 continue
+            cruzan[m] = True
 
-            h1 = a.copy()
-            h2 = b.copy()
-
-            # por cada gen en el cromosoma
+            # por cada gen en el cromosoma: regla de cruce y recorte
             for pos in range(n_genes):
-                va = self._X[int(a[pos])]
-                vb = self._X[int(b[pos])]
-
-                # regla de cruce
-                w1, w2 = self.cruzar_vectores(va, vb, pos)
-
-                # recorte y proyección a índice válido
-                w1 = recortar_01(w1)
-                w2 = recortar_01(w2)
-                h1[pos] = proyectar_al_mas_cercano(w1, pos, self._X, self._validos)
-                h2[pos] = proyectar_al_mas_cercano(w2, pos, self._X, self._validos)
-
-            hijos[m, 0] = h1
-            hijos[m, 1] = h2
+                w1, w2 = self.cruzar_vectores(self._X[int(a[pos])], self._X[int(b[pos])], pos)
+                W[m, 0, pos] = recortar_01(w1)
+                W[m, 1, pos] = recortar_01(w2)
+
+        # proyección a índice válido
+        if cruzan.any():
+            Wc = W[cruzan]
+            posiciones = np.broadcast_to(np.arange(n_genes), Wc.shape[:3])
+            hijos[cruzan] = self._proyector.proyectar(
+                Wc.reshape(-1, Wc.shape[-1]), posiciones.ravel()
+            ).reshape(Wc.shape[:3])
 
         # devuelve (2, n_parejas, n_genes)
         return np.swapaxes(hijos, 0, 1)
@@ -1,9 +1,9 @@
 # mutacion.py — Mutaciones en espacio vectorial (nutrientes)
-# Altera el vector de nutrientes y proyecta a un índice válido de esa posición.
+# Altera el vector de nutrientes y proyecta a un índice válido de esa posición (en lote).
 
 import numpy as np
 from pymoo.core.mutation import Mutation
-from src.utilidades.planificacion import proyectar_al_mas_cercano, recortar_01
+from src.utilidades.planificacion import ProyectorMasCercano, recortar_01
 
 
 class MutacionBase(Mutation):
@@ -20,27 +20,46 @@ class MutacionBase(Mutation):
         self._validos = None
         self._tipos = None
         self._medias = None
+        self._proyector = None
         self.p_salto_idx = 0.02  # 2%
 
     def vincular(self, problem):
-        """Toma referencias a X_normalizado, a los índices válidos por posición y a las medias por tipo."""
+        """Toma referencias a X_normalizado, a los índices válidos por posición, a las medias por tipo y al proyector."""
         if self._X is None:
             self._X = np.asarray(problem.X_normalizado, dtype=float)
             self._validos = problem.validos_por_posicion
+            self._proyector = getattr(problem, "proyector", None) or ProyectorMasCercano(self._X, self._validos)
             self._tipos = getattr(problem, "tipos_por_posicion", None)
             self._medias = getattr(problem, "medias_por_tipo", None)
 
     def _do(self, problem, X, **kwargs):
-        """Aplica la mutación a toda la población."""
+        """Aplica la mutación a toda la población (proyección en un solo lote)."""
         self.vincular(problem)
         Y = X.copy().astype(int)
+        filas, posiciones, vectores = [], [], []
         for i in range(len(Y)):
-            Y[i] = self.mutar_individuo(Y[i])
+            Y[i], pos_i, vec_i = self.mutar_sin_proyectar(Y[i])
+            filas += [i] * len(pos_i)
+            posiciones += pos_i
+            vectores += vec_i
+        if filas:
+            Y[filas, posiciones] = self._proyector.proyectar(np.array(vectores), posiciones)
         return Y
 
     def mutar_individuo(self, x):
         """Mutación de un individuo."""
+        x, posiciones, vectores = self.mutar_sin_proyectar(x)
+        if posiciones:
+            x[posiciones] = self._proyector.proyectar(np.array(vectores), posiciones)
+        return x
+
+    def mutar_sin_proyectar(self, x):
+        """
+        Aplica saltos y mutación en continuo.
+        Devuelve (x, posiciones, vectores): los vectores quedan pendientes de proyectar.
+        """
         x = x.copy().astype(int)
+        posiciones, vectores = [], []
 
         # selección de posiciones a mutar
         mask = self.rng.random(len(x)) < self.prob
@@ -58,13 +77,13 @@ class MutacionBase(Mutation):
                     x[pos] = int(self.rng.choice(cand[cand != idx]))
                     continue
 
-            # mutación en continuo y proyección
+            # mutación en continuo
             v = self._X[idx]
             v2 = self.mutar_vector(v, pos)
-            v2 = recortar_01(v2)
-            x[pos] = proyectar_al_mas_cercano(v2, pos, self._X, self._validos)
+            posiciones.append(int(pos))
+            vectores.append(recortar_01(v2))
 
-        return x
+        return x, posiciones, vectores
 
     def mutar_vector(self, v, pos):
         """Devuelve el vector mutado en continuo (definir en subclase)."""
@@ -4,7 +4,10 @@
 import numpy as np
 
 from src.algoritmo.problema import PlanningComida
-from src.algoritmo.ejecutor_ag import ejecutar_nsga3
+from src.algoritmo.ejecutor_ag import ejecutar_nsga3, POBLACION_FIJA, GENERACIONES_FIJAS
+from src.algoritmo.islas import ejecutar_islas
+from src.algoritmo.arranque_caliente import perfil_sujeto, sembrar_inicializacion, archivar_resultado
+from src.algoritmo.busqueda_local import refinar_resultado
 from src.algoritmo.inicializacion_mutacion import InicializacionCustom, MutacionCustom
 from src.espacios.vectores.operadores.cruce import CruceUniforme, CruceSBX
 from src.espacios.vectores.operadores.mutacion import MutacionGaussiana, MutacionOposicion
@@ -13,6 +16,7 @@ from src.utilidades.planificacion import (
     construir_validos_por_posicion,
     tipos_por_posicion,
     calcular_medias_por_tipo,
+    ProyectorMasCercano,
 )
 
 
@@ -48,7 +52,7 @@ def preparar_operadores_vectores(
     return {"sampling": sampling, "crossover": crossover, "mutation": mutation}
 
 
-def ejecutar_vectores(
+def preparar_vectores(
     comida_bd,
     objetivo_calorias,
     edad,
@@ -61,11 +65,10 @@ def ejecutar_vectores(
     prob_cruce=0.9,
     prob_mutacion=1/77,
     seed=42,
-    verbose=True,
 ):
     """
-    Ejecuta una vez el espacio vectorial.
-    Devuelve el resultado de pymoo.
+    Crea el problema y los operadores del espacio vectorial.
+    Devuelve (problema, operadores); también sirve de fábrica para el modelo de islas.
     """
     # problema
     problema = PlanningComida(
@@ -86,6 +89,7 @@ def ejecutar_vectores(
     X_normalizado = normalizar_nutrientes(nutrientes)
     problema.X_normalizado = X_normalizado
     problema.medias_por_tipo = calcular_medias_por_tipo(X_normalizado, comida_bd, edad)
+    problema.proyector = ProyectorMasCercano(X_normalizado, problema.validos_por_posicion)
 
     # operadores
     rng = np.random.default_rng(seed)
@@ -97,11 +101,86 @@ def ejecutar_vectores(
         prob_mutacion=prob_mutacion,
         rng=rng,
     )
+    return problema, operadores
+
+
+def ejecutar_vectores(
+    comida_bd,
+    objetivo_calorias,
+    edad,
+    gustos,
+    no_gustos,
+    alergias,
+    *,
+    cruce="twopoint",           # "twopoint" | "uniforme" | "sbx"
+    mutacion="custom",          # "custom"   | "gaussiana" | "oposicion"
+    prob_cruce=0.9,
+    prob_mutacion=1/77,
+    seed=42,
+    verbose=True,
+    arranque_caliente=False,
+    n_generaciones=None,
+    n_islas=1,
+    terminacion="n_gen",        # "n_gen" | "convergencia"
+    cache_evaluaciones=False,
+    busqueda_local=False,
+):
+    """
+    Ejecuta una vez el espacio vectorial.
+    Devuelve el resultado de pymoo.
+    Con arranque_caliente la población inicial parte de las soluciones archivadas de perfiles
+    parecidos y el frente final se archiva. n_generaciones=None usa GENERACIONES_FIJAS
+    (o GENERACIONES_ARRANQUE_CALIENTE si se ha sembrado la población).
+    Con n_islas > 1 se usa el modelo de islas (ver algoritmo.islas).
+    terminacion="convergencia" para antes si el frente deja de mejorar (con islas, cada isla por su cuenta).
+    cache_evaluaciones: no reevalúa menús ya vistos (ver ProblemaConCache); tasa de aciertos en res.cache.
+    busqueda_local: refina el frente final con cambios de un gen (ver algoritmo.busqueda_local).
+    """
+    parametros = dict(
+        comida_bd=comida_bd,
+        objetivo_calorias=objetivo_calorias,
+        edad=edad,
+        gustos=gustos,
+        no_gustos=no_gustos,
+        alergias=alergias,
+        cruce=cruce,
+        mutacion=mutacion,
+        prob_cruce=prob_cruce,
+        prob_mutacion=prob_mutacion,
+    )
+    problema, operadores = preparar_vectores(**parametros, seed=seed)
+
+    # arranque en caliente desde soluciones previas
+    if arranque_caliente:
+        perfil = perfil_sujeto(objetivo_calorias, edad, gustos, no_gustos, alergias)
+        n_generaciones = sembrar_inicializacion(operadores["sampling"], perfil, POBLACION_FIJA, n_generaciones)
 
     # ejecutar
-    return ejecutar_nsga3(
-        problem=problema,
-        operadores=operadores,
-        seed=seed,
-        verbose=verbose,
-    )
\ No newline at end of file
+    n_generaciones = n_generaciones or GENERACIONES_FIJAS
+    if n_islas > 1:
+        res = ejecutar_islas(
+            preparar_vectores,
+            parametros,
+            seed,
+            n_islas=n_islas,
+            n_generaciones=n_generaciones,
+            soluciones_iniciales=operadores["sampling"].soluciones_iniciales,
+            terminacion=terminacion,
+            cache_evaluaciones=cache_evaluaciones,
+            verbose=verbose,
+        )
+    else:
+        res = ejecutar_nsga3(
+            problem=problema,
+            operadores=operadores,
+            seed=seed,
+            verbose=verbose,
+            n_generaciones=n_generaciones,
+            terminacion=terminacion,
+            cache_evaluaciones=cache_evaluaciones,
+        )
+    if busqueda_local:
+        refinar_resultado(problema, res, seed=seed, verbose=verbose)
+    if arranque_caliente:
+        archivar_resultado(perfil, res)
+    return res
\ No newline at end of file
@@ -1,6 +1,11 @@
 # carga_datos_csv.py - Carga las comidas y los sujetos de los CSV
+# Las comidas se compilan una vez a un catálogo binario por columnas (.npy en data/procesado/catalogo)
+# que se abre mapeado en memoria; comida_bd es una vista de registros sobre esos arrays.
 
 import os
+import json
+import hashlib
+from collections.abc import Mapping, Sequence
 import pandas as pd
 import numpy as np
 
@@ -14,17 +19,169 @@ RUTA_GUSTOS     = os.path.join(BASE, "sujetos_gustos.csv")      # columnas: suje
 RUTA_DISGUSTOS  = os.path.join(BASE, "sujetos_disgustos.csv")   # columnas: sujeto_id, grupo
 RUTA_ALERGIAS   = os.path.join(BASE, "sujetos_alergias.csv")    # columnas: sujeto_id, grupo
 
+DIR_CATALOGO = os.path.join(PROJECT_DIR, "data", "procesado", "catalogo")
+VERSION_CATALOGO = 1
+COLUMNAS_COMIDA = ["id", "nombre", "grupo", "calorias", "grasas", "proteinas", "carbohidratos"]
+
+
+# catálogo binario de comidas
+
+class RegistroComida(Mapping):
+    """Un alimento del catálogo, leído de las columnas al acceder (como el dict de antes)."""
+    __slots__ = ("_catalogo", "_i")
+
+    def __init__(self, catalogo, i):
+        self._catalogo = catalogo
+        self._i = i
+
+    def __getitem__(self, clave):
+        return self._catalogo.valores(clave)[self._i]
+
+    def __iter__(self):
+        return iter(self._catalogo.nombres_columnas)
+
+    def __len__(self):
+        return len(self._catalogo.nombres_columnas)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class CatalogoComida(Sequence):
+    """
+    Alimentos guardados por columnas (arrays, mapeados en memoria).
+    comida_bd[i]["calorias"] y el recorrido funcionan como con la lista de dicts;
+    columna() da el array entero sin construir registros.
+    """
+    def __init__(self, columnas: dict, nombres_columnas: list, grupo_codigos, grupo_id, directorio=None):
+        self.columnas = columnas
+        self.nombres_columnas = list(nombres_columnas)
+        self.grupo_codigos = grupo_codigos
+        self.grupo_id = grupo_id
+        self.directorio = directorio
+        self._listas = {}   # columna -> lista de escalares de Python (para los registros)
+
+    def __len__(self):
+        return int(self.columnas[self.nombres_columnas[0]].shape[0])
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [RegistroComida(self, j) for j in range(*i.indices(len(self)))]
+        n = len(self)
+        i = int(i)
+        if i < -n or i >= n:
+            raise IndexError(i)
+        return RegistroComida(self, i % n)
+
+    def columna(self, clave):
+        return self.columnas[clave]
+
+    def valores(self, clave):
+        """Columna como lista de escalares de Python (se crea al primer acceso por registro)."""
+        lista = self._listas.get(clave)
+        if lista is None:
+            lista = self._listas[clave] = self.columnas[clave].tolist()
+        return lista
+
+    def __reduce__(self):
+        # a otros procesos se pasa solo la carpeta: cada uno mapea los mismos ficheros
+        if self.directorio is not None:
+            return (abrir_catalogo, (self.directorio,))
+        return (CatalogoComida, (self.columnas, self.nombres_columnas, self.grupo_codigos, self.grupo_id))
+
+
+def hash_csv(ruta):
+    """sha1 del CSV de comidas."""
+    with open(ruta, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def compilar_catalogo(ruta_csv=RUTA_COMIDA, destino=DIR_CATALOGO):
+    """
+    Lee comida.csv una vez y guarda cada columna en un .npy (números con el dtype del CSV,
+    textos como unicode de ancho fijo) más los grupos internados y un fuente.json con el hash.
+    """
+    df = pd.read_csv(ruta_csv)  # separador por defecto = ','
+    # Reordenar si existen:
+    nombres = [c for c in COLUMNAS_COMIDA if c in df.columns]
+    os.makedirs(destino, exist_ok=True)
+
+    arrays = {}
+    for c in nombres:
+        col = df[c].to_numpy()
+        arrays[c] = col.astype(str) if col.dtype == object else col
+    codigos, grupo_id = np.unique(arrays["grupo"], return_inverse=True)
+    arrays["_grupo_codigos"] = codigos
+    arrays["_grupo_id"] = grupo_id.astype(np.int16)
+
+    for c, a in arrays.items():
+        tmp = os.path.join(destino, f"{c}.{os.getpid()}.tmp.npy")
+        np.save(tmp, a)
+        os.replace(tmp, os.path.join(destino, f"{c}.npy"))
+
+    # fuente.json se escribe el último: marca el catálogo como completo
+    fuente = {"version": VERSION_CATALOGO, "hash": hash_csv(ruta_csv), "columnas": nombres}
+    tmp = os.path.join(destino, f"fuente.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(fuente, f)
+    os.replace(tmp, os.path.join(destino, "fuente.json"))
+
+
+def abrir_catalogo(directorio=DIR_CATALOGO):
+    """Abre un catálogo compilado (mapeado en memoria, solo lectura)."""
+    with open(os.path.join(directorio, "fuente.json"), "r", encoding="utf-8") as f:
+        fuente = json.load(f)
+
+    def cargar(c):
+        return np.load(os.path.join(directorio, f"{c}.npy"), mmap_mode="r")
+
+    return CatalogoComida(
+        columnas={c: cargar(c) for c in fuente["columnas"]},
+        nombres_columnas=fuente["columnas"],
+        grupo_codigos=cargar("_grupo_codigos"),
+        grupo_id=cargar("_grupo_id"),
+        directorio=directorio,
+    )
+
+
+def catalogo_al_dia(ruta_csv=RUTA_COMIDA, directorio=DIR_CATALOGO):
+    """True si el catálogo compilado corresponde al CSV actual."""
+    try:
+        with open(os.path.join(directorio, "fuente.json"), "r", encoding="utf-8") as f:
+            fuente = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return fuente.get("version") == VERSION_CATALOGO and fuente.get("hash") == hash_csv(ruta_csv)
+
 
 def leer_comidas():
     """
-    Devuelve lista de datos de los alimentos:
+    Devuelve el catálogo de alimentos (CatalogoComida: secuencia de registros tipo dict):
     id, nombre, grupo, calorias, grasas, proteinas, carbohidratos.
+    Si comida.csv ha cambiado, se vuelve a compilar.
     """
-    df = pd.read_csv(RUTA_COMIDA)  # separador por defecto = ','
-    # Reordenar si existen:
-    orden = ["id", "nombre", "grupo", "calorias", "grasas", "proteinas", "carbohidratos"]
-    df = df[[c for c in orden if c in df.columns]]
-    return df.to_dict(orient="records")
+    if not catalogo_al_dia(RUTA_COMIDA, DIR_CATALOGO):
+        compilar_catalogo(RUTA_COMIDA, DIR_CATALOGO)
+    return abrir_catalogo(DIR_CATALOGO)
+
+
+def columna_comida(comida_bd, clave, dtype=float):
+    """Columna de un dato de todos los alimentos como array (directa si es un CatalogoComida)."""
+    if hasattr(comida_bd, "columna"):
+        return np.asarray(comida_bd.columna(clave), dtype=dtype)
+    return np.array([a[clave] for a in comida_bd], dtype=dtype)
+
+
+def codificar_grupos(comida_bd):
+    """
+    Interna los códigos de grupo a enteros pequeños.
+    Devuelve (codigos, grupo_id): códigos únicos ordenados y el id de grupo de cada alimento.
+    """
+    if hasattr(comida_bd, "grupo_id"):
+        return np.asarray(comida_bd.grupo_codigos), np.asarray(comida_bd.grupo_id)
+    grupos = np.array([a["grupo"] for a in comida_bd], dtype=str)
+    codigos, grupo_id = np.unique(grupos, return_inverse=True)
+    return codigos, grupo_id.astype(np.int16)
 
 
 def agrupar_por_sujeto(ruta_csv):
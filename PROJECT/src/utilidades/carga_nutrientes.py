@@ -4,7 +4,7 @@
 import numpy as np
 from sklearn.preprocessing import MinMaxScaler
 
-from src.utilidades.carga_datos_csv import leer_comidas
+from src.utilidades.carga_datos_csv import leer_comidas, columna_comida
 from src.utilidades.constantes import UMBRAL_BINARIZACION
 
 
@@ -16,10 +16,8 @@ def cargar_datos_comida():
     - nutrientes: array (N, 4) con [calorias, proteinas, carbohidratos, grasas]
     """
     datos = leer_comidas()
-    nombres = [a["nombre"] for a in datos]
-    nutrientes = np.array(
-        [[a["calorias"], a["proteinas"], a["carbohidratos"], a["grasas"]] for a in datos]
-    )
+    nombres = columna_comida(datos, "nombre", dtype=object).tolist()
+    nutrientes = extraer_matriz_nutrientes(datos)
     return datos, nombres, nutrientes
 
 
@@ -55,11 +53,10 @@ def binarizar_nutrientes_onehot(nutrientes):
 
 def extraer_matriz_nutrientes(comida_bd):
     """Devuelve la matriz [calorias, proteinas, carbohidratos, grasas] a partir de comida_bd."""
-    import numpy as np
-    return np.array([
-        [a["calorias"], a["proteinas"], a["carbohidratos"], a["grasas"]]
-        for a in comida_bd
-    ], dtype=float)
+    return np.column_stack([
+        columna_comida(comida_bd, c)
+        for c in ("calorias", "proteinas", "carbohidratos", "grasas")
+    ])
 
 
 def preparar_datos(retornar_comida=False):
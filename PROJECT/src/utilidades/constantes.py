@@ -6,6 +6,7 @@
 # - Tamaños del problema (días, genes).
 # - Niveles de actividad (Enum) con utilidades.
 # - Semillas fijas para reproducibilidad.
+# - Procesos y terminación para los lotes de ejecuciones.
 # - Grupos de comida (catálogo jerárquico).
 
 from enum import Enum
@@ -108,6 +109,15 @@ class NivelActividad(Enum):
 
 SEEDS = [42]
 
+# Procesos para los lotes (sujeto × seed): 1 = en serie, None = todos los núcleos
+N_PROCESOS = 1
+
+# Terminación en los lotes: "n_gen" (siempre GENERACIONES_FIJAS, protocolo base) | "convergencia" (opcional: para si el frente se estanca)
+TERMINACION = "n_gen"
+
+# Búsqueda local sobre el frente final en los lotes (ver algoritmo.busqueda_local)
+BUSQUEDA_LOCAL = False
+
 # Catálogo de grupos de comida (códigos y descripciones)
 class GruposComida:
     class Cereales:
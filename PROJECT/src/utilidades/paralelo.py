@@ -0,0 +1,40 @@
+# paralelo.py — Ejecución de tareas independientes en un pool de procesos
+# Contiene:
+# - pool reutilizable con inicializador por worker (carga única de datos).
+# - map que conserva el orden de las tareas (salida determinista).
+# Con 1 proceso todo se ejecuta en serie dentro del proceso actual.
+
+import os
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+
+def resolver_n_procesos(n_procesos):
+    """None o <= 0 → todos los núcleos disponibles."""
+    if n_procesos is None or n_procesos <= 0:
+        return os.cpu_count() or 1
+    return int(n_procesos)
+
+
+@contextmanager
+def pool_procesos(n_procesos, inicializador=None, initargs=()):
+    """
+    Abre un pool de procesos y lo cierra al salir.
+    Con un único proceso llama al inicializador aquí mismo y devuelve None (modo serie).
+    """
+    n = resolver_n_procesos(n_procesos)
+    if n <= 1:
+        if inicializador is not None:
+            inicializador(*initargs)
+        yield None
+        return
+
+    with ProcessPoolExecutor(max_workers=n, initializer=inicializador, initargs=initargs) as pool:
+        yield pool
+
+
+def mapear_ordenado(funcion, tareas, pool=None):
+    """Aplica funcion a cada tarea; los resultados salen en el mismo orden que las tareas."""
+    if pool is None:
+        return [funcion(t) for t in tareas]
+    return list(pool.map(funcion, tareas))
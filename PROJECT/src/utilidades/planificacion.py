@@ -1,91 +1,127 @@
 # planificacion.py — Utilidades de planificación del menú y helpers comunes
 
+import weakref
 import numpy as np
+from scipy.spatial import cKDTree
 from src.utilidades.constantes import (
     GruposComida, DIAS_SEMANA, COMIDAS, NUM_DIAS, MAPA_COMPONENTES_POR_COMIDA, TipoComida
 )
 from src.utilidades.nutricion import calculo_macronutrientes
+from src.utilidades.carga_datos_csv import codificar_grupos
+
+
+# Prefijos de código de grupo por tipo de comida
+_PREFIJOS_NO_ALMUERZO_CENA = (
+    GruposComida.Frutas.JUGOS_DE_FRUTAS[0],
+    GruposComida.Frutas.ZUMOS[0],
+    GruposComida.Bebidas.BEBIDAS[0],
+    GruposComida.Alcohol.ALCOHOL[0],
+    GruposComida.Lacteos.LecheVaca.LECHE_VACA[0],
+    GruposComida.Lacteos.BEBIDAS_LACTEAS[0],
+    GruposComida.Bebidas.BebidasEnPolvoEsenciasInfusiones.BEBIDAS_EN_POLVO_ESENCIAS_INFUSIONES[0],
+    GruposComida.Azucares.AZUCARES[0],
+    GruposComida.Cereales.CEREALES[0],
+)
+_GRUPOS_ALMUERZO_CENA = {
+    GruposComida.Cereales.ARROZ[0],
+    GruposComida.Cereales.PASTA[0],
+    GruposComida.Cereales.PIZZAS[0],
+    GruposComida.Cereales.PANES[0],
+}
+_PREFIJOS_BEBIDAS = (
+    GruposComida.Bebidas.BEBIDAS[0],
+    GruposComida.Frutas.JUGOS_DE_FRUTAS[0],
+    GruposComida.Frutas.ZUMOS[0],
+)
+_PREFIJO_INFUSIONES = GruposComida.Bebidas.BebidasEnPolvoEsenciasInfusiones.BEBIDAS_EN_POLVO_ESENCIAS_INFUSIONES[0]
+_PREFIJO_ALCOHOL = GruposComida.Alcohol.ALCOHOL[0]
+_PREFIJOS_DESAYUNO = (
+    GruposComida.Cereales.CEREALES[0],
+    GruposComida.Huevos.HUEVOS[0],
+    GruposComida.Frutas.FRUTAS_GENERALES[0],
+    GruposComida.Carne.CarneGeneral.BACON[0],
+)
+_GRUPOS_NO_DESAYUNO = {
+    GruposComida.Cereales.ARROZ[0],
+    GruposComida.Cereales.PASTA[0],
+    GruposComida.Cereales.PIZZAS[0],
+}
+_PREFIJOS_BEBIDA_DESAYUNO = (
+    GruposComida.Lacteos.LecheVaca.LECHE_VACA[0],
+    GruposComida.Lacteos.BEBIDAS_LACTEAS[0],
+    _PREFIJO_INFUSIONES,
+    GruposComida.Frutas.ZUMOS[0],
+    GruposComida.Frutas.JUGOS_DE_FRUTAS[0],
+)
+
+# Condición sobre el código de grupo de cada tipo (el alcohol de adultos va aparte)
+_CONDICION_TIPO = {
+    TipoComida.ALMUERZO_CENA: lambda g: not g.startswith(_PREFIJOS_NO_ALMUERZO_CENA) or g in _GRUPOS_ALMUERZO_CENA,
+    TipoComida.BEBIDAS: lambda g: g.startswith(_PREFIJOS_BEBIDAS) and not g.startswith(_PREFIJO_INFUSIONES),
+    TipoComida.DESAYUNO: lambda g: g.startswith(_PREFIJOS_DESAYUNO) and g not in _GRUPOS_NO_DESAYUNO,
+    TipoComida.BEBIDA_DESAYUNO: lambda g: g.startswith(_PREFIJOS_BEBIDA_DESAYUNO),
+    TipoComida.SNACKS: lambda g: g.startswith(("F", "S")),
+}
+
+# Índice por catálogo: se crea una vez y vive lo que viva el catálogo
+_INDICES_CATALOGO = weakref.WeakKeyDictionary()
+
+
+class IndiceGrupos:
+    """
+    Índice código de grupo → alimentos de un catálogo.
+    Las condiciones se evalúan sobre los códigos únicos (decenas) y no sobre los alimentos;
+    la máscara por alimento sale de indexar con grupo_id.
+    Los válidos por (tipo, adulto) se memorizan y se comparten (arrays de solo lectura).
+    """
+    def __init__(self, comida_bd):
+        self.codigos, self.grupo_id = codificar_grupos(comida_bd)
+        self.validos = {}
+
+    def mascara(self, condicion):
+        """Máscara booleana por alimento de los que cumplen la condición sobre su código."""
+        por_codigo = np.fromiter((condicion(str(c)) for c in self.codigos), dtype=bool, count=len(self.codigos))
+        return por_codigo[self.grupo_id]
+
+    def indices(self, tipo, adulto):
+        k = (tipo, bool(adulto))
+        if k not in self.validos:
+            condicion = _CONDICION_TIPO.get(tipo)
+            if condicion is None:
+                idx = np.empty(0, dtype=int)
+            else:
+                idx = np.flatnonzero(self.mascara(condicion))
+                if tipo == TipoComida.BEBIDAS and adulto:
+                    # el alcohol va detrás del resto de bebidas
+                    alcohol = np.flatnonzero(self.mascara(lambda g: g.startswith(_PREFIJO_ALCOHOL)))
+                    idx = np.concatenate([idx, alcohol])
+            idx = idx.astype(int)
+            idx.flags.writeable = False
+            self.validos[k] = idx
+        return self.validos[k]
+
+
+def indice_grupos(comida_bd):
+    """IndiceGrupos del catálogo (cacheado si el catálogo admite referencias débiles)."""
+    try:
+        indice = _INDICES_CATALOGO.get(comida_bd)
+    except TypeError:
+        # listas de dicts: sin caché entre llamadas
+        return IndiceGrupos(comida_bd)
+    if indice is None:
+        indice = IndiceGrupos(comida_bd)
+        _INDICES_CATALOGO[comida_bd] = indice
+    return indice
+
+
+def indices_tipo(comida_bd, tipo, edad):
+    """Array (compartido, solo lectura) de índices válidos según 'tipo' y 'edad'."""
+    return indice_grupos(comida_bd).indices(tipo, edad >= 18)
 
 
 def filtrar_comida(comida_bd, tipo, edad):
     """Devuelve índices de alimentos válidos según 'tipo' y 'edad'."""
-    match tipo:
-        case TipoComida.ALMUERZO_CENA:
-            return [
-                i for i, item in enumerate(comida_bd) if not item["grupo"].startswith(
-                    (
-                        GruposComida.Frutas.JUGOS_DE_FRUTAS[0],
-                        GruposComida.Frutas.ZUMOS[0],
-                        GruposComida.Bebidas.BEBIDAS[0],
-                        GruposComida.Alcohol.ALCOHOL[0],
-                        GruposComida.Lacteos.LecheVaca.LECHE_VACA[0],
-                        GruposComida.Lacteos.BEBIDAS_LACTEAS[0],
-                        GruposComida.Bebidas.BebidasEnPolvoEsenciasInfusiones.BEBIDAS_EN_POLVO_ESENCIAS_INFUSIONES[0],
-                        GruposComida.Azucares.AZUCARES[0],
-                        GruposComida.Cereales.CEREALES[0],
-                    )
-                ) or item["grupo"] in {
-                    GruposComida.Cereales.ARROZ[0],
-                    GruposComida.Cereales.PASTA[0],
-                    GruposComida.Cereales.PIZZAS[0],
-                    GruposComida.Cereales.PANES[0],
-                }
-            ]
-
-        case TipoComida.BEBIDAS:
-            bebidas = [
-                i for i, item in enumerate(comida_bd) if item["grupo"].startswith(
-                    (
-                        GruposComida.Bebidas.BEBIDAS[0],
-                        GruposComida.Frutas.JUGOS_DE_FRUTAS[0],
-                        GruposComida.Frutas.ZUMOS[0],
-                    )
-                ) and not item["grupo"].startswith(
-                    GruposComida.Bebidas.BebidasEnPolvoEsenciasInfusiones.BEBIDAS_EN_POLVO_ESENCIAS_INFUSIONES[0]
-                )
-            ]
-            if edad >= 18:
-                bebidas += [
-                    i for i, item in enumerate(comida_bd) if item["grupo"].startswith(GruposComida.Alcohol.ALCOHOL[0])
-                ]
-            return bebidas
-
-        case TipoComida.DESAYUNO:
-            return [
-                i for i, item in enumerate(comida_bd) if item["grupo"].startswith(
-                    (
-                        GruposComida.Cereales.CEREALES[0],
-                        GruposComida.Huevos.HUEVOS[0],
-                        GruposComida.Frutas.FRUTAS_GENERALES[0],
-                        GruposComida.Carne.CarneGeneral.BACON[0],
-                    )
-                ) and item["grupo"] not in {
-                    GruposComida.Cereales.ARROZ[0],
-                    GruposComida.Cereales.PASTA[0],
-                    GruposComida.Cereales.PIZZAS[0],
-                }
-            ]
-
-        case TipoComida.BEBIDA_DESAYUNO:
-            return [
-                i for i, item in enumerate(comida_bd) if item["grupo"].startswith(
-                    (
-                        GruposComida.Lacteos.LecheVaca.LECHE_VACA[0],
-                        GruposComida.Lacteos.BEBIDAS_LACTEAS[0],
-                        GruposComida.Bebidas.BebidasEnPolvoEsenciasInfusiones.BEBIDAS_EN_POLVO_ESENCIAS_INFUSIONES[0],
-                        GruposComida.Frutas.ZUMOS[0],
-                        GruposComida.Frutas.JUGOS_DE_FRUTAS[0],
-                    )
-                )
-            ]
-
-        case TipoComida.SNACKS:
-            return [
-                i for i, item in enumerate(comida_bd) if item["grupo"].startswith(("F", "S"))
-            ]
-
-        case _:
-            return []
+    return indices_tipo(comida_bd, tipo, edad).tolist()
 
 
 def tipos_por_posicion():
@@ -104,11 +140,24 @@ def plantilla_cromosoma(comida_bd, edad):
     validos = []
     for t in tipos:
         if t not in cache:
-            cache[t] = np.array(filtrar_comida(comida_bd, t, edad), dtype=int)
+            cache[t] = indices_tipo(comida_bd, t, edad)
         validos.append(cache[t])
     return tipos, validos
 
 
+def agrupar_posiciones(validos_por_posicion, tipos=None):
+    """
+    Agrupa las posiciones que comparten candidatos válidos.
+    Si se pasan 'tipos' agrupa por tipo; si no, por el mismo array de válidos.
+    Devuelve lista de (candidatos, posiciones).
+    """
+    grupos = {}
+    for pos, cand in enumerate(validos_por_posicion):
+        k = tipos[pos] if tipos is not None else id(cand)
+        grupos.setdefault(k, (cand, []))[1].append(pos)
+    return [(np.asarray(cand, dtype=int), np.asarray(pos, dtype=int)) for cand, pos in grupos.values()]
+
+
 def corregir_solucion(solucion, validos):
     """Sustituye índices fuera del conjunto válido por el primero de su posición."""
     s = np.array(solucion, copy=True)
@@ -176,7 +225,7 @@ def construir_validos_por_posicion(comida_bd, edad):
     validos = []
     for t in tpos:
         if t not in cache:
-            cache[t] = np.array(filtrar_comida(comida_bd, t, edad), dtype=int)
+            cache[t] = indices_tipo(comida_bd, t, edad)
         validos.append(cache[t])
     return validos
 
@@ -190,7 +239,7 @@ def calcular_medias_por_tipo(X_norm, comida_bd, edad):
             if t not in usados:
                 usados.append(t)
     for t in usados:
-        idx = np.array(filtrar_comida(comida_bd, t, edad), dtype=int)
+        idx = indices_tipo(comida_bd, t, edad)
         medias[t] = X_norm[idx].mean(axis=0) if idx.size > 0 else None
     return medias
 
@@ -204,6 +253,56 @@ def proyectar_al_mas_cercano(v, pos, X_norm, validos_por_posicion):
     return int(cand[j])
 
 
+class ProyectorMasCercano:
+    """
+    Proyección en lote al índice válido más cercano (distancia euclídea).
+    Un cKDTree por array de válidos (uno por tipo de comida), construido una vez.
+    Devuelve lo mismo que proyectar_al_mas_cercano: ante empates, el primero en el orden de los válidos.
+    """
+    def __init__(self, X_norm, validos_por_posicion, k_refinado=4):
+        self.X = np.asarray(X_norm, dtype=float)
+        self.k_refinado = int(k_refinado)
+        self.grupo_por_posicion = np.empty(len(validos_por_posicion), dtype=int)
+        self.grupos = []   # (candidatos, árbol, posición en candidatos de cada punto del árbol)
+        vistos = {}
+        for pos, cand in enumerate(validos_por_posicion):
+            if id(cand) not in vistos:
+                vistos[id(cand)] = len(self.grupos)
+                self.grupos.append(self.construir_grupo(np.asarray(cand, dtype=int)))
+            self.grupo_por_posicion[pos] = vistos[id(cand)]
+
+    def construir_grupo(self, cand):
+        """Árbol sin puntos repetidos: de cada repetido queda el primero (el que elegiría argmin)."""
+        if cand.size == 0:
+            return cand, None, cand
+        _, primeros = np.unique(self.X[cand], axis=0, return_index=True)
+        primeros = np.sort(primeros)
+        return cand, cKDTree(self.X[cand[primeros]]), primeros
+
+    def proyectar(self, V, posiciones):
+        """V (M, d) y posiciones (M,) → índices válidos (M,) más cercanos."""
+        V = np.atleast_2d(np.asarray(V, dtype=float))
+        posiciones = np.asarray(posiciones, dtype=int).ravel()
+        out = np.empty(len(posiciones), dtype=int)
+        grupos = self.grupo_por_posicion[posiciones]
+        for g in np.unique(grupos):
+            filas = np.nonzero(grupos == g)[0]
+            out[filas] = self.proyectar_grupo(V[filas], g)
+        return out
+
+    def proyectar_grupo(self, V, g):
+        cand, arbol, primeros = self.grupos[g]
+        k = min(self.k_refinado, primeros.size)
+        _, vec = arbol.query(V, k=k)
+        vec = primeros[np.asarray(vec).reshape(len(V), k)]     # posiciones en cand
+
+        # refinado con la misma distancia que proyectar_al_mas_cercano y desempate por orden
+        W = self.X[cand[vec]] - V[:, None, :]
+        d2 = np.einsum("mkj,mkj->mk", W, W)
+        vec = np.where(d2 == d2.min(axis=1, keepdims=True), vec, np.iinfo(vec.dtype).max)
+        return cand[vec.min(axis=1)]
+
+
 def distancia_euclidiana(a, b):
     """Distancia euclídea entre dos vectores."""
     a = np.asarray(a, dtype=float)